@@ -3,7 +3,7 @@ from ursina.prefabs.first_person_controller import FirstPersonController
 from random import uniform
 import math
 from ursina.audio import Audio
-from panda3d.core import loadPrcFileData
+from panda3d.core import loadPrcFileData, TransparencyAttrib, GeomVertexReader
 import random
 from ursina import application
 from ursina import Shader
@@ -12,14 +12,90 @@ from direct.actor.Actor import Actor
 import os
 import hashlib
 import tempfile
+import atexit
+import heapq
+import json
+import csv
+import gc
+import tracemalloc
 import pygame
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+
+
+# ==================== HEADLESS РЕЖИМ ====================
+# Запуск без окна для нагрузочных прогонов на серверах без графики:
+#   python f3.py --headless --stage=20 --ticks=6000 --tick-rate=60 --bot=script --weapon=assault_rifle
+def get_cli_option(name, default):
+    """Читает параметр вида --name=value из командной строки"""
+    prefix = f"--{name}="
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
+
+# Бенчмарк всегда идет без окна: python f3.py --benchmark [--benchmark-report=имя] [--tracemalloc]
+BENCHMARK_MODE = '--benchmark' in sys.argv
+HEADLESS_MODE = BENCHMARK_MODE or '--headless' in sys.argv or os.environ.get('F3_HEADLESS') == '1'
+HEADLESS_TICK_RATE = int(get_cli_option('tick-rate', 60))  # Фиксированная частота тиков
+HEADLESS_START_STAGE = int(get_cli_option('stage', 1))  # С какой стадии начинать
+HEADLESS_MAX_TICKS = int(get_cli_option('ticks', 0))  # 0 - без ограничения
+HEADLESS_BOT = get_cli_option('bot', 'script')  # script - стреляет по ближайшему, idle - стоит
+HEADLESS_WEAPON = get_cli_option('weapon', 'assault_rifle')
+HEADLESS_REPORT_INTERVAL = 300  # Тиков между отчетами в консоль
+BENCHMARK_REPORT_NAME = get_cli_option('benchmark-report', 'benchmark_results')
+BENCHMARK_TRACEMALLOC = '--tracemalloc' in sys.argv  # Пик памяти точнее, но замедляет кадры
+
+# Игровая логика идет фиксированными шагами, рендер - с любой частотой
+SIMULATION_TICK_RATE = HEADLESS_TICK_RATE if HEADLESS_MODE else 60
+SIMULATION_SEED = get_cli_option('seed', None)  # --seed=N для воспроизводимых прогонов
+
+# Профайлер кадра: окно последних кадров, отчет при выходе (--profile или headless)
+PROFILER_WINDOW = 600
+PROFILER_DUMP_ON_EXIT = '--profile' in sys.argv or HEADLESS_MODE
+PROFILER_REPORT_NAME = get_cli_option('profile-report', 'profiler_report')
+
+# Отчеты профайлера и бенчмарка - в отдельную папку, а не в текущую (--reports-dir=путь)
+REPORTS_DIR = get_cli_option('reports-dir', 'reports')
+
+
+def report_path(base_name):
+    """Путь к файлу отчета внутри REPORTS_DIR (папка создается при первой записи)"""
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    return os.path.join(REPORTS_DIR, base_name)
+
+
+# Кэши, посчитанные при загрузке, - в свою папку рядом с отчетами (--cache-dir=путь)
+CACHE_DIR = get_cli_option('cache-dir', 'cache')
+
+
+def cache_path(file_name):
+    """Путь к файлу кэша внутри CACHE_DIR (папка создается сразу)"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, file_name)
+
+
+if HEADLESS_MODE:
+    # БЕЗ ЗВУКОВОЙ КАРТЫ pygame ДОЛЖЕН ИСПОЛЬЗОВАТЬ ПУСТОЙ ДРАЙВЕР
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
 pygame.mixer.init()
 sound3 = pygame.mixer.Sound('delete2.mp3')
-sound3.play(loops=-1)
+if not HEADLESS_MODE:
+    sound3.play(loops=-1)
 # ==================== НАСТРОЙКИ ПРОИЗВОДИТЕЛЬНОСТИ ====================
-loadPrcFileData('', 'sync-video False')
-loadPrcFileData('', 'clock-frame-rate 800')
-loadPrcFileData('', 'show-frame-rate-meter True')
+if HEADLESS_MODE:
+    loadPrcFileData('', 'window-type none')
+    loadPrcFileData('', 'audio-library-name null')
+    # ФИКСИРОВАННЫЙ ШАГ: каждый кадр ровно 1/HEADLESS_TICK_RATE сек, без ожидания реального времени
+    loadPrcFileData('', 'clock-mode non-real-time')
+    loadPrcFileData('', f'clock-frame-rate {HEADLESS_TICK_RATE}')
+else:
+    loadPrcFileData('', 'sync-video False')
+    loadPrcFileData('', 'clock-frame-rate 800')
+    loadPrcFileData('', 'show-frame-rate-meter True')
 shader_permanent_disable=True
 
 # ==================== ОПТИМИЗИРОВАННЫЕ СИСТЕМЫ ====================
@@ -89,18 +165,484 @@ class SafeEntity(Entity):
         object_manager.safe_destroy(self)
 
 
+class SimulationClock:
+    """Часы симуляции с фиксированным шагом - единственный источник времени для игровой логики"""
+
+    def __init__(self, tick_rate=60, max_steps_per_frame=5):
+        self.step = 1.0 / tick_rate
+        self.max_steps_per_frame = max_steps_per_frame
+        self.time = 0.0  # Время симуляции в секундах
+        self.dt = self.step  # Шаг, который видят системы
+        self.tick = 0
+        self.accumulator = 0.0
+        self.alpha = 0.0  # Доля следующего шага для интерполяции рендера
+
+    def advance(self, frame_dt):
+        """Добавляет время кадра и возвращает, сколько шагов симуляции нужно сделать"""
+        self.accumulator += frame_dt
+        steps = int((self.accumulator + 1e-9) / self.step)
+
+        # После долгого фриза не догоняем бесконечно - лишнее время отбрасываем
+        if steps > self.max_steps_per_frame:
+            steps = self.max_steps_per_frame
+            self.accumulator = steps * self.step
+
+        self.accumulator = max(0.0, self.accumulator - steps * self.step)
+        self.alpha = min(1.0, self.accumulator / self.step)
+        return steps
+
+    def begin_step(self):
+        """Переводит часы на один шаг вперед"""
+        self.tick += 1
+        self.time = self.tick * self.step
+        self.dt = self.step
+
+
+sim_clock = SimulationClock(SIMULATION_TICK_RATE)
+
+if SIMULATION_SEED is not None:
+    random.seed(int(SIMULATION_SEED))
+    print(f"🎲 Seed симуляции: {SIMULATION_SEED}")
+
+
+class PhaseTimings:
+    """Кольцевой буфер замеров одной фазы и гистограмма по тем же замерам"""
+    BUCKET_EDGES_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 33.0)
+
+    def __init__(self, size):
+        self.samples = [0.0] * size
+        self.buckets = [0] * (len(self.BUCKET_EDGES_MS) + 1)
+        self.index = 0
+        self.count = 0
+        self.total_count = 0
+
+    def _bucket(self, value_ms):
+        for bucket_idx, edge in enumerate(self.BUCKET_EDGES_MS):
+            if value_ms < edge:
+                return bucket_idx
+        return len(self.BUCKET_EDGES_MS)
+
+    def add(self, value_ms):
+        # Вытесняемый замер уходит и из гистограммы
+        if self.count == len(self.samples):
+            self.buckets[self._bucket(self.samples[self.index])] -= 1
+        else:
+            self.count += 1
+
+        self.samples[self.index] = value_ms
+        self.buckets[self._bucket(value_ms)] += 1
+        self.index = (self.index + 1) % len(self.samples)
+        self.total_count += 1
+
+    def values(self):
+        return self.samples[:self.count]
+
+    def percentile(self, percent):
+        values = sorted(self.values())
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+    def mean(self):
+        return sum(self.values()) / self.count if self.count else 0.0
+
+    def maximum(self):
+        return max(self.values()) if self.count else 0.0
+
+    def summary(self):
+        return {
+            "count": self.total_count,
+            "mean_ms": round(self.mean(), 4),
+            "p50_ms": round(self.percentile(50), 4),
+            "p95_ms": round(self.percentile(95), 4),
+            "p99_ms": round(self.percentile(99), 4),
+            "max_ms": round(self.maximum(), 4),
+        }
+
+
+class GaugeSamples:
+    """Кольцевой буфер значений счетчика (глубина очереди и т.п.) - по одному на кадр, не миллисекунды"""
+
+    def __init__(self, size):
+        self.samples = [0] * size
+        self.index = 0
+        self.count = 0
+        self.total_count = 0
+        self.last = 0
+
+    def add(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % len(self.samples)
+        self.count = min(self.count + 1, len(self.samples))
+        self.total_count += 1
+        self.last = value
+
+    def values(self):
+        return self.samples[:self.count]
+
+    def mean(self):
+        return sum(self.values()) / self.count if self.count else 0.0
+
+    def maximum(self):
+        return max(self.values()) if self.count else 0
+
+    def summary(self):
+        return {
+            "count": self.total_count,
+            "last": self.last,
+            "mean": round(self.mean(), 4),
+            "max": self.maximum(),
+        }
+
+
+class FrameProfiler:
+    """Замеряет время фаз update() за кадр и копит их в кольцевых гистограммах.
+    Счетчики (gauge) живут отдельно от фаз: одно значение за кадр, в отчете - своей таблицей"""
+
+    def __init__(self, window=600):
+        self.window = window
+        self.phases = {}  # Имя фазы -> PhaseTimings
+        self.pending = {}  # Время фаз в текущем кадре (фаза может вызываться несколько раз)
+        self.gauges = {}  # Имя счетчика -> GaugeSamples
+        self.pending_gauges = {}  # Последнее значение счетчика в текущем кадре
+        self.started = {}
+        self.scopes = {}
+        self.last_frame_time = None
+        self.overlay = None
+        self.overlay_visible = False
+        self.last_overlay_update = 0
+
+    def _timings(self, name):
+        timings = self.phases.get(name)
+        if timings is None:
+            timings = PhaseTimings(self.window)
+            self.phases[name] = timings
+        return timings
+
+    def begin_frame(self):
+        """Закрывает прошлый кадр: сбрасывает суммы фаз в гистограммы"""
+        now = time.perf_counter()
+        if self.last_frame_time is not None:
+            self._timings("frame").add((now - self.last_frame_time) * 1000)
+        self.last_frame_time = now
+
+        for name, value_ms in self.pending.items():
+            self._timings(name).add(value_ms)
+        self.pending.clear()
+
+        for name, value in self.pending_gauges.items():
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = GaugeSamples(self.window)
+                self.gauges[name] = gauge
+            gauge.add(value)
+        self.pending_gauges.clear()
+
+    def start(self, name):
+        self.started[name] = time.perf_counter()
+
+    def stop(self, name):
+        start_time = self.started.pop(name, None)
+        if start_time is not None:
+            self.record(name, (time.perf_counter() - start_time) * 1000)
+
+    def record(self, name, value_ms):
+        """Добавляет время к фазе текущего кадра"""
+        self.pending[name] = self.pending.get(name, 0.0) + value_ms
+
+    def set_gauge(self, name, value):
+        """Значение счетчика в текущем кадре (последнее за кадр и попадет в буфер)"""
+        self.pending_gauges[name] = value
+
+    def measure(self, name):
+        """with frame_profiler.measure('фаза'): ..."""
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = ProfilerScope(self, name)
+            self.scopes[name] = scope
+        return scope
+
+    def report(self):
+        return {name: timings.summary() for name, timings in sorted(self.phases.items())}
+
+    def gauge_report(self):
+        return {name: gauge.summary() for name, gauge in sorted(self.gauges.items())}
+
+    def report_lines(self):
+        lines = []
+        for name, timings in sorted(self.phases.items(), key=lambda item: -item[1].mean()):
+            lines.append(f"{name:<32} {timings.mean():6.2f} {timings.percentile(95):6.2f} {timings.maximum():6.2f}")
+        return lines
+
+    def gauge_lines(self):
+        return [f"{name:<32} {gauge.last:6} {gauge.mean():6.1f} {gauge.maximum():6}"
+                for name, gauge in sorted(self.gauges.items())]
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay is None:
+            self.overlay = Text(
+                parent=camera.ui,
+                text="",
+                position=(-0.87, -0.05, -0.05),
+                scale=0.8,
+                color=color.lime,
+                background=True,
+                background_color=color.rgba(0, 0, 0, 0.7),
+                font='VeraMono.ttf'
+            )
+        self.overlay.enabled = self.overlay_visible
+        print(f"⏱️ Профайлер на экране: {'ВКЛ' if self.overlay_visible else 'ВЫКЛ'}")
+
+    def update_overlay(self):
+        if not self.overlay_visible or not self.overlay:
+            return
+        # Текст пересобираем 4 раза в секунду - сам оверлей не должен есть кадр
+        if time.time() - self.last_overlay_update < 0.25:
+            return
+        self.last_overlay_update = time.time()
+        header = f"{'фаза':<32} {'ср.':>6} {'p95':>6} {'макс':>6}  (мс)"
+        lines = [header] + self.report_lines()
+        if self.gauges:
+            lines += ["", f"{'счетчик':<32} {'сейчас':>6} {'ср.':>6} {'макс':>6}"] + self.gauge_lines()
+        self.overlay.text = "\n".join(lines)
+
+    def dump(self, base_name):
+        """Сохраняет отчет в base_name.json и base_name.csv, счетчики - в base_name_gauges.csv (в REPORTS_DIR)"""
+        if not self.phases and not self.gauges:
+            return
+
+        report = {
+            "window": self.window,
+            "bucket_edges_ms": list(PhaseTimings.BUCKET_EDGES_MS),
+            "phases": {},
+        }
+        for name, timings in sorted(self.phases.items()):
+            phase_report = timings.summary()
+            phase_report["buckets"] = list(timings.buckets)
+            report["phases"][name] = phase_report
+        report["gauges"] = self.gauge_report()
+
+        try:
+            base_name = report_path(base_name)
+            with open(f"{base_name}.json", "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+            with open(f"{base_name}.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["phase", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+                for name, phase_report in report["phases"].items():
+                    writer.writerow([name, phase_report["count"], phase_report["mean_ms"], phase_report["p50_ms"],
+                                     phase_report["p95_ms"], phase_report["p99_ms"], phase_report["max_ms"]])
+
+            with open(f"{base_name}_gauges.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["gauge", "count", "last", "mean", "max"])
+                for name, gauge_report in report["gauges"].items():
+                    writer.writerow([name, gauge_report["count"], gauge_report["last"], gauge_report["mean"],
+                                     gauge_report["max"]])
+
+            print(f"⏱️ Отчет профайлера сохранен: {base_name}.json / {base_name}.csv / {base_name}_gauges.csv")
+        except Exception as e:
+            print(f"❌ Не удалось сохранить отчет профайлера: {e}")
+
+
+class ProfilerScope:
+    """Контекст для замера одной фазы"""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start_time = 0.0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, (time.perf_counter() - self.start_time) * 1000)
+        return False
+
+
+frame_profiler = FrameProfiler(PROFILER_WINDOW)
+
+if PROFILER_DUMP_ON_EXIT:
+    atexit.register(lambda: frame_profiler.dump(PROFILER_REPORT_NAME))
+
+
+# ==================== ПЛАНИРОВЩИК СИСТЕМ ====================
+# Каждая система регистрируется ровно один раз: фаза, частота и бюджет по времени.
+#   "simulation" - гоняется внутри фиксированного шага sim_clock
+#   "frame"      - гоняется раз за отрисованный кадр
+# rate=None - на каждом вызове фазы, иначе не чаще rate раз в секунду фазового времени.
+# pass_dt=True - система получает аргументом время с прошлого своего запуска.
+
+class SystemScheduler:
+    """Запускает зарегистрированные системы с объявленной частотой и следит за бюджетом"""
+
+    OVERRUN_WARNING_INTERVAL = 5.0  # Не чаще раза в 5 сек на систему
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.phases = {}  # Фаза -> список систем в порядке регистрации
+        self.systems = {}  # Имя -> система
+
+    def register(self, name, func, phase="simulation", rate=None, budget_ms=None, pass_dt=False):
+        if name in self.systems:
+            print(f"⚠️ Система '{name}' уже зарегистрирована - повторная регистрация пропущена")
+            return self.systems[name]
+
+        system = {
+            "name": name,
+            "func": func,
+            "phase": phase,
+            "interval": 1.0 / rate if rate else 0.0,
+            "budget_ms": budget_ms,
+            "pass_dt": pass_dt,
+            "elapsed": 0.0,
+            "runs": 0,
+            "overruns": 0,
+            "last_warning": -self.OVERRUN_WARNING_INTERVAL,
+        }
+        self.systems[name] = system
+        self.phases.setdefault(phase, []).append(system)
+        return system
+
+    def run(self, phase, dt, now):
+        """Один проход фазы: dt - время фазы с прошлого прохода, now - текущее время фазы"""
+        for system in self.phases.get(phase, ()):
+            system["elapsed"] += dt
+            interval = system["interval"]
+            if system["elapsed"] < interval - 1e-9:
+                continue
+
+            system_dt = system["elapsed"]
+            system["elapsed"] -= interval
+            # Отставание не копим - после фриза система догоняет одним запуском
+            if system["elapsed"] >= interval or not interval:
+                system["elapsed"] = 0.0
+
+            start_time = time.perf_counter()
+            if system["pass_dt"]:
+                system["func"](system_dt)
+            else:
+                system["func"]()
+            cost_ms = (time.perf_counter() - start_time) * 1000
+            self.profiler.record(system["name"], cost_ms)
+            system["runs"] += 1
+
+            budget_ms = system["budget_ms"]
+            if budget_ms and cost_ms > budget_ms:
+                system["overruns"] += 1
+                if now - system["last_warning"] >= self.OVERRUN_WARNING_INTERVAL:
+                    system["last_warning"] = now
+                    print(f"⚠️ Система '{system['name']}' вышла за бюджет: {cost_ms:.2f} мс > {budget_ms} мс "
+                          f"({system['overruns']} раз из {system['runs']})")
+
+    def report(self):
+        return {
+            name: {
+                "phase": system["phase"],
+                "rate": round(1.0 / system["interval"], 2) if system["interval"] else None,
+                "budget_ms": system["budget_ms"],
+                "runs": system["runs"],
+                "overruns": system["overruns"],
+            }
+            for name, system in self.systems.items()
+        }
+
+
+system_scheduler = SystemScheduler(frame_profiler)
+
+
+# ==================== ОЧЕРЕДЬ СПАВНА ====================
+# Волны, пикапы и эффекты не создаются пачкой в одном кадре: они встают в очередь,
+# и за кадр выполняется столько заданий, сколько влезает в SPAWN_QUEUE_BUDGET_MS.
+
+SPAWN_QUEUE_BUDGET_MS = 3.0
+
+
+class SpawnQueue:
+    """FIFO заданий на создание объектов с бюджетом по времени на кадр"""
+
+    def __init__(self, profiler, budget_ms=SPAWN_QUEUE_BUDGET_MS):
+        self.profiler = profiler
+        self.budget_ms = budget_ms
+        self.jobs = deque()
+        self.pending_kinds = {}  # Вид задания -> сколько таких ждет в очереди
+        # depth - глубина очереди в конце последнего кадра, backlog_frames - сколько кадров кончились с хвостом
+        self.stats = {"pushed": 0, "done": 0, "failed": 0, "max_depth": 0, "depth": 0, "backlog_frames": 0}
+
+    def push(self, kind, func, *args, on_fail=None):
+        """Ставит func(*args) в очередь; on_fail вызывается, если задание вернуло False"""
+        self.jobs.append((kind, func, args, on_fail))
+        self.pending_kinds[kind] = self.pending_kinds.get(kind, 0) + 1
+        self.stats["pushed"] += 1
+        if len(self.jobs) > self.stats["max_depth"]:
+            self.stats["max_depth"] = len(self.jobs)
+
+    def pending(self, kind):
+        return self.pending_kinds.get(kind, 0)
+
+    def run(self):
+        """Выполняет задания, пока не кончится бюджет кадра (минимум одно - очередь не встанет)"""
+        start_time = time.perf_counter()
+        while self.jobs:
+            kind, func, args, on_fail = self.jobs.popleft()
+            self.pending_kinds[kind] -= 1
+
+            try:
+                result = func(*args)
+            except Exception as e:
+                print(f"❌ Ошибка задания спавна '{kind}': {e}")
+                result = False
+
+            if result is False:
+                self.stats["failed"] += 1
+                if on_fail:
+                    on_fail()
+            else:
+                self.stats["done"] += 1
+
+            if (time.perf_counter() - start_time) * 1000 >= self.budget_ms:
+                break
+
+        # Глубина очереди в конце кадра - счетчик, а не время: пишем в счетчики профайлера, не в фазы
+        self.stats["depth"] = len(self.jobs)
+        self.profiler.set_gauge("spawn_queue_depth", len(self.jobs))
+        if self.jobs:
+            self.stats["backlog_frames"] += 1
+
+    def clear(self):
+        self.jobs.clear()
+        self.pending_kinds.clear()
+
+
+spawn_queue = SpawnQueue(frame_profiler)
+
+
 class ParticlePool:
+    """Частицы по индексам: свободные - стек индексов, занятые - двусвязный список по индексам в порядке выдачи
+    (голова - самая старая, ее и переиспользуем; возврат вырезает узел за O(1)).
+    Хендл (индекс, поколение) устаревает при возврате или переиспользовании частицы - без поиска по спискам"""
+
     def __init__(self, template_func, initial_size=20, max_size=100):
         self.template_func = template_func
         self.max_size = max_size
-        self.available = []
-        self.in_use = []
+        self.particles = []  # Индекс -> частица
+        self.generations = []  # Индекс -> поколение, растет при каждом возврате или переиспользовании
+        self.busy = []  # Индекс -> выдана ли частица
+        self.free = []  # Стек свободных индексов
+        self.prev = []  # Индекс -> предыдущая выданная частица (-1 - нет)
+        self.next = []  # Индекс -> следующая выданная частица (-1 - нет)
+        self.head = -1  # Самая старая выданная
+        self.tail = -1  # Самая новая выданная
+        self.in_use_count = 0
+        self.stats = {"created": 0, "high_water": 0, "steals": 0, "misses": 0, "stale_returns": 0}
 
         # Инициализируем начальный пул
-        for _ in range(initial_size):
-            particle = self._create_particle()
-            if particle:
-                self.available.append(particle)
+        for _ in range(min(initial_size, max_size)):
+            self._add_particle()
 
     def _create_particle(self):
         try:
@@ -120,53 +662,81 @@ class ParticlePool:
             print(f"❌ Ошибка создания частицы в пуле: {e}")
             return None
 
-    def get(self):
-        """Получить частицу из пула"""
-        # Сначала ищем в доступных
-        while self.available:
-            particle = self.available.pop()
-            if particle and self._is_particle_valid(particle):
-                try:
-                    self._activate_particle(particle)
-                    self.in_use.append(particle)
-                    return particle
-                except Exception as e:
-                    print(f"❌ Ошибка активации частицы: {e}")
-                    continue
+    def _add_particle(self):
+        """Новая частица в свободные; индекс или None"""
+        particle = self._create_particle()
+        if not particle:
+            return None
 
-        # Если нет доступных, создаем новую
-        if len(self.in_use) < self.max_size:
-            particle = self._create_particle()
-            if particle and self._is_particle_valid(particle):
-                try:
-                    self._activate_particle(particle)
-                    self.in_use.append(particle)
-                    return particle
-                except Exception as e:
-                    print(f"❌ Ошибка активации новой частицы: {e}")
-
-        # Если достигли максимума, переиспользуем старую
-        if self.in_use:
-            particle = self.in_use.pop(0)
-            if particle and self._is_particle_valid(particle):
-                try:
-                    self._deactivate_particle(particle)
-                    self._activate_particle(particle)
-                    self.in_use.append(particle)
-                    return particle
-                except Exception as e:
-                    print(f"❌ Ошибка переиспользования частицы: {e}")
+        index = len(self.particles)
+        self.particles.append(particle)
+        self.generations.append(0)
+        self.busy.append(False)
+        self.prev.append(-1)
+        self.next.append(-1)
+        self.free.append(index)
+        self.stats["created"] += 1
+        return index
+
+    def _link(self, index):
+        """Занятую частицу - в хвост списка выдачи"""
+        self.prev[index] = self.tail
+        self.next[index] = -1
+        if self.tail >= 0:
+            self.next[self.tail] = index
+        else:
+            self.head = index
+        self.tail = index
+
+    def _unlink(self, index):
+        """Вырезать частицу из списка выдачи"""
+        previous, following = self.prev[index], self.next[index]
+        if previous >= 0:
+            self.next[previous] = following
+        else:
+            self.head = following
+        if following >= 0:
+            self.prev[following] = previous
+        else:
+            self.tail = previous
+        self.prev[index] = self.next[index] = -1
 
-        return None
+    def _issue(self, index):
+        self.busy[index] = True
+        handle = (index, self.generations[index])
+        self._link(index)
+        self._activate_particle(self.particles[index])
+        return self.particles[index], handle
 
-    def _is_particle_valid(self, particle):
-        """Проверяет, валидна ли частица"""
-        if not particle:
-            return False
-        # Проверяем, не уничтожена ли сущность
-        if hasattr(particle, '_destroyed') and particle._destroyed:
-            return False
-        return True
+    def get(self):
+        """Получить частицу из пула: (частица, хендл) или (None, None)"""
+        # Сначала свободные, потом новая, пока не достигли максимума
+        if not self.free and len(self.particles) < self.max_size:
+            self._add_particle()
+
+        if self.free:
+            index = self.free.pop()
+            self.in_use_count += 1
+            if self.in_use_count > self.stats["high_water"]:
+                self.stats["high_water"] = self.in_use_count
+            return self._issue(index)
+
+        # Если достигли максимума, переиспользуем самую старую - голову списка выдачи
+        index = self.head
+        if index >= 0:
+            self._unlink(index)
+            self.generations[index] += 1  # Старый хендл больше не действует
+            self._deactivate_particle(self.particles[index])
+            self.stats["steals"] += 1
+            return self._issue(index)
+
+        self.stats["misses"] += 1
+        return None, None
+
+    def is_live(self, handle):
+        """Хендл еще владеет частицей (не возвращена и не переиспользована)"""
+        index, generation = handle
+        return self.busy[index] and self.generations[index] == generation
 
     def _activate_particle(self, particle):
         """Активирует частицу"""
@@ -185,34 +755,19 @@ class ParticlePool:
         if hasattr(particle, 'visible'):
             particle.visible = False
 
-    def return_particle(self, particle):
-        """Вернуть частицу в пул"""
-        if not particle or not self._is_particle_valid(particle):
+    def return_particle(self, handle):
+        """Вернуть частицу в пул по хендлу из get (устаревший хендл игнорируется)"""
+        if not handle or not self.is_live(handle):
+            self.stats["stale_returns"] += 1
             return
 
-        # Удаляем из используемых
-        if particle in self.in_use:
-            self.in_use.remove(particle)
-
-        # Деактивируем
-        self._deactivate_particle(particle)
-
-        # Возвращаем в пул если есть место
-        if len(self.available) < self.max_size:
-            self.available.append(particle)
-        else:
-            # Если пул полон, уничтожаем частицу
-            try:
-                destroy(particle)
-            except:
-                pass
-
-    def cleanup(self):
-        """Очистка невалидных частиц"""
-        # Очищаем доступные
-        self.available = [p for p in self.available if self._is_particle_valid(p)]
-        # Очищаем используемые
-        self.in_use = [p for p in self.in_use if self._is_particle_valid(p)]
+        index = handle[0]
+        self._unlink(index)
+        self.busy[index] = False
+        self.generations[index] += 1
+        self.in_use_count -= 1
+        self._deactivate_particle(self.particles[index])
+        self.free.append(index)
 
 
 # Глобальные переменные для оптимизированных систем
@@ -286,8 +841,6 @@ def init_optimized_systems():
                 return animation
 
             def update(self):
-                current_time = time.time()
-
                 for anim in self.animations[:]:
                     if not anim['active']:
                         self.animations.remove(anim)
@@ -359,7 +912,7 @@ def create_blood_effect_optimized(position):
 
     # ОГРАНИЧИВАЕМ количество частиц
     max_particles = 3  # Вместо 5
-    particles_to_create = min(max_particles, blood_pool.max_size - len(blood_pool.in_use))
+    particles_to_create = min(max_particles, blood_pool.max_size - blood_pool.in_use_count)
 
     if particles_to_create <= 0:
         return []  # Нет доступных частиц
@@ -368,7 +921,7 @@ def create_blood_effect_optimized(position):
 
     # ОДНА центральная частица + несколько вокруг
     for i in range(particles_to_create):
-        particle = blood_pool.get()
+        particle, handle = blood_pool.get()
         if not particle:
             continue
 
@@ -400,16 +953,18 @@ def create_blood_effect_optimized(position):
 
             # Сохраняем начальные значения
             start_scale = particle.scale
-            start_time = time.time()
+            start_time = sim_clock.time
 
             # Простая функция обновления
-            def create_update_func(p=particle, d=direction, s=speed, l=lifetime, st=start_time, sc=start_scale):
+            def create_update_func(p=particle, d=direction, s=speed, l=lifetime, st=start_time, sc=start_scale,
+                                   h=handle):
                 def update_func(progress, obj):
-                    if not obj or not obj.enabled:
+                    # Частицу уже вернули или отдали другому эффекту
+                    if not blood_pool.is_live(h):
                         return
 
                     # Вычисляем время с момента создания
-                    elapsed = time.time() - st
+                    elapsed = sim_clock.time - st
                     current_progress = elapsed / l
 
                     if current_progress >= 1.0:
@@ -433,17 +988,17 @@ def create_blood_effect_optimized(position):
                 particle,
                 lifetime,
                 update_func,
-                on_finished=lambda p=particle: blood_pool.return_particle(p) if blood_pool else None
+                on_finished=lambda h=handle: blood_pool.return_particle(h) if blood_pool else None
             )
 
             if anim:
                 particles.append(particle)
             else:
-                blood_pool.return_particle(particle)
+                blood_pool.return_particle(handle)
 
         except Exception as e:
             print(f"❌ Ошибка настройки кровяной частицы: {e}")
-            blood_pool.return_particle(particle)
+            blood_pool.return_particle(handle)
 
     # ОГРАНИЧИВАЕМ общее количество эффектов крови
     global blood_effects_count
@@ -472,7 +1027,7 @@ def cleanup_excess_blood_effects():
                 if particle and particle.enabled:
                     active_particles += 1
                     # Удаляем старые частицы (> 3 секунд)
-                    if time.time() - spawn_time > 3.0:
+                    if sim_clock.time - spawn_time > 3.0:
                         destroy(particle)
                         blood_particles.remove(particle_data)
                         active_particles -= 1
@@ -480,59 +1035,89 @@ def cleanup_excess_blood_effects():
     # Обновляем счетчик
     create_blood_effect_optimized.blood_effects_count = active_particles
 
-    # Очищаем пул крови от неиспользуемых частиц
-    if blood_pool and hasattr(blood_pool, 'cleanup'):
-        blood_pool.cleanup()
-
     print(f"🧹 Очистка крови: {active_particles} активных частиц")
 
 
 def safe_update_enemies_optimized():
-    """Безопасное обновление врагов"""
-    if not enemies:
+    """Движение всей волны одним векторным шагом - решения принимает update_enemies"""
+    count = enemy_store.count
+    if not count:
         return
 
-    current_time = time.time()
-
-    # Фильтруем только живых врагов
-    for enemy in enemies[:]:
-        if not enemy or not enemy.entity or not enemy.entity.enabled:
-            # Удаляем мертвых врагов из списка
-            if enemy in enemies:
-                enemies.remove(enemy)
-            continue
-
-        dist_to_player = (enemy.entity.position - player.position).length()
-
-        if dist_to_player <= enemy.detection_range:
-            enemy.is_chasing = True
-
-            if dist_to_player > enemy.attack_range:
-
-                target_height = 1.5  # На сколько выше ног идти
-                target_point = player.position + Vec3(0, target_height, 0)
-
-                # 2. Двигаемся к этой точке
-                direction = (target_point - enemy.entity.position).normalized()
-                enemy.entity.position += direction * enemy.chase_speed * time.dt
-
-                # 3. Поворачиваемся смотреть на игрока (только горизонталь)
-                # Берем направление в 2D (XZ плоскость), игнорируем высоту
-                dx = player.position.x - enemy.entity.position.x
-                dz = player.position.z - enemy.entity.position.z
-
-                if abs(dz) > 0.001:  # Маленькое число вместо 0
-                    angle_y = math.degrees(math.atan2(dx, dz))
-                    enemy.entity.rotation_y = angle_y  # Попробуй с минусом или без
-
-                # 4. Убираем наклоны
-                enemy.entity.rotation_x = 0
-                enemy.entity.rotation_z = 0
-
-            if dist_to_player <= enemy.attack_range:
-                if current_time - enemy.last_attack_time >= enemy.attack_cooldown:
-                    attack_player(enemy)
-                    enemy.last_attack_time = current_time
+    player_position = np.array((player.position.x, player.position.y, player.position.z))
+    positions = enemy_store.position[:count]
+
+    # LOD: дальние и невидимые враги двигаются через шаг или реже, тики раскиданы по слотам.
+    # Пропущенное время копится в move_dt и отдается врагу целиком на его тике
+    if not hasattr(safe_update_enemies_optimized, 'tick'):
+        safe_update_enemies_optimized.tick = 0
+    safe_update_enemies_optimized.tick += 1
+    move_dt = enemy_store.move_dt[:count]
+    move_dt += sim_clock.dt
+    tiers = np.where(enemy_store.visible[:count], enemy_store.lod[:count], len(ENEMY_LOD_AI_STRIDES) - 1)
+    strides = np.array(ENEMY_LOD_AI_STRIDES)[tiers]
+    due = (safe_update_enemies_optimized.tick + np.arange(count)) % strides == 0
+    step_dt = move_dt.copy()
+    move_dt[due] = 0.0
+
+    # Идут к игроку все, кто его видит, но еще не дотягивается атакой.
+    # Дотянувшиеся стоят, но толпа их все равно расталкивает
+    distances = enemy_store.distances_to(player_position)
+    chasing = due & (distances <= enemy_store.detection_range[:count])
+    moving_slots = np.flatnonzero(chasing)
+    if not len(moving_slots):
+        return
+    in_reach = distances[moving_slots] <= enemy_store.attack_range[moving_slots]
+
+    # Сетку строим при первом шаге - к этому моменту все стены карты уже созданы
+    if nav_grid.blocked is None:
+        nav_grid.build(navigation_walls + navigation_boxes)
+    nav_grid.update_target(player_position[0], player_position[2])
+
+    # Двигаемся к точке на 1.5 выше ног игрока
+    target_point = player_position + (0.0, 1.5, 0.0)
+    to_target = target_point - positions[moving_slots]
+
+    # По горизонтали идем по полю направлений в обход стен, высоту набираем как раньше
+    flow_x, flow_z, has_flow = nav_grid.sample(positions[moving_slots, 0], positions[moving_slots, 2])
+    horizontal = np.hypot(to_target[:, 0], to_target[:, 2])
+    to_target[has_flow, 0] = flow_x[has_flow] * horizontal[has_flow]
+    to_target[has_flow, 2] = flow_z[has_flow] * horizontal[has_flow]
+
+    lengths = np.sqrt(np.einsum('ij,ij->i', to_target, to_target))
+    lengths[lengths == 0] = 1.0
+    directions = to_target / lengths[:, None]
+    directions[in_reach] = 0.0
+
+    # Толпа: разделение + выравнивание вместо случайного толчка застрявших
+    steer = crowd_steering(positions[moving_slots], directions)
+    velocity = directions.copy()
+    velocity[:, 0] += steer[:, 0]
+    velocity[:, 2] += steer[:, 1]
+    # Быстрее chase_speed толпа не разгоняется
+    speed = np.sqrt(np.einsum('ij,ij->i', velocity, velocity))
+    too_fast = speed > 1.0
+    velocity[too_fast] /= speed[too_fast, None]
+    positions[moving_slots] += velocity * (enemy_store.chase_speed[moving_slots] * step_dt[moving_slots])[:, None]
+
+    # Смотрим туда, куда идем - только по горизонтали (XZ), наклонов нет.
+    # Стоящие у игрока смотрят на него
+    facing_vector = np.where(in_reach[:, None], to_target, velocity)
+    dx = facing_vector[:, 0]
+    dz = facing_vector[:, 2]
+    facing = np.abs(dz) > 0.001  # Маленькое число вместо 0
+    enemy_store.yaw[moving_slots[facing]] = np.degrees(np.arctan2(dx[facing], dz[facing]))
+
+    # Трансформы пишем в Entity один раз за шаг
+    owners = enemy_store.owners
+    for slot, (x, y, z), yaw in zip(moving_slots.tolist(), positions[moving_slots].tolist(),
+                                    enemy_store.yaw[moving_slots].tolist()):
+        enemy = owners[slot]
+        entity = enemy.entity
+        if entity:
+            entity.position = Vec3(x, y, z)
+            entity.rotation = Vec3(0, yaw, 0)
+        enemy_grid.update(enemy, x, z)
 
 
 # ==================== ФУНКЦИЯ ДЛЯ ИНТЕГРАЦИИ В UPDATE ====================
@@ -569,17 +1154,44 @@ def resource_path(relative_path: str):
     return os.path.join(os.path.abspath("."), relative_path)
 
 
+# ==================== КЭШ ШЕЙДЕРОВ ====================
+# Одна программа на один исходник: Shader с тем же кодом отдаем из кэша, а не собираем заново.
+
+class ShaderCache:
+    """Shader по хешу исходников - каждая программа компилируется один раз на процесс"""
+
+    def __init__(self):
+        self.shaders = {}  # sha1 исходников -> Shader
+        self.stats = {"compiled": 0, "hits": 0}
+
+    def get(self, **sources):
+        """Аргументы те же, что у Shader (language, vertex, fragment, ...)"""
+        digest = hashlib.sha1(repr(sorted(sources.items())).encode("utf-8")).hexdigest()
+        shader = self.shaders.get(digest)
+        if shader is not None:
+            self.stats["hits"] += 1
+            return shader
+
+        shader = Shader(**sources)
+        self.shaders[digest] = shader
+        self.stats["compiled"] += 1
+        return shader
+
+
+shader_cache = ShaderCache()
+
+
 def load_shader(name):
     """Загружает шейдер из файла"""
     try:
         path = resource_path(name)
         with open(path, encoding="utf-8") as f:
             code = f.read()
-        return Shader(fragment=code)
+        return shader_cache.get(fragment=code)
     except FileNotFoundError:
         print(f"⚠️ Файл шейдера '{name}' не найден. Используем простой шейдер.")
         # Возвращаем простой шейдер по умолчанию
-        return Shader(language=Shader.GLSL, fragment='''
+        return shader_cache.get(language=Shader.GLSL, fragment='''
             #version 140
             uniform sampler2D p3d_Texture0;
             uniform vec4 p3d_Color;
@@ -591,7 +1203,10 @@ def load_shader(name):
         ''')
 
 
-app = Ursina()
+if HEADLESS_MODE:
+    app = Ursina(window_type='none')
+else:
+    app = Ursina()
 walk = Audio('walk.ogg', loop=True, autoplay=False)
 jump = Audio('jump.ogg', loop=False, autoplay=False)
 shoot_sound = Audio("shoot.ogg", autoplay=False, lood=False)
@@ -601,8 +1216,8 @@ button_hover_sound = Audio('button1.mp3', loop=False, autoplay=False)
 button_click_sound = Audio('button2.mp3', loop=False, autoplay=False)
 
 
-dark_fantasy_shader = Shader(language=Shader.GLSL,
-                             fragment='''
+dark_fantasy_shader = shader_cache.get(language=Shader.GLSL,
+                                      fragment='''
 #version 140
 uniform sampler2D p3d_Texture0;
 uniform vec4 p3d_Color;
@@ -664,8 +1279,8 @@ void main() {
 }
 ''')
 
-light_pistol_shader = Shader(language=Shader.GLSL,
-                             fragment='''
+light_pistol_shader = shader_cache.get(language=Shader.GLSL,
+                                      fragment='''
 #version 140
 uniform sampler2D p3d_Texture0;
 uniform vec4 p3d_Color;
@@ -731,7 +1346,51 @@ void main() {
 ground = Entity(color=color.clear, collider='box',
                 scale=(10000, 1, 10000), position=(0, 0, 0))
 
-player = FirstPersonController(collider='sphere')
+class HeadlessMouse:
+    """Мышь для контроллера без окна: захват курсора только запоминаем, остальное - у настоящей мыши"""
+
+    def __init__(self, real_mouse):
+        self.real_mouse = real_mouse
+        self.locked = False
+
+    def __getattr__(self, name):
+        return getattr(self.real_mouse, name)
+
+
+class HeadlessFirstPersonController(FirstPersonController):
+    """FirstPersonController для headless: БЕЗ ОКНА захват курсора невозможен, а контроллер включает его сам.
+    На время его собственных вызовов подменяем мышь в модуле контроллера - класс Mouse не трогаем"""
+
+    headless_mouse = HeadlessMouse(mouse)
+
+    @contextmanager
+    def _without_cursor_lock(self):
+        controller_module = sys.modules[FirstPersonController.__module__]
+        window_mouse = controller_module.mouse
+        controller_module.mouse = self.headless_mouse
+        try:
+            yield
+        finally:
+            controller_module.mouse = window_mouse
+
+    def __init__(self, **kwargs):
+        with self._without_cursor_lock():
+            super().__init__(**kwargs)
+
+    def on_enable(self):
+        with self._without_cursor_lock():
+            parent_on_enable = getattr(super(), 'on_enable', None)
+            if parent_on_enable:
+                parent_on_enable()
+
+    def on_disable(self):
+        with self._without_cursor_lock():
+            parent_on_disable = getattr(super(), 'on_disable', None)
+            if parent_on_disable:
+                parent_on_disable()
+
+
+player = (HeadlessFirstPersonController if HEADLESS_MODE else FirstPersonController)(collider='sphere')
 player.position_y = 10
 player.position = (-45, 76, 0)
 player.camera_pivot.y = 3
@@ -747,9 +1406,9 @@ shoot_strength = 0
 reload_strength = 0
 walk_strength = 0
 master_shader = load_shader("master_vfx.shader")
-camera.shader = master_shader
-
-camera.shader = master_shader
+if not HEADLESS_MODE:
+    # Пост-эффекту камеры нужно окно (FilterManager), в headless его нет
+    camera.shader = master_shader
 camera.set_shader_input("base_intensity", 1.0)
 camera.set_shader_input("shoot_strength", 0.0)
 camera.set_shader_input("reload_strength", 0.0)
@@ -830,7 +1489,6 @@ shoot_sound2_duration = 0.05
 last_shoot_sound_time = 0
 
 muzzle_flash_entities = []
-bullet_tracers = []
 muzzle_flash_duration = 0.1  # Увеличил длительность для частиц
 bullet_lifetime = 1.0
 
@@ -842,8 +1500,6 @@ blood_particle_count = 7  # Увеличили количество частиц
 blood_speed = 5.0  # Увеличили скорость разлета
 blood_gravity = 1.5  # Длительность эффекта крови
 
-enemies = []
-enemy_projectiles = []
 # ОБНОВЛЯЕМ НАСТРОЙКИ СНАРЯДОВ
 ENEMY_PROJECTILE_COOLDOWN = 8.0  # Каждые 8 секунд
 ENEMY_PROJECTILE_SPEED = 3.0  # ОЧЕНЬ медленные снаряды
@@ -857,6 +1513,9 @@ player_health = 100
 player_max_health = 100
 health_bar = None
 health_text = None
+heart_icon = None
+stage_text = None
+enemies_text = None
 
 # ДОБАВЛЯЕМ ПЕРЕМЕННЫЕ ДЛЯ АПТЕЧЕК
 heal_pickups = []  # Список всех аптечек на карте
@@ -872,9 +1531,8 @@ player_gravity = 1  # НИЗКАЯ гравитация - медленное п
 # ИСПРАВЛЕННАЯ СИСТЕМА ВОЛН
 current_stage = 1
 stage_enemies_spawned = False
-stage_enemies_killed = 0
-total_enemies_on_map = 0
 enemies_to_kill_for_stage = 0  # Общее количество врагов, которое нужно убить для перехода
+stage_progression_locked = False  # Бенчмарк держит игру на одной стадии
 
 # ДОБАВЛЯЕМ ПЕРЕМЕННЫЕ ДЛЯ ТРЯСКИ ПРИ ВЗРЫВЕ
 # ГЛОБАЛЬНЫЕ ПЕРЕМЕННЫЕ ДЛЯ ОБЪЕДИНЕННОЙ СИСТЕМЫ ТРЯСОК
@@ -1055,7 +1713,6 @@ ammo_data = {
         "reserve_ammo": 16  # Максимум 16 в запасе
     }
 }
-explosive_projectiles = []
 
 # ДОБАВИМ ПЕРЕМЕННЫЕ ДЛЯ СПРИНТА
 sprint_speed_multiplier = 1.8  # Множитель скорости при спринте
@@ -1077,11 +1734,786 @@ reload_weapon_offset = 2.4
 
 
 # Исправляем класс Enemy - добавляем все атрибуты в __init__
+# ==================== ПРОСТРАНСТВЕННАЯ СЕТКА ====================
+# Равномерная сетка по клеткам XZ: вместо перебора всего списка смотрим только соседние клетки.
+
+class SpatialHashGrid:
+    """Хеш-сетка объектов по клеткам XZ. Запрос возвращает кандидатов - точную дистанцию проверяет вызывающий"""
+
+    def __init__(self, cell_size=4.0):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cz) -> {id(объекта): объект}
+        self.item_cells = {}  # id(объекта) -> клетка, где он сейчас лежит
+
+    def _cell(self, x, z):
+        return int(math.floor(x / self.cell_size)), int(math.floor(z / self.cell_size))
+
+    def insert(self, item, x, z):
+        self.update(item, x, z)
+
+    def update(self, item, x, z):
+        """Переносит объект в клетку точки (x, z); если клетка та же - ничего не делает"""
+        key = id(item)
+        cell = self._cell(x, z)
+        old_cell = self.item_cells.get(key)
+        if old_cell == cell:
+            return
+
+        if old_cell is not None:
+            bucket = self.cells[old_cell]
+            del bucket[key]
+            if not bucket:
+                del self.cells[old_cell]
+
+        self.cells.setdefault(cell, {})[key] = item
+        self.item_cells[key] = cell
+
+    def remove(self, item):
+        key = id(item)
+        cell = self.item_cells.pop(key, None)
+        if cell is None:
+            return
+
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+
+    def query(self, x, z, radius):
+        """Все объекты в клетках, которые задевает квадрат со стороной 2*radius вокруг (x, z)"""
+        min_cx, min_cz = self._cell(x - radius, z - radius)
+        max_cx, max_cz = self._cell(x + radius, z + radius)
+
+        found = []
+        cells = self.cells
+        for cx in range(min_cx, max_cx + 1):
+            for cz in range(min_cz, max_cz + 1):
+                bucket = cells.get((cx, cz))
+                if bucket:
+                    found.extend(bucket.values())
+        return found
+
+
+ENEMY_GRID_CELL_SIZE = 4.0
+PICKUP_GRID_CELL_SIZE = 4.0
+
+enemy_grid = SpatialHashGrid(ENEMY_GRID_CELL_SIZE)
+heal_pickup_grid = SpatialHashGrid(PICKUP_GRID_CELL_SIZE)
+ammo_pickup_grid = SpatialHashGrid(PICKUP_GRID_CELL_SIZE)
+weapon_pickup_grid = SpatialHashGrid(PICKUP_GRID_CELL_SIZE)
+
+
+# ==================== НАВИГАЦИОННАЯ СЕТКА (FLOW FIELD) ====================
+# Стены create_wall и коробки-коллайдеры карты растеризуются в сетку проходимости по XZ.
+# Поле направлений к клетке игрока пересчитывается одной BFS, только когда игрок сменил клетку.
+
+NAV_CELL_SIZE = 3.0
+NAV_LOBBY_HEIGHT = 50  # Все, что выше - лобби, враги там не ходят
+NAV_MIN_BLOCKER_HEIGHT = 4.0  # Ниже этого враг не упрется
+NAV_BOUNDS_MARGIN = 15.0
+
+
+class NavGrid:
+    """Сетка проходимости по XZ и поле направлений к игроку"""
+
+    NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    def __init__(self, cell_size=NAV_CELL_SIZE):
+        self.cell_size = cell_size
+        self.origin_x = 0.0
+        self.origin_z = 0.0
+        self.rows = 0
+        self.cols = 0
+        self.blocked = None  # bool [ряд по Z, столбец по X]
+        self.flow = None  # Единичное направление (x, z) к игроку для каждой клетки, 0 - нет пути
+        self.target_cell = None
+        self.rebuilds = 0
+
+    @staticmethod
+    def _world_matrix(entity):
+        """Матрица local -> world куба-коллайдера (строки 0-2 - оси с масштабом, строка 3 - позиция)"""
+        matrix = entity.getMat(scene)
+        return np.array([[matrix.getCell(row, col) for col in range(4)] for row in range(4)])
+
+    def _blocker_points(self, entity):
+        """Точки XZ, которые занимает коробка, или None если это пол, пандус или лобби"""
+        matrix = self._world_matrix(entity)
+        if matrix[3, 1] > NAV_LOBBY_HEIGHT:
+            return None
+
+        axes = matrix[:3, :3]
+        lengths = np.linalg.norm(axes, axis=1)
+        up = np.abs(axes[:, 1]) / np.maximum(lengths, 1e-6)
+
+        # Стена - если самая тонкая сторона лежит горизонтально и коробка достаточно высокая.
+        # Плиты (полы, пандусы) тонкие именно по вертикали - их пропускаем
+        if up[np.argmin(lengths)] > 0.5 or np.abs(axes[:, 1]).sum() < NAV_MIN_BLOCKER_HEIGHT:
+            return None
+
+        # Сэмплируем куб [-0.5, 0.5]^3 с шагом в полклетки, по вертикальной оси хватает центра
+        counts = np.maximum(2, np.ceil(lengths / (self.cell_size * 0.5)).astype(int) + 1)
+        counts[np.argmax(up)] = 1
+        samples = [np.linspace(-0.5, 0.5, count) if count > 1 else np.zeros(1) for count in counts]
+        local = np.stack(np.meshgrid(*samples, indexing='ij'), axis=-1).reshape(-1, 3)
+        world = local @ axes + matrix[3, :3]
+        return world[:, [0, 2]]
+
+    def build(self, blockers):
+        points = [self._blocker_points(entity) for entity in blockers if entity]
+        points = [p for p in points if p is not None]
+        if not points:
+            print("⚠️ Навигация: нет препятствий, враги идут напрямую")
+            self.blocked = np.zeros((1, 1), dtype=bool)
+            return
+
+        points = np.concatenate(points)
+        low = points.min(axis=0) - NAV_BOUNDS_MARGIN
+        high = points.max(axis=0) + NAV_BOUNDS_MARGIN
+        self.origin_x, self.origin_z = low
+        self.cols, self.rows = np.ceil((high - low) / self.cell_size).astype(int)
+
+        self.blocked = np.zeros((self.rows, self.cols), dtype=bool)
+        cells = ((points - low) / self.cell_size).astype(int)
+        self.blocked[cells[:, 1], cells[:, 0]] = True
+        self.flow = None
+        self.target_cell = None
+
+        print(f"🧭 Навигационная сетка {self.cols}x{self.rows} ({self.cell_size} м), "
+              f"занято {int(self.blocked.sum())} клеток")
+
+    def invalidate(self):
+        """Сбрасывает сетку - она устарела (появилась новая стена) и будет построена заново"""
+        self.blocked = None
+        self.flow = None
+        self.target_cell = None
+
+    def cell_of(self, x, z):
+        cx = int(math.floor((x - self.origin_x) / self.cell_size))
+        cz = int(math.floor((z - self.origin_z) / self.cell_size))
+        if 0 <= cx < self.cols and 0 <= cz < self.rows:
+            return cx, cz
+        return None
+
+    def update_target(self, x, z):
+        """Пересчитывает поле, если игрок перешел в другую клетку. True - поле обновлено"""
+        cell = self.cell_of(x, z)
+        if cell == self.target_cell:
+            return False
+
+        self.target_cell = cell
+        if cell is None:
+            self.flow = None  # Игрок вне сетки - идем напрямую
+            return True
+
+        self.flow = self._compute_flow(cell)
+        self.rebuilds += 1
+        return True
+
+    def _compute_flow(self, cell):
+        rows, cols = self.rows, self.cols
+        total = rows * cols
+        blocked = self.blocked.ravel().tolist()
+
+        # BFS по 4 соседям от клетки игрока (саму клетку берем, даже если она занята)
+        distance = [-1] * total
+        start = cell[1] * cols + cell[0]
+        distance[start] = 0
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            next_distance = distance[index] + 1
+            column = index % cols
+            for neighbor in (index - 1 if column > 0 else -1,
+                             index + 1 if column < cols - 1 else -1,
+                             index - cols,
+                             index + cols if index + cols < total else -1):
+                if neighbor >= 0 and distance[neighbor] < 0 and not blocked[neighbor]:
+                    distance[neighbor] = next_distance
+                    queue.append(neighbor)
+
+        # Направление каждой клетки - к соседу (из 8) с наименьшей дистанцией
+        distance = np.array(distance, dtype=float).reshape(rows, cols)
+        distance[distance < 0] = np.inf
+        padded = np.pad(distance, 1, constant_values=np.inf)
+        best = distance.copy()
+        best_dx = np.zeros((rows, cols))
+        best_dz = np.zeros((rows, cols))
+        for dx, dz in self.NEIGHBORS:
+            neighbor = padded[1 + dz:1 + dz + rows, 1 + dx:1 + dx + cols]
+            if dx and dz:
+                # По диагонали только если обе ортогональные клетки свободны - не срезаем углы стен
+                open_corner = (np.isfinite(padded[1:1 + rows, 1 + dx:1 + dx + cols]) &
+                               np.isfinite(padded[1 + dz:1 + dz + rows, 1:1 + cols]))
+                neighbor = np.where(open_corner, neighbor, np.inf)
+            better = neighbor < best
+            best = np.where(better, neighbor, best)
+            best_dx = np.where(better, dx, best_dx)
+            best_dz = np.where(better, dz, best_dz)
+
+        norm = np.hypot(best_dx, best_dz)
+        norm[norm == 0] = 1.0
+        return np.stack((best_dx / norm, best_dz / norm), axis=-1)
+
+    def sample(self, xs, zs):
+        """Направления поля для массивов координат: (dir_x, dir_z, есть_направление)"""
+        count = len(xs)
+        if self.flow is None:
+            return np.zeros(count), np.zeros(count), np.zeros(count, dtype=bool)
+
+        cx = np.floor((xs - self.origin_x) / self.cell_size).astype(int)
+        cz = np.floor((zs - self.origin_z) / self.cell_size).astype(int)
+        inside = (cx >= 0) & (cx < self.cols) & (cz >= 0) & (cz < self.rows)
+        cx = np.clip(cx, 0, self.cols - 1)
+        cz = np.clip(cz, 0, self.rows - 1)
+
+        directions = self.flow[cz, cx]
+        valid = inside & ((directions[:, 0] != 0) | (directions[:, 1] != 0))
+        return directions[:, 0], directions[:, 1], valid
+
+    def is_blocked(self, xs, zs):
+        """Занята ли клетка под каждой точкой (вне сетки - свободно)"""
+        if self.blocked is None:
+            return np.zeros(len(xs), dtype=bool)
+
+        cx = np.floor((xs - self.origin_x) / self.cell_size).astype(int)
+        cz = np.floor((zs - self.origin_z) / self.cell_size).astype(int)
+        inside = (cx >= 0) & (cx < self.cols) & (cz >= 0) & (cz < self.rows)
+        result = np.zeros(len(xs), dtype=bool)
+        result[inside] = self.blocked[cz[inside], cx[inside]]
+        return result
+
+
+nav_grid = NavGrid(NAV_CELL_SIZE)
+navigation_walls = []  # Все стены create_wall - источник препятствий для nav_grid
+
+
+# ==================== КАРТА ВЫСОТ ====================
+# Верхние грани модели локации и коробок-полов один раз растеризуются в сетку высот по XZ (с кэшем на диске).
+# Клетка получает высоту, только если ее центр лежит внутри грани - края платформ не расползаются наружу.
+# Снаряды проверяют землю выборкой из сетки, а не рейкастами.
+
+HEIGHTFIELD_CACHE = cache_path("heightfield_cache.npz")
+HEIGHTFIELD_CELL_SIZE = 2.0
+HEIGHTFIELD_MIN_UP = 0.5  # Круче этого грань - стена, а не поверхность
+HEIGHTFIELD_BASE = 0.5  # Верх коробки ground - где больше ничего нет
+HEIGHTFIELD_MAX_STEP = 1.0  # Перепад между соседними клетками больше этого - край, а не склон
+
+
+class HeightField:
+    """Высота поверхности под точкой: центры клеток с шагом cell_size, на склонах - билинейно, на краях - по клетке"""
+
+    def __init__(self, cell_size=HEIGHTFIELD_CELL_SIZE, cache_path=HEIGHTFIELD_CACHE):
+        self.cell_size = cell_size
+        self.cache_path = cache_path
+        self.origin_x = 0.0
+        self.origin_z = 0.0
+        self.heights = None  # [ряд по Z, столбец по X]
+
+    @staticmethod
+    def _model_triangles(entity):
+        """Все треугольники модели в мировых координатах, (n, 3, 3)"""
+        triangles = []
+        for geom_path in entity.model.findAllMatches('**/+GeomNode'):
+            matrix = NavGrid._world_matrix(geom_path)
+            geom_node = geom_path.node()
+            for geom_index in range(geom_node.getNumGeoms()):
+                geom = geom_node.getGeom(geom_index).decompose()
+                reader = GeomVertexReader(geom.getVertexData(), 'vertex')
+                vertices = []
+                while not reader.isAtEnd():
+                    vertex = reader.getData3()
+                    vertices.append((vertex[0], vertex[1], vertex[2]))
+                if not vertices:
+                    continue
+
+                vertices = np.array(vertices) @ matrix[:3, :3] + matrix[3, :3]
+                for primitive in geom.getPrimitives():
+                    indices = [primitive.getVertex(i) for i in range(primitive.getNumVertices())]
+                    triangles.append(vertices[indices].reshape(-1, 3, 3))
+        return np.concatenate(triangles) if triangles else np.zeros((0, 3, 3))
+
+    @staticmethod
+    def _box_top_triangles(entity):
+        """Верхняя грань коробки-пола двумя треугольниками; стены (как их видит NavGrid) пропускаем"""
+        matrix = NavGrid._world_matrix(entity)
+        axes = matrix[:3, :3]
+        lengths = np.linalg.norm(axes, axis=1)
+        up = np.abs(axes[:, 1]) / np.maximum(lengths, 1e-6)
+        vertical = int(np.argmax(up))
+        if vertical != int(np.argmin(lengths)):
+            return np.zeros((0, 3, 3))
+
+        first, second = [axis for axis in range(3) if axis != vertical]
+        top = matrix[3, :3] + 0.5 * np.sign(axes[vertical, 1]) * axes[vertical]
+        corners = [top + 0.5 * (sign_a * axes[first] + sign_b * axes[second])
+                   for sign_a, sign_b in ((-1, -1), (1, -1), (1, 1), (-1, 1))]
+        return np.array([[corners[0], corners[1], corners[2]], [corners[0], corners[2], corners[3]]])
+
+    def _build(self, triangles):
+        # Только пологие грани ниже лобби
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        up = np.abs(normals[:, 1]) / np.maximum(np.linalg.norm(normals, axis=1), 1e-9)
+        triangles = triangles[(up >= HEIGHTFIELD_MIN_UP) & (triangles[:, :, 1].max(axis=1) <= NAV_LOBBY_HEIGHT)]
+        if not len(triangles):
+            return np.zeros(2), np.full((2, 2), HEIGHTFIELD_BASE)
+
+        low = triangles[:, :, [0, 2]].reshape(-1, 2).min(axis=0) - self.cell_size
+        high = triangles[:, :, [0, 2]].reshape(-1, 2).max(axis=0) + self.cell_size
+        cols, rows = np.ceil((high - low) / self.cell_size).astype(int) + 1
+        heights = np.full((rows, cols), -np.inf)
+
+        # Диапазон клеток, чьи центры попадают в рамку грани; грани с одинаковым размером диапазона - одной пачкой
+        flat = triangles[:, :, [0, 2]]
+        first = np.ceil((flat.min(axis=1) - low) / self.cell_size - 0.5).astype(int)
+        last = np.floor((flat.max(axis=1) - low) / self.cell_size - 0.5).astype(int)
+        spans = last - first + 1
+        covers = (spans > 0).all(axis=1)
+        triangles, flat, first, spans = triangles[covers], flat[covers], first[covers], spans[covers]
+
+        for span_x, span_z in np.unique(spans, axis=0).tolist():
+            same = (spans[:, 0] == span_x) & (spans[:, 1] == span_z)
+            group, group_flat = triangles[same], flat[same]
+            offset_x, offset_z = np.meshgrid(np.arange(span_x), np.arange(span_z))
+            cx = first[same, 0, None] + offset_x.ravel()[None, :]
+            cz = first[same, 1, None] + offset_z.ravel()[None, :]
+            px = low[0] + (cx + 0.5) * self.cell_size
+            pz = low[1] + (cz + 0.5) * self.cell_size
+
+            # Барицентрические координаты центра клетки в плоскости XZ
+            edge_b = group_flat[:, 1] - group_flat[:, 0]
+            edge_c = group_flat[:, 2] - group_flat[:, 0]
+            dx = px - group_flat[:, 0, 0, None]
+            dz = pz - group_flat[:, 0, 1, None]
+            area = edge_b[:, 0] * edge_c[:, 1] - edge_b[:, 1] * edge_c[:, 0]
+            area = np.where(np.abs(area) > 1e-9, area, 1e-9)[:, None]
+            u = (dx * edge_c[:, 1, None] - dz * edge_c[:, 0, None]) / area
+            v = (edge_b[:, 0, None] * dz - edge_b[:, 1, None] * dx) / area
+            inside = (u >= -1e-6) & (v >= -1e-6) & (u + v <= 1.0 + 1e-6)
+
+            ys = (group[:, 0, 1, None] + u * (group[:, 1, 1] - group[:, 0, 1])[:, None] +
+                  v * (group[:, 2, 1] - group[:, 0, 1])[:, None])
+            np.maximum.at(heights, (cz[inside], cx[inside]), ys[inside])
+
+        return low, np.maximum(heights, HEIGHTFIELD_BASE)
+
+    def _cache_key(self, surfaces, boxes, model_path):
+        # Ключ - содержимое модели, трансформы и параметры сетки: поменялась карта - сетка пересчитывается
+        digest = hashlib.sha1()
+        digest.update(repr(("centers", self.cell_size, HEIGHTFIELD_MIN_UP, HEIGHTFIELD_BASE,
+                            NAV_LOBBY_HEIGHT)).encode("utf-8"))
+        try:
+            with open(model_path, "rb") as file:
+                digest.update(file.read())
+        except OSError:
+            digest.update(model_path.encode("utf-8"))
+        for entity in surfaces + boxes:
+            digest.update(NavGrid._world_matrix(entity).round(4).tobytes())
+        return digest.hexdigest()
+
+    def load_or_build(self, surfaces, boxes, model_path):
+        key = self._cache_key(surfaces, boxes, model_path)
+        try:
+            with np.load(self.cache_path) as cached:
+                if str(cached["key"]) == key:
+                    self.origin_x, self.origin_z = cached["origin"].tolist()
+                    self.heights = cached["heights"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Кэш карты высот не прочитан: {e}")
+
+        if self.heights is None:
+            start_time = time.perf_counter()
+            triangles = [self._model_triangles(entity) for entity in surfaces]
+            triangles += [self._box_top_triangles(entity) for entity in boxes if entity]
+            origin, self.heights = self._build(np.concatenate(triangles))
+            self.origin_x, self.origin_z = origin.tolist()
+            try:
+                with open(self.cache_path, "wb") as file:
+                    np.savez(file, key=np.array(key), origin=np.array(origin), heights=self.heights)
+            except Exception as e:
+                print(f"⚠️ Кэш карты высот не сохранен: {e}")
+            print(f"⛰️ Карта высот посчитана заново за {(time.perf_counter() - start_time) * 1000:.0f} мс "
+                  f"({self.cache_path})")
+
+        rows, cols = self.heights.shape
+        print(f"⛰️ Карта высот {cols}x{rows} ({self.cell_size} м), "
+              f"поверхности от {self.heights.min():.1f} до {self.heights.max():.1f}")
+
+    def height_at(self, xs, zs):
+        """Высота поверхности под каждой точкой (вне сетки - HEIGHTFIELD_BASE)"""
+        if self.heights is None:
+            return np.full(len(xs), HEIGHTFIELD_BASE)
+
+        rows, cols = self.heights.shape
+        fx = (xs - self.origin_x) / self.cell_size
+        fz = (zs - self.origin_z) / self.cell_size
+        inside = (fx >= 0) & (fx < cols) & (fz >= 0) & (fz < rows)
+        heights = self.heights
+
+        # Клетка под точкой
+        cell_x = np.clip(np.floor(fx).astype(int), 0, cols - 1)
+        cell_z = np.clip(np.floor(fz).astype(int), 0, rows - 1)
+        nearest = heights[cell_z, cell_x]
+
+        # Билинейно между четырьмя ближайшими центрами - только если они лежат на одном склоне
+        x0 = np.clip(np.floor(fx - 0.5).astype(int), 0, cols - 2)
+        z0 = np.clip(np.floor(fz - 0.5).astype(int), 0, rows - 2)
+        tx = np.clip(fx - 0.5 - x0, 0.0, 1.0)
+        tz = np.clip(fz - 0.5 - z0, 0.0, 1.0)
+        corners = np.stack([heights[z0, x0], heights[z0, x0 + 1], heights[z0 + 1, x0], heights[z0 + 1, x0 + 1]])
+        near = corners[0] * (1 - tx) + corners[1] * tx
+        far = corners[2] * (1 - tx) + corners[3] * tx
+        smooth = corners.max(axis=0) - corners.min(axis=0) <= HEIGHTFIELD_MAX_STEP
+
+        result = np.where(smooth, near * (1 - tz) + far * tz, nearest)
+        return np.where(inside, result, HEIGHTFIELD_BASE)
+
+
+heightfield = HeightField()
+
+
+# ==================== ТОЛПА ВРАГОВ ====================
+# Разделение, выравнивание и обход стен для всей толпы одним проходом.
+# Соседей ищем по сетке с клеткой CROWD_RADIUS: сортировка ключей клеток + searchsorted по 9 соседним клеткам.
+
+CROWD_RADIUS = 1.5  # Ближе этого ghoul'ы расталкиваются
+CROWD_SEPARATION_WEIGHT = 1.5
+CROWD_ALIGNMENT_WEIGHT = 0.3
+CROWD_LOOKAHEAD = 1.5  # Насколько вперед проверяем стену перед поворотом от толпы
+CROWD_KEY_STRIDE = 1 << 20  # Ключ клетки = cx * STRIDE + cz
+
+
+def crowd_neighbor_pairs(xz, radius):
+    """Все пары соседей (i, j), i != j, из одной или соседних клеток сетки"""
+    cells = np.floor(xz / radius).astype(np.int64)
+    keys = cells[:, 0] * CROWD_KEY_STRIDE + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    owners = np.arange(len(xz))
+
+    pair_i = []
+    pair_j = []
+    for dx in (-1, 0, 1):
+        for dz in (-1, 0, 1):
+            neighbor_keys = keys + dx * CROWD_KEY_STRIDE + dz
+            low = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+            counts = np.searchsorted(sorted_keys, neighbor_keys, side='right') - low
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Разворачиваем диапазоны [low, low + count) в плоский список без цикла по врагам
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_i.append(np.repeat(owners, counts))
+            pair_j.append(order[np.repeat(low, counts) + offsets])
+
+    if not pair_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    pair_i = np.concatenate(pair_i)
+    pair_j = np.concatenate(pair_j)
+    different = pair_i != pair_j
+    return pair_i[different], pair_j[different]
+
+
+def crowd_steering(positions, directions):
+    """Поправка к направлениям движения (по XZ) от соседей и стен"""
+    count = len(positions)
+    xz = positions[:, [0, 2]]
+    headings = directions[:, [0, 2]]
+    steer = np.zeros((count, 2))
+
+    pair_i, pair_j = crowd_neighbor_pairs(xz, CROWD_RADIUS)
+    if len(pair_i):
+        offset = xz[pair_i] - xz[pair_j]
+        distance = np.hypot(offset[:, 0], offset[:, 1])
+        close = distance < CROWD_RADIUS
+        pair_i, pair_j, offset, distance = pair_i[close], pair_j[close], offset[close], distance[close]
+
+        # Стоящих в одной точке разводим в стороны по номеру - без random, шаг воспроизводим
+        same = distance < 1e-6
+        angles = pair_i[same].astype(float)
+        offset[same] = np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+        distance[same] = 0.0
+        away = offset / np.where(same, 1.0, distance)[:, None]
+
+        # Разделение: чем ближе сосед, тем сильнее толкает
+        strength = (CROWD_RADIUS - distance) / CROWD_RADIUS * CROWD_SEPARATION_WEIGHT
+        np.add.at(steer, pair_i, away * strength[:, None])
+
+        # Выравнивание: тянемся к среднему направлению соседей
+        neighbors = np.bincount(pair_i, minlength=count)
+        heading_sum = np.zeros((count, 2))
+        np.add.at(heading_sum, pair_i, headings[pair_j])
+        has_neighbors = neighbors > 0
+        steer[has_neighbors] += (heading_sum[has_neighbors] / neighbors[has_neighbors, None] -
+                                 headings[has_neighbors]) * CROWD_ALIGNMENT_WEIGHT
+
+    # Обход стен: если толпа выталкивает в занятую клетку - идем чисто по полю направлений
+    ahead = xz + (headings + steer) * CROWD_LOOKAHEAD
+    steer[nav_grid.is_blocked(ahead[:, 0], ahead[:, 1])] = 0.0
+    return steer
+
+
+# ==================== ХРАНИЛИЩЕ ВРАГОВ (МАССИВЫ) ====================
+# Горячее состояние врагов лежит в плотных numpy-массивах, по слоту на врага.
+# Движение и решения ИИ считаются сразу для всей волны, в Entity пишем один раз за шаг.
+
+ENEMY_TYPE_CODES = {"normal": 0, "medium": 1, "boss": 2}
+ENEMY_MODEL = "ghoul3.glTF"
+ENEMY_ANIMATION = "Ghoul.001"  # Цикл ходьбы гуля
+ENEMY_SCALES = {"normal": 0.02, "medium": 0.03, "boss": 0.04}
+
+
+class ActorCache:
+    """Грузит модель с анимациями один раз и выдает на каждого врага дешевую копию"""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.templates = {}  # Путь -> шаблонный Actor (не в сцене)
+        self.stats = {"loads": 0, "load_ms": 0.0, "instances": 0, "instantiate_ms": 0.0}
+
+    def template(self, path):
+        template = self.templates.get(path)
+        if template is None:
+            start_time = time.perf_counter()
+            template = Actor(path)
+            load_ms = (time.perf_counter() - start_time) * 1000
+            self.templates[path] = template
+            self.stats["loads"] += 1
+            self.stats["load_ms"] += load_ms
+            self.profiler.record("actor_load", load_ms)
+            print(f"📦 Модель '{path}' загружена в кэш за {load_ms:.1f} мс")
+        return template
+
+    def preload(self, path):
+        self.template(path)
+
+    def instantiate(self, path):
+        """Новый Actor со своей копией скелета - анимируется независимо, но без разбора glTF"""
+        template = self.template(path)
+        start_time = time.perf_counter()
+        actor = Actor(other=template)
+        instantiate_ms = (time.perf_counter() - start_time) * 1000
+        self.stats["instances"] += 1
+        self.stats["instantiate_ms"] += instantiate_ms
+        self.profiler.record("actor_instantiate", instantiate_ms)
+        return actor
+
+
+actor_cache = ActorCache(frame_profiler)
+
+
+class EnemyStore:
+    """Плотные массивы состояния врагов: слоты 0..count-1 заняты, удаление - перестановкой последнего"""
+
+    # Колонки, доступные у Enemy как обычные атрибуты
+    FIELDS = ("health", "chase_speed", "attack_range", "detection_range", "attack_cooldown", "last_attack_time",
+              "attacks_ready")
+
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.count = 0
+        self.owners = []  # Enemy по номеру слота
+        self.position = np.zeros((capacity, 3))
+        self.previous_position = np.zeros((capacity, 3))  # Позиция на прошлом шаге (для интерполяции)
+        self.yaw = np.zeros(capacity)
+        self.health = np.zeros(capacity)  # float: урон бывает дробным, int его бы обрезал
+        self.chase_speed = np.zeros(capacity)
+        self.attack_range = np.zeros(capacity)
+        self.detection_range = np.zeros(capacity)
+        self.attack_cooldown = np.zeros(capacity)
+        self.last_attack_time = np.zeros(capacity)
+        self.attacks_ready = np.zeros(capacity, dtype=np.int8)  # Биты ATTACK_* - какие атаки откатились
+        self.type_code = np.zeros(capacity, dtype=np.int8)
+        self.lod = np.zeros(capacity, dtype=np.int8)  # Уровень детализации по дистанции
+        self.visible = np.zeros(capacity, dtype=bool)  # В конусе обзора камеры
+        self.animation_lod = np.zeros(capacity, dtype=np.int8)  # Уровень, с которым сейчас играет Actor
+        self.move_dt = np.zeros(capacity)  # Время симуляции, накопленное с прошлого шага движения (LOD)
+
+    def _columns(self):
+        return ("position", "previous_position", "yaw", "type_code", "lod", "visible", "animation_lod",
+                "move_dt") + self.FIELDS
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        for name in self._columns():
+            column = getattr(self, name)
+            grown = np.zeros((new_capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+        self.capacity = new_capacity
+
+    def add(self, enemy, position, enemy_type):
+        if self.count == self.capacity:
+            self._grow()
+
+        slot = self.count
+        self.count += 1
+        self.owners.append(enemy)
+        for name in self._columns():
+            getattr(self, name)[slot] = 0
+        self.position[slot] = (position[0], position[1], position[2])
+        self.previous_position[slot] = self.position[slot]
+        self.type_code[slot] = ENEMY_TYPE_CODES.get(enemy_type, 0)
+        self.visible[slot] = True  # Новый враг анимирован полностью, пока LOD не решит иначе
+        return slot
+
+    def remove(self, enemy):
+        slot = enemy.store_slot
+        if slot is None:
+            return
+
+        # Значения остаются у объекта - на случай отложенных invoke, которые еще держат врага
+        enemy._detached = {name: getattr(self, name)[slot].item() for name in self.FIELDS}
+        enemy._detached["position"] = Vec3(*self.position[slot].tolist())
+        enemy.store_slot = None
+
+        last = self.count - 1
+        if slot != last:
+            for name in self._columns():
+                column = getattr(self, name)
+                column[slot] = column[last]
+            moved = self.owners[last]
+            self.owners[slot] = moved
+            moved.store_slot = slot
+        self.owners.pop()
+        self.count -= 1
+
+    def clear(self):
+        for enemy in self.owners[:]:
+            self.remove(enemy)
+
+    def distances_to(self, point):
+        """Расстояния от всех врагов до точки одним векторным шагом"""
+        offset = np.asarray(point, dtype=float) - self.position[:self.count]
+        return np.sqrt(np.einsum('ij,ij->i', offset, offset))
+
+
+def _enemy_store_field(name):
+    """Атрибут Enemy, который на самом деле лежит в колонке enemy_store"""
+
+    def getter(self):
+        if self.store_slot is None:
+            return self._detached[name]
+        return getattr(enemy_store, name)[self.store_slot].item()
+
+    def setter(self, value):
+        if self.store_slot is None:
+            self._detached[name] = value
+        else:
+            getattr(enemy_store, name)[self.store_slot] = value
+
+    return property(getter, setter)
+
+
+enemy_store = EnemyStore()
+
+
+class EnemyRegistry:
+    """Живые враги по handle: удаление перестановкой последнего, счетчики по типам и убийствам"""
+
+    def __init__(self):
+        self.enemies = []  # Плотный список живых врагов, порядок не сохраняется
+        self.by_handle = {}
+        self.counts = {enemy_type: 0 for enemy_type in ENEMY_TYPE_CODES}
+        self.reserved = 0  # Враги в очереди спавна - на карте они уже считаются
+        self.killed = 0  # Убито за текущую стадию
+        self.next_handle = 1
+
+    def add(self, enemy):
+        # Новый handle на каждую жизнь врага - старые invoke из пула его не узнают
+        enemy.handle = self.next_handle
+        self.next_handle += 1
+        enemy.registry_index = len(self.enemies)
+        self.enemies.append(enemy)
+        self.by_handle[enemy.handle] = enemy
+        self.counts[enemy.type] += 1
+
+    def remove(self, enemy):
+        """Убирает врага; False - если его уже убрали"""
+        if self.by_handle.get(enemy.handle) is not enemy:
+            return False
+
+        del self.by_handle[enemy.handle]
+        last = self.enemies.pop()
+        if last is not enemy:
+            self.enemies[enemy.registry_index] = last
+            last.registry_index = enemy.registry_index
+        enemy.registry_index = None
+        self.counts[enemy.type] -= 1
+        return True
+
+    def kill(self, enemy):
+        """Засчитывает убийство ровно один раз, даже если сработали два пути убийства"""
+        if not self.remove(enemy):
+            return False
+        self.killed += 1
+        return True
+
+    def is_alive(self, enemy, handle):
+        """Тот же враг в той же жизни (для отложенных invoke)"""
+        return self.by_handle.get(handle) is enemy
+
+    def count(self, enemy_type):
+        return self.counts.get(enemy_type, 0)
+
+    @property
+    def on_map(self):
+        return len(self.enemies) + self.reserved
+
+    def clear(self):
+        self.enemies.clear()
+        self.by_handle.clear()
+        for enemy_type in self.counts:
+            self.counts[enemy_type] = 0
+        self.reserved = 0
+        self.killed = 0
+
+
+enemy_registry = EnemyRegistry()
+enemies = enemy_registry.enemies  # Живые враги - только для чтения, меняет их enemy_registry
+
+
 class Enemy:
+    # Горячие поля живут в enemy_store - здесь только доступ к ним
+    health = _enemy_store_field("health")
+    chase_speed = _enemy_store_field("chase_speed")
+    attack_range = _enemy_store_field("attack_range")
+    detection_range = _enemy_store_field("detection_range")
+    attack_cooldown = _enemy_store_field("attack_cooldown")
+    last_attack_time = _enemy_store_field("last_attack_time")
+    attacks_ready = _enemy_store_field("attacks_ready")
+
     def __init__(self, position, enemy_type="normal"):
-        # 🎯 ОСНОВНЫЕ ХАРАКТЕРИСТИКИ
         self.type = enemy_type  # Тип врага: "normal", "medium", "boss"
         self.entity = None  # 3D-объект врага в мире Ursina
+        self.actor = None
+        self.store_slot = None
+        self._detached = {}
+        self.parked = False  # Лежит в пуле
+        self.handle = None  # Ключ в enemy_registry, новый на каждую жизнь
+        self.registry_index = None
+
+        self.activate(position)
+
+    def activate(self, position):
+        """(Пере)запускает врага: слот в массивах, сброс состояния, тело и характеристики типа"""
+        # Слот в массивах - до того, как начнем заполнять характеристики
+        self.store_slot = enemy_store.add(self, position, self.type)
+        self._detached = None
+        self.parked = False
+
+        # Новый враг может атаковать сразу - таймеры прошлой жизни из пула не действуют
+        self.attacks_ready = ATTACK_ALL
+        self.attack_timer_ids = {}
+
+        # 🎯 ОСНОВНЫЕ ХАРАКТЕРИСТИКИ
         self.health = 0  # Текущее здоровье врага
         self.max_health = 0  # Максимальное здоровье врага
         self.damage = 0  # Урон от атаки ближнего боя
@@ -1093,9 +2525,6 @@ class Enemy:
         self.chase_speed = 0  # Скорость преследования игрока
         self.detection_range = 0  # Дистанция обнаружения игрока
         self.is_chasing = False  # Флаг: преследует ли враг игрока
-        self.last_position = Vec3(position)  # Предыдущая позиция для проверки застревания
-        self.stuck_timer = 0  # Таймер застревания
-        self.stuck_threshold = 2.0  # Время до срабатывания анти-застревания
 
         self.hit_count = 0  # Количество полученных попаданий
 
@@ -1108,12 +2537,44 @@ class Enemy:
         # 🎯 ДИСТАНЦИИ АТАК
         self.wave_attack_range = 0  # Дистанция для активации атаки волной
         self.ranged_attack_range = 0  # Дистанция для стрельбы шарами
-        self.last_update_time = 0  # ⬅️ ДОБАВИЛИ для оптимизации
-        self.update_interval = 0.1
 
         self.setup_enemy(position)
 
+    def park(self):
+        """Прячет врага в пул: Entity выключена, анимация стоит, слот в массивах свободен"""
+        enemy_store.remove(self)
+        self.parked = True
+        if self.entity:
+            self.entity.enabled = False
+        if self.actor:
+            self.actor.stop()
+
+    @property
+    def position(self):
+        if self.store_slot is None:
+            return Vec3(self.entity.position) if self.entity else self._detached["position"]
+        return Vec3(*enemy_store.position[self.store_slot].tolist())
+
+    @position.setter
+    def position(self, value):
+        # Пишем и в массив, и в Entity - иначе коллайдер и модель разъедутся с симуляцией
+        if self.store_slot is not None:
+            enemy_store.position[self.store_slot] = (value[0], value[1], value[2])
+            enemy_grid.update(self, value[0], value[2])
+        if self.entity:
+            self.entity.position = value
+
     def setup_enemy(self, position):
+        # Тело создаем один раз - из пула враг возвращается со своими Actor и Entity
+        if self.entity is None:
+            self.create_body(position)
+        else:
+            self.entity.position = position
+            self.entity.rotation = Vec3(0, 0, 0)
+            self.entity.enabled = True
+            self.actor.setPlayRate(1.0, ENEMY_ANIMATION)
+            self.actor.loop(ENEMY_ANIMATION)
+
         if self.type == "normal":
             self.setup_normal(position)
         elif self.type == "medium":
@@ -1121,15 +2582,15 @@ class Enemy:
         elif self.type == "boss":
             self.setup_boss(position)
 
-    def setup_normal(self, position):
-        """Создает анимированного врага"""
+    def create_body(self, position):
+        """Создает анимированного врага: Actor из кэша внутри Entity-обертки с коллайдером"""
         # Загружаем анимированную модель
-        self.actor = Actor("ghoul3.glTF")  # или другой путь
+        self.actor = actor_cache.instantiate(ENEMY_MODEL)
 
         # Создаем Entity-обертку
         self.entity = Entity(
             position=position,
-            scale=0.02,
+            scale=ENEMY_SCALES.get(self.type, 0.02),
             collider='box'
         )
 
@@ -1138,9 +2599,10 @@ class Enemy:
         self.actor.setH(180)
 
         # Проигрываем анимацию
-        self.actor.loop("Ghoul.001")  # или другая анимация
-
+        self.actor.loop(ENEMY_ANIMATION)  # или другая анимация
 
+    def setup_normal(self, position):
+        """Характеристики слабого врага"""
         self.health = 1
         self.max_health = 1
         self.damage = 10
@@ -1152,20 +2614,7 @@ class Enemy:
         self.ranged_attack_range = 0
 
     def setup_medium(self, position):
-        """Создает анимированного среднего врага"""
-        self.actor = Actor("ghoul3.glTF")
-
-        self.entity = Entity(
-            position=position,
-            scale=0.03,
-            collider='box'
-        )
-
-        self.actor.reparent_to(self.entity)
-        self.actor.setH(180)
-        self.actor.loop("Ghoul.001")
-
-
+        """Характеристики среднего врага"""
         self.health = 2
         self.max_health = 2
         self.damage = 15
@@ -1177,20 +2626,7 @@ class Enemy:
         self.ranged_attack_range = 50
 
     def setup_boss(self, position):
-        """Создает анимированного босса"""
-        self.actor = Actor("ghoul3.glTF")
-
-        self.entity = Entity(
-            position=position,
-            scale=0.04,
-            collider='box'
-        )
-
-        self.actor.reparent_to(self.entity)
-        self.actor.setH(180)
-        self.actor.loop("Ghoul.001")
-
-
+        """Характеристики босса"""
         self.health = 5
         self.max_health = 5
         self.damage = 25
@@ -1205,6 +2641,67 @@ class Enemy:
         self.wave_attack_range = 30  # БОСС использует волну с 18 метров
         self.ranged_attack_range = 50
 
+
+class EnemyPool:
+    """Припаркованные враги по типам: волна собирается из готовых Actor и Entity"""
+
+    def __init__(self):
+        self.parked = {enemy_type: [] for enemy_type in ENEMY_TYPE_CODES}
+        self.stats = {"created": 0, "reused": 0, "released": 0, "dropped": 0}
+
+    @staticmethod
+    def _is_intact(enemy):
+        """Entity и Actor врага не удалены чужой очисткой сцены"""
+        if not enemy.entity or enemy.entity.is_empty():
+            return False
+        return enemy.actor is None or not enemy.actor.is_empty()
+
+    def _drop_broken(self, enemy_type):
+        """Выкидывает из пула врагов, чьи Entity или Actor уже удалены"""
+        parked = self.parked.setdefault(enemy_type, [])
+        intact = [enemy for enemy in parked if self._is_intact(enemy)]
+        if len(intact) != len(parked):
+            self.stats["dropped"] += len(parked) - len(intact)
+            parked[:] = intact
+        return parked
+
+    def acquire(self, position, enemy_type="normal"):
+        parked = self.parked.setdefault(enemy_type, [])
+        while parked and not self._is_intact(parked[-1]):
+            parked.pop()
+            self.stats["dropped"] += 1
+        if parked:
+            enemy = parked.pop()
+            enemy.activate(position)
+            self.stats["reused"] += 1
+        else:
+            enemy = Enemy(position, enemy_type)
+            self.stats["created"] += 1
+        return enemy
+
+    def release(self, enemy):
+        if enemy.parked:
+            return
+        enemy.park()
+        self.parked.setdefault(enemy.type, []).append(enemy)
+        self.stats["released"] += 1
+
+    def prewarm(self, enemy_type, count):
+        """Заранее создает врагов, чтобы в пуле их было не меньше count"""
+        parked = self._drop_broken(enemy_type)
+        while len(parked) < count:
+            enemy = Enemy(Vec3(0, -100, 0), enemy_type)
+            self.stats["created"] += 1
+            enemy.park()
+            parked.append(enemy)
+
+    def parked_entities(self):
+        """Выключенные Entity врагов в пуле - очистка сцены не должна их трогать"""
+        return [enemy.entity for parked in self.parked.values() for enemy in parked if enemy.entity]
+
+
+enemy_pool = EnemyPool()
+
 weapons_data = {
     "axe": {
         "name": "Топор",
@@ -3109,6 +4606,9 @@ def create_wall(p1, p2, thickness=0.3, height=1, color_wall=color.gray):
         collider='box',
         color=color.clear
     )
+    navigation_walls.append(wall)
+    # Стена после постройки сетки (например, при старте игры) - сетку перестроит следующий шаг врагов
+    nav_grid.invalidate()
 
     return wall
 
@@ -3125,7 +4625,8 @@ cl2_4 = Entity(model='cube', scale=(20,0.1, 20), position=(17, 77, 0), rotation=
                collider='box')
 
 
-location2 = Entity(model='locationtest2.glb', scale=80, position=(0, 1, 0), )
+LOCATION_MODEL = 'locationtest2.glb'
+location2 = Entity(model=LOCATION_MODEL, scale=80, position=(0, 1, 0), )
 cl1 = Entity(model='cube', scale=(1, 20, 40), position=(-16, 0, -290), color=color.clear,
              collider='box')
 cl2 = Entity(model='cube', scale=(1, 20, 50), position=(-24, 0, -248), rotation=(0, -20, 0), color=color.clear,
@@ -3194,6 +4695,9 @@ cl18 = Entity(model='cube', scale=(30, 1, 30), position=(-2, 1.5, -159), rotatio
 cl19 = Entity(model='cube', scale=(30, 1, 20), position=(45, 0, -15), rotation=(90, 0, 0), color=color.clear,
               collider='box')
 
+# Коробки карты для навигации (полы и пандусы NavGrid отсеет сам)
+navigation_boxes = [cl1, cl2, cl3, cl4, cl5, cl6, cl7, cl8, cl9, cl11, cl12, cl13, cl14, cl15, cl16, cl17, cl18, cl19]
+
 
 hahaluna=Entity(model='cube',scale=(100,0.1,100),position=(-180,80,130),rotation=(90,0,-60),texture='luna.png',collider='box')
 # ИСПРАВЛЯЕМ ЦВЕТ НЕБА (от 0 до 1 вместо 0-255)
@@ -3222,7 +4726,8 @@ def show_coordinates_console():
         coordinates_debug_timer = 0.0
 
 
-window.fullscreen = True
+if not HEADLESS_MODE:
+    window.fullscreen = True
 
 human = Entity(
     parent=scene, position=(-5, 0, 5))
@@ -3256,76 +4761,10 @@ button2.enabled = False
 in_dialogue = False
 
 
-def safe_update_enemy_projectiles():
-    """Безопасное обновление снарядов врагов"""
-    current_time = time.time()
-
-    for proj_idx in range(len(enemy_projectiles) - 1, -1, -1):
-        projectile = enemy_projectiles[proj_idx]
-
-        if not projectile or not projectile.enabled:
-            if proj_idx < len(enemy_projectiles):
-                enemy_projectiles.pop(proj_idx)
-            continue
-
-        # Проверяем время жизни
-        if hasattr(projectile, 'creation_time'):
-            age = current_time - projectile.creation_time
-            if age >= projectile.lifetime:
-                if hasattr(projectile, 'glow') and projectile.glow:
-                    destroy(projectile.glow)
-                if hasattr(projectile, 'tracer') and projectile.tracer:
-                    destroy(projectile.tracer)
-                destroy(projectile)
-                enemy_projectiles.pop(proj_idx)
-                continue
-
-        # Движение снаряда
-        projectile.position += projectile.direction * projectile.speed * time.dt
-
-        # Обновляем связанные эффекты
-        if hasattr(projectile, 'glow') and projectile.glow and projectile.glow.enabled:
-            projectile.glow.position = projectile.position
-
-        if hasattr(projectile, 'tracer') and projectile.tracer and projectile.tracer.enabled:
-            projectile.tracer.position = projectile.position - projectile.direction * 0.8
-            projectile.tracer.look_at(projectile.position)
-
-        # Проверка попадания в игрока
-        distance_to_player = (projectile.position - player.position).length()
-        if distance_to_player < 1.5:  # Радиус попадания
-            take_damage(projectile.damage)
-            print(f"💥 Снаряд попал в вас! Урон: {projectile.damage}")
-
-            # Эффект попадания
-            create_blood_effect_optimized(player.position + Vec3(0, 1, 0))
-
-            # Удаляем снаряд
-            if hasattr(projectile, 'glow') and projectile.glow:
-                destroy(projectile.glow)
-            if hasattr(projectile, 'tracer') and projectile.tracer:
-                destroy(projectile.tracer)
-            destroy(projectile)
-            enemy_projectiles.pop(proj_idx)
-
-
-def safe_update_effects():
-    """Обновляет все эффекты (кровь, трассеры, вспышки)"""
-    update_blood_effects_optimized()
-    update_shot_effects()
-    update_explosive_projectiles()
-
-
-def update_blood_effects_optimized():
+def update_blood_effects_optimized(step_dt):
     """Оптимизированное обновление эффектов крови"""
-    current_time = time.time()
-
-    # ОГРАНИЧИВАЕМ частоту обновления
-    if hasattr(update_blood_effects_optimized, 'last_update_time'):
-        if current_time - update_blood_effects_optimized.last_update_time < 0.1:  # Только 10 FPS
-            return
-
-    update_blood_effects_optimized.last_update_time = current_time
+    current_time = sim_clock.time
+    # Частоту (10 раз в сек) задает планировщик - step_dt это время с прошлого запуска
 
     cleaned = 0
     for blood_idx in range(len(blood_effects) - 1, -1, -1):
@@ -3351,8 +4790,8 @@ def update_blood_effects_optimized():
 
                         # УПРОЩЕННОЕ обновление (только позиция и прозрачность)
                         if speed > 0:
-                            particle.position += direction * speed * time.dt
-                            particle.position.y -= time.dt * blood_gravity
+                            particle.position += direction * speed * step_dt
+                            particle.position.y -= step_dt * blood_gravity
 
                         progress = age / blood_duration
                         particle.alpha = 1.0 - progress
@@ -3373,81 +4812,199 @@ def update_blood_effects_optimized():
         print(f"🩸 Оптимизация крови: {len(blood_effects)} групп, очищено {cleaned}")
 
 
-def update_enemies():
-    """Обновляет всех врагов"""
-    for enemy in enemies[:]:
-        if not enemy or not enemy.entity or not enemy.entity.enabled:
-            continue
+# ==================== LOD ВРАГОВ ====================
+# Уровни детализации по дистанции до игрока: 0 - рядом, 1 - средне, 2 - далеко.
+# ИИ дальних думает реже, анимация замедляется или встает на паузу, цвет не перекрашивается.
+
+ENEMY_LOD_NEAR_DISTANCE = 40
+ENEMY_LOD_MID_DISTANCE = 100
+ENEMY_LOD_AI_STRIDES = (1, 2, 4)  # ИИ и движение каждый 1-й / 2-й / 4-й тик
+ENEMY_LOD_ANIMATION_RATES = (1.0, 0.5, 0.0)  # 0 - анимация на паузе
+ENEMY_LOD_VIEW_COS = math.cos(math.radians(70))  # Конус обзора камеры с запасом
+ENEMY_LOD_ALWAYS_VISIBLE_DISTANCE = 6  # Вплотную враг виден, даже если центр вне конуса
 
-        # Проверяем время последнего обновления для оптимизации
-        current_time = time.time()
-        if current_time - enemy.last_update_time < enemy.update_interval:
-            continue
 
-        enemy.last_update_time = current_time
+def update_enemy_lod():
+    """Раскладывает врагов по уровням детализации и переключает их анимацию"""
+    count = enemy_store.count
+    if not count:
+        return
+
+    positions = enemy_store.position[:count]
+    distances = enemy_store.distances_to((player.position.x, player.position.y, player.position.z))
+    lod = np.where(distances < ENEMY_LOD_NEAR_DISTANCE, 0, np.where(distances < ENEMY_LOD_MID_DISTANCE, 1, 2))
+    enemy_store.lod[:count] = lod
+
+    # Попадание в обзор: угол между взглядом камеры и направлением на врага
+    eye = camera.world_position
+    forward = camera.forward
+    to_enemy = positions + (0.0, 1.0, 0.0) - (eye.x, eye.y, eye.z)
+    lengths = np.sqrt(np.einsum('ij,ij->i', to_enemy, to_enemy))
+    facing = to_enemy @ (forward.x, forward.y, forward.z) >= lengths * ENEMY_LOD_VIEW_COS
+    visible = facing | (lengths < ENEMY_LOD_ALWAYS_VISIBLE_DISTANCE)
+    enemy_store.visible[:count] = visible
+
+    # Невидимых не анимируем вообще, видимых - по дистанции
+    animation_lod = np.where(visible, lod, 2)
+    changed = np.flatnonzero(animation_lod != enemy_store.animation_lod[:count])
+    owners = enemy_store.owners
+    for slot, level in zip(changed.tolist(), animation_lod[changed].tolist()):
+        set_enemy_animation_lod(owners[slot], level)
+        enemy_store.animation_lod[slot] = level
+
+
+def set_enemy_animation_lod(enemy, level):
+    actor = getattr(enemy, 'actor', None)
+    if not actor:
+        return
 
-        dist_to_player = (enemy.entity.position - player.position).length()
+    rate = ENEMY_LOD_ANIMATION_RATES[level]
+    try:
+        if rate <= 0:
+            actor.stop()
+        else:
+            actor.setPlayRate(rate, ENEMY_ANIMATION)
+            actor.loop(ENEMY_ANIMATION, restart=0)
+    except Exception as e:
+        print(f"⚠️ Ошибка LOD анимации врага: {e}")
 
-        if dist_to_player <= enemy.detection_range:
-            enemy.is_chasing = True
 
-            if dist_to_player > enemy.attack_range:
-                target_height = 1.5  # На сколько выше ног идти
-                target_point = player.position + Vec3(0, target_height, 0)
+# ==================== ПЕРЕЗАРЯДКА АТАК ====================
+# Вместо сравнения "сейчас - время прошлой атаки" у каждого врага на каждом тике
+# атака после срабатывания ставит в кучу момент, когда она снова будет готова.
+# За шаг снимаются только наступившие таймеры, готовность - бит в enemy_store.attacks_ready.
 
-                # 2. Двигаемся к этой точке
-                direction = (target_point - enemy.entity.position).normalized()
-                enemy.entity.position += direction * enemy.chase_speed * time.dt
+ATTACK_MELEE = 1
+ATTACK_RANGED = 2
+ATTACK_SPECIAL = 4  # Волна босса
+ATTACK_CHARGE = 8  # Разбег босса
+ATTACK_ALL = ATTACK_MELEE | ATTACK_RANGED | ATTACK_SPECIAL | ATTACK_CHARGE
 
-                # 3. Поворачиваемся смотреть на игрока (только горизонталь)
-                # Берем направление в 2D (XZ плоскость), игнорируем высоту
-                dx = player.position.x - enemy.entity.position.x
-                dz = player.position.z - enemy.entity.position.z
 
-                if abs(dz) > 0.001:  # Маленькое число вместо 0
-                    angle_y = math.degrees(math.atan2(dx, dz))
-                    enemy.entity.rotation_y = angle_y  # Попробуй с минусом или без
+class AttackTimers:
+    """Куча (момент готовности, номер, атака, враг) - срабатывают только наступившие"""
 
-                # 4. Убираем наклоны
-                enemy.entity.rotation_x = 0
-                enemy.entity.rotation_z = 0
+    def __init__(self):
+        self.heap = []
+        self.sequence = 0
+        self.fired = 0
+
+    def start(self, enemy, attack, delay, now):
+        """Атака ушла на перезарядку на delay секунд"""
+        enemy.attacks_ready &= ~attack
+        self.sequence += 1
+        # Перезапуск таймера той же атаки делает старую запись в куче устаревшей
+        enemy.attack_timer_ids[attack] = self.sequence
+        heapq.heappush(self.heap, (now + delay, self.sequence, attack, enemy))
+
+    def fire_due(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            _, sequence, attack, enemy = heapq.heappop(heap)
+            # Враг уже в пуле или таймер перезапущен - запись устарела
+            if enemy.store_slot is None or enemy.attack_timer_ids.get(attack) != sequence:
+                continue
+            del enemy.attack_timer_ids[attack]
+            enemy.attacks_ready |= attack
+            self.fired += 1
+
+    def clear(self):
+        self.heap.clear()
+
+
+attack_timers = AttackTimers()
+
+
+def update_attack_timers():
+    attack_timers.fire_due(sim_clock.time)
+
+
+def start_attack_cooldown(enemy, now):
+    """Ближняя и дистанционная атаки делят last_attack_time - обе уходят на перезарядку"""
+    enemy.last_attack_time = now
+    attack_timers.start(enemy, ATTACK_MELEE, enemy.attack_cooldown, now)
+    if enemy.type == "boss":
+        attack_timers.start(enemy, ATTACK_RANGED, enemy.attack_cooldown * 0.5, now)
+    elif enemy.type == "medium":
+        attack_timers.start(enemy, ATTACK_RANGED, enemy.attack_cooldown, now)
+
+
+def update_enemies():
+    """ИИ врагов: атаки и визуал. Частоту задает планировщик, движение - в safe_update_enemies_optimized"""
+    # Выключенные, но не удаленные враги - возвращаем в пул
+    for enemy in [enemy for enemy in enemy_store.owners if not enemy.entity or not enemy.entity.enabled]:
+        release_enemy(enemy)
+
+    count = enemy_store.count
+    if not count:
+        return
+
+    current_time = sim_clock.time
+    if not hasattr(update_enemies, 'tick'):
+        update_enemies.tick = 0
+    update_enemies.tick += 1
+
+    # Дальние враги думают реже - тики раскиданы по слотам, чтобы не думать всем разом
+    strides = np.array(ENEMY_LOD_AI_STRIDES)[enemy_store.lod[:count]]
+    thinking = (update_enemies.tick + np.arange(count)) % strides == 0
+
+    # Дистанции и готовность ближней атаки - для всей волны сразу
+    player_position = (player.position.x, player.position.y, player.position.z)
+    distances = enemy_store.distances_to(player_position)
+    detected = thinking & (distances <= enemy_store.detection_range[:count])
+    melee_ready = (detected & (distances <= enemy_store.attack_range[:count]) &
+                   ((enemy_store.attacks_ready[:count] & ATTACK_MELEE) != 0))
+    # Цвет перекрашиваем только у близких и видимых
+    detailed = (enemy_store.lod[:count] == 0) & enemy_store.visible[:count]
+
+    # Снимок слотов: атаки могут убрать врага и переставить слоты
+    owners = enemy_store.owners[:count]
+    distance_list = distances.tolist()
+    melee_list = melee_ready.tolist()
+    detailed_list = detailed.tolist()
+
+    for slot in np.flatnonzero(detected).tolist():
+        enemy = owners[slot]
+        if not enemy.entity or not enemy.entity.enabled:
+            continue
 
-            if dist_to_player <= enemy.attack_range:
-                if current_time - enemy.last_attack_time >= enemy.attack_cooldown:
-                    attack_player(enemy)
-                    enemy.last_attack_time = current_time
+        dist_to_player = distance_list[slot]
+        enemy.is_chasing = True
 
-            # Проверка застревания
-            check_enemy_stuck(enemy)
+        if melee_list[slot]:
+            attack_player(enemy)
+            start_attack_cooldown(enemy, current_time)
 
-            # Обновляем визуал
+        # Обновляем визуал
+        if detailed_list[slot]:
             update_enemy_visuals(enemy)
 
-            # Специальные атаки для босса
-            if enemy.type == "boss":
-                # Атака волной
-                if dist_to_player <= enemy.wave_attack_range:
-                    if current_time - enemy.last_special_attack_time >= enemy.special_attack_cooldown:
-                        boss_special_attack(enemy)
-                        enemy.last_special_attack_time = current_time
-
-                # Атака с разбегом
-                if dist_to_player <= enemy.ranged_attack_range:
-                    if current_time - enemy.last_charge_attack_time >= enemy.charge_attack_cooldown:
-                        boss_charge_attack(enemy)
-                        enemy.last_charge_attack_time = current_time
-
-                # Дистанционная атака
-                if dist_to_player > enemy.attack_range and dist_to_player <= enemy.ranged_attack_range:
-                    if current_time - enemy.last_attack_time >= enemy.attack_cooldown * 0.5:
-                        boss_ranged_attack(enemy)
-                        enemy.last_attack_time = current_time
-
-            # Дистанционная атака для средних врагов
-            elif enemy.type == "medium" and dist_to_player > enemy.attack_range and dist_to_player <= enemy.ranged_attack_range:
-                if current_time - enemy.last_attack_time >= enemy.attack_cooldown:
-                    ranged_attack(enemy)
-                    enemy.last_attack_time = current_time
+        # Специальные атаки для босса
+        if enemy.type == "boss":
+            ready = enemy.attacks_ready
+
+            # Атака волной
+            if dist_to_player <= enemy.wave_attack_range and ready & ATTACK_SPECIAL:
+                boss_special_attack(enemy)
+                enemy.last_special_attack_time = current_time
+                attack_timers.start(enemy, ATTACK_SPECIAL, enemy.special_attack_cooldown, current_time)
+
+            # Атака с разбегом
+            if dist_to_player <= enemy.ranged_attack_range and ready & ATTACK_CHARGE:
+                boss_charge_attack(enemy)
+                enemy.last_charge_attack_time = current_time
+                attack_timers.start(enemy, ATTACK_CHARGE, enemy.charge_attack_cooldown, current_time)
+
+            # Дистанционная атака (melee_list уже мог снять бит - читаем заново)
+            if enemy.attack_range < dist_to_player <= enemy.ranged_attack_range and enemy.attacks_ready & ATTACK_RANGED:
+                boss_ranged_attack(enemy)
+                start_attack_cooldown(enemy, current_time)
+
+        # Дистанционная атака для средних врагов
+        elif enemy.type == "medium" and enemy.attack_range < dist_to_player <= enemy.ranged_attack_range:
+            if enemy.attacks_ready & ATTACK_RANGED:
+                ranged_attack(enemy)
+                start_attack_cooldown(enemy, current_time)
 
 
 def start_stage_animation(stage_number):
@@ -3466,10 +5023,17 @@ def start_stage_animation(stage_number):
 
     # Настраиваем анимацию
     stage_animation["is_playing"] = True
-    stage_animation["start_time"] = time.time()
+    stage_animation["start_time"] = sim_clock.time
     stage_animation["duration"] = duration
     stage_animation["type"] = animation_type
 
+    # Следующая волна собирается в пуле, пока идет заставка
+    queue_stage_prespawn(stage_number)
+
+    # В HEADLESS НЕТ ЭКРАНА - ТОЛЬКО ТАЙМИНГ АНИМАЦИИ
+    if HEADLESS_MODE:
+        return
+
     # Создаем черный экран только для первой стадии
     if animation_type == "first_stage":
         if not stage_animation["black_screen"]:
@@ -3512,33 +5076,35 @@ def update_stage_animation():
     if not stage_animation["is_playing"]:
         return
 
-    current_time = time.time()
+    current_time = sim_clock.time
     progress = (current_time - stage_animation["start_time"]) / stage_animation["duration"]
 
-    # Анимация для первой стадии (6 секунд)
-    if stage_animation["type"] == "first_stage":
-        if progress < 0.5:
-            # Первые 3 секунды - показываем текст и черный фон
-            stage_animation["stage_text"].alpha = 1.0
-            stage_animation["black_screen"].color = color.rgba(0, 0, 0, 1.0)
-        else:
-            # Последние 3 секунды - плавно исчезаем
-            fade_progress = (progress - 0.5) / 0.5
-            stage_animation["stage_text"].alpha = 1.0 - fade_progress
-            stage_animation["black_screen"].color = color.rgba(0, 0, 0, 1.0 - fade_progress)
+    # Оверлей создается только при наличии экрана (в headless его нет)
+    if stage_animation["stage_text"]:
+        # Анимация для первой стадии (6 секунд)
+        if stage_animation["type"] == "first_stage":
+            if progress < 0.5:
+                # Первые 3 секунды - показываем текст и черный фон
+                stage_animation["stage_text"].alpha = 1.0
+                stage_animation["black_screen"].color = color.rgba(0, 0, 0, 1.0)
+            else:
+                # Последние 3 секунды - плавно исчезаем
+                fade_progress = (progress - 0.5) / 0.5
+                stage_animation["stage_text"].alpha = 1.0 - fade_progress
+                stage_animation["black_screen"].color = color.rgba(0, 0, 0, 1.0 - fade_progress)
 
-    # Анимация для следующих стадий (3 секунды)
-    else:
-        if progress < 0.3:
-            # Появление текста (0.9 сек)
-            stage_animation["stage_text"].alpha = progress / 0.3
-        elif progress < 0.7:
-            # Текст виден (1.2 сек)
-            stage_animation["stage_text"].alpha = 1.0
+        # Анимация для следующих стадий (3 секунды)
         else:
-            # Исчезновение текста (0.9 сек)
-            fade_progress = (progress - 0.7) / 0.3
-            stage_animation["stage_text"].alpha = 1.0 - fade_progress
+            if progress < 0.3:
+                # Появление текста (0.9 сек)
+                stage_animation["stage_text"].alpha = progress / 0.3
+            elif progress < 0.7:
+                # Текст виден (1.2 сек)
+                stage_animation["stage_text"].alpha = 1.0
+            else:
+                # Исчезновение текста (0.9 сек)
+                fade_progress = (progress - 0.7) / 0.3
+                stage_animation["stage_text"].alpha = 1.0 - fade_progress
 
     # Завершение анимации
     if progress >= 1.0:
@@ -3548,7 +5114,7 @@ def update_stage_animation():
 def finish_stage_animation():
     """Завершает анимацию и запускает спавн врагов"""
     global stage_animation, enemies_spawned_for_current_stage
-    global stage_enemies_spawned, stage_enemies_killed, enemies_to_kill_for_stage
+    global stage_enemies_spawned, enemies_to_kill_for_stage
 
     print(f"✅ Анимация завершена, спавним врагов для Stage {current_stage}...")
 
@@ -3562,13 +5128,13 @@ def finish_stage_animation():
     stage_animation["is_playing"] = False
 
     # СПАВНИМ ВРАГОВ ПОСЛЕ АНИМАЦИИ
-    stage_enemies_killed = 0
+    enemy_registry.killed = 0
     spawn_stage_enemies_simple()
     enemies_spawned_for_current_stage = True
     stage_enemies_spawned = True
-    enemies_to_kill_for_stage = total_enemies_on_map
+    enemies_to_kill_for_stage = enemy_registry.on_map
 
-    reset_performance()
+    # reset_performance() и очистка рендера уже сделаны под заставкой (queue_stage_prespawn)
     update_shader_intensity()
 
     print(f"🎯 STAGE {current_stage} начался! Убейте {enemies_to_kill_for_stage} врагов")
@@ -3576,28 +5142,55 @@ def finish_stage_animation():
     # СПЕЦИАЛЬНЫЕ СОБЫТИЯ
     if current_stage == 10 and "assault_rifle" not in unlocked_weapons:
         print("🎉 10 STAGE! Поищите автомат на карте!")
-        invoke(spawn_assault_rifle_pickup, delay=2.0)
+        invoke(spawn_queue.push, "weapon_pickup", spawn_assault_rifle_pickup, delay=2.0)
 
     elif current_stage == 15 and "dual_uzi" not in unlocked_weapons:
         print("🎉 15 STAGE! Поищите Dual Uzi на карте!")
-        invoke(spawn_dual_uzi_pickup, delay=2.0)
+        invoke(spawn_queue.push, "weapon_pickup", spawn_dual_uzi_pickup, delay=2.0)
         show_mission_text("ЗАДАНИЕ: Найдите Dual Uzi!!!")
 
     elif current_stage == 20 and "grenade_launcher" not in unlocked_weapons:
         print("🎉 20 STAGE! Поищите гранатомет на карте!")
-        invoke(spawn_grenade_launcher_pickup, delay=2.0)
+        invoke(spawn_queue.push, "weapon_pickup", spawn_grenade_launcher_pickup, delay=2.0)
         show_mission_text("Задаааани##$:Na$^%ydi 545t mo45delName:Gre24$^&nade")
 
     if current_stage % 5 == 0:
         spawn_healkits()
-        safe_render_cleanup()
         spawn_ammo_boxes()
         print(f"🎁 Бонусы на stage {current_stage}!")
 
 
+def prespawn_enemy(enemy_type, target):
+    """Задание очереди: один выключенный враг в пул, если там их еще меньше target"""
+    parked = enemy_pool.parked[enemy_type]
+    if len(parked) < target:
+        enemy_pool.prewarm(enemy_type, len(parked) + 1)
+
+
+def queue_stage_prespawn(stage_number):
+    """Заставка стадии началась: очистка и сборка волны встают в spawn_queue и идут по ее бюджету кадра.
+    Модель гуля уже в actor_cache - под заставкой создаются только копии Actor, по одной на задание"""
+    # Те же формулы, что в spawn_stage_enemies_simple
+    wave = plan_stage_wave(stage_number)
+    needed = {
+        "normal": max(0, wave["normal"] - enemy_registry.on_map),
+        "medium": max(0, wave["medium"] - enemy_registry.count("medium")),
+        "boss": max(0, wave["boss"] - enemy_registry.count("boss")),
+    }
+
+    # Тяжелая очистка - под заставкой, а не в первом кадре стадии; припаркованные враги защищены
+    spawn_queue.push("stage_cleanup", reset_performance)
+    if stage_number % 5 == 0:
+        spawn_queue.push("stage_cleanup", safe_render_cleanup)
+
+    for enemy_type, target in needed.items():
+        for _ in range(target - len(enemy_pool.parked[enemy_type])):
+            spawn_queue.push("enemy_prespawn", prespawn_enemy, enemy_type, target)
+
+
 def update_stage():
     """Простая логика обновления стадии"""
-    global stage_enemies_spawned, stage_enemies_killed, enemies_to_kill_for_stage
+    global stage_enemies_spawned, enemies_to_kill_for_stage
     global current_mission_text, enemies_spawned_for_current_stage, stage_animation
 
     # Если враги уже заспавнены или идет анимация - выходим
@@ -3680,7 +5273,7 @@ def spawn_dual_uzi_pickup():
 
     def update_glow():
         if glow and glow.enabled:
-            pulse = math.sin(time.time() * 5) * 0.2 + 0.8
+            pulse = math.sin(sim_clock.time * 5) * 0.2 + 0.8
             glow.scale = 2.5 * pulse
             invoke(update_glow, delay=1 / 30)
 
@@ -3694,6 +5287,7 @@ def spawn_dual_uzi_pickup():
         'glow': glow,
         'weapon_type': 'dual_uzi'
     })
+    weapon_pickup_grid.insert(weapon_pickups[-1], dual_uzi_pickup.x, dual_uzi_pickup.z)
 
     print("🔫 Dual Uzi заспавнен на карте! Найдите его!")
     return dual_uzi_pickup
@@ -3742,7 +5336,7 @@ def spawn_grenade_launcher_pickup():
 
     def update_glow():
         if glow and glow.enabled:
-            pulse = math.sin(time.time() * 5) * 0.2 + 0.8
+            pulse = math.sin(sim_clock.time * 5) * 0.2 + 0.8
             glow.scale = 2.5 * pulse
             invoke(update_glow, delay=1 / 30)
 
@@ -3756,63 +5350,80 @@ def spawn_grenade_launcher_pickup():
         'glow': glow,
         'weapon_type': 'grenade_launcher'
     })
+    weapon_pickup_grid.insert(weapon_pickups[-1], grenade_launcher_pickup.x, grenade_launcher_pickup.z)
 
     print("🚀 Гранатомет заспавнен на карте! Найдите его!")
     return grenade_launcher_pickup
 
 
 # ФУНКЦИЯ СПАВНА ВРАГОВ ДЛЯ ТЕКУЩЕГО СТЕЙДЖА
+def plan_stage_wave(stage):
+    """Сколько врагов каждого типа должно быть на карте в стадии"""
+    return {
+        "normal": 3 + (stage - 1) * 3,
+        "medium": stage // 5,
+        "boss": stage // 10,
+    }
+
+
 def spawn_stage_enemies_simple():
     """Простой спавн врагов без сложных проверок"""
-    global total_enemies_on_map
 
     print(f"🔄 Спавн врагов для stage {current_stage}...")
 
+    wave = plan_stage_wave(current_stage)
+
     # ОБЩЕЕ КОЛИЧЕСТВО СЛАБЫХ ВРАГОВ
-    total_normal_required = 3 + (current_stage - 1) * 3
-    normal_enemies_to_spawn = max(0, total_normal_required - total_enemies_on_map)
+    total_normal_required = wave["normal"]
+    normal_enemies_to_spawn = max(0, total_normal_required - enemy_registry.on_map)
 
     print(f"📌 Должно быть слабых: {total_normal_required}")
-    print(f"📌 Сейчас на карте: {total_enemies_on_map}")
+    print(f"📌 Сейчас на карте: {enemy_registry.on_map}")
     print(f"📌 Нужно доспавнить слабых: {normal_enemies_to_spawn}")
 
-    # СПАВНИМ СЛАБЫХ
+    # СПАВНИМ СЛАБЫХ (через очередь - по несколько за кадр)
     for i in range(normal_enemies_to_spawn):
-        if spawn_enemy_at_random_position("normal"):
-            total_enemies_on_map += 1
+        queue_enemy_spawn("normal")
 
-    # СРЕДНИЕ ВРАГИ
-    medium_count = current_stage // 5
-    current_medium_count = count_enemies_by_type("medium")
+    # СРЕДНИЕ ВРАГИ (те, что еще в очереди, тоже считаются)
+    medium_count = wave["medium"]
+    current_medium_count = enemy_registry.count("medium") + spawn_queue.pending("enemy_medium")
     medium_to_spawn = max(0, medium_count - current_medium_count)
 
     for i in range(medium_to_spawn):
-        if spawn_enemy_at_random_position("medium"):
-            total_enemies_on_map += 1
-            print(f"⚔️ Средний враг добавлен! ({current_medium_count + i + 1}/{medium_count})")
+        queue_enemy_spawn("medium")
+        print(f"⚔️ Средний враг в очереди! ({current_medium_count + i + 1}/{medium_count})")
 
     # БОССЫ
-    boss_count = current_stage // 10
-    current_boss_count = count_enemies_by_type("boss")
+    boss_count = wave["boss"]
+    current_boss_count = enemy_registry.count("boss") + spawn_queue.pending("enemy_boss")
     boss_to_spawn = max(0, boss_count - current_boss_count)
 
     for i in range(boss_to_spawn):
-        if spawn_enemy_at_random_position("boss"):
-            total_enemies_on_map += 1
-            print(f"👑 БОСС добавлен! ({current_boss_count + i + 1}/{boss_count})")
+        queue_enemy_spawn("boss")
+        print(f"👑 БОСС в очереди! ({current_boss_count + i + 1}/{boss_count})")
 
-    print(f"📊 Теперь врагов на карте: {total_enemies_on_map}")
-    print(
-        f"🎯 Состав: {count_enemies_by_type('normal')} слабых, {count_enemies_by_type('medium')} средних, {count_enemies_by_type('boss')} боссов")
+    print(f"📊 Теперь врагов на карте: {enemy_registry.on_map} (в очереди спавна: {len(spawn_queue.jobs)})")
 
 
-# ФУНКЦИЯ ДЛЯ ПОДСЧЕТА ВРАГОВ ПО ТИПУ
-def count_enemies_by_type(enemy_type):
-    count = 0
-    for enemy in enemies:
-        if enemy and enemy.type == enemy_type and enemy.entity.enabled:
-            count += 1
-    return count
+def queue_enemy_spawn(enemy_type):
+    """Ставит врага в очередь спавна. На карте он считается сразу - цель стадии не меняется"""
+    enemy_registry.reserved += 1
+    spawn_queue.push("enemy_" + enemy_type, spawn_queued_enemy, enemy_type, on_fail=cancel_enemy_spawn)
+
+
+def spawn_queued_enemy(enemy_type):
+    # Бронь снимаем до спавна - сам враг попадет в enemy_registry через create_enemy
+    enemy_registry.reserved -= 1
+    return spawn_enemy_at_random_position(enemy_type)
+
+
+def cancel_enemy_spawn():
+    """Враг из очереди так и не появился - убираем его из цели стадии"""
+    global enemies_to_kill_for_stage
+
+    enemies_to_kill_for_stage -= 1
+    check_stage_completion()
 
 
 def check_stage_completion():
@@ -3823,7 +5434,10 @@ def check_stage_completion():
     if not enemies_spawned_for_current_stage or stage_animation["is_playing"]:
         return
 
-    if stage_enemies_killed >= enemies_to_kill_for_stage:
+    if stage_progression_locked:
+        return
+
+    if enemy_registry.killed >= enemies_to_kill_for_stage:
         print(f"🎉 Stage {current_stage} завершён!")
 
         # Сбрасываем флаги для следующей стадии
@@ -3843,56 +5457,206 @@ def check_stage_completion():
         print(f"🔄 Stage {current_stage} начинается...")
 
 
-def spawn_enemy_at_random_position(enemy_type):
-    try:
-        # 3 зоны спавна врагов
-        spawn_zones = [
-            # Зона 1: (80, 5, 1) ± 10 единиц
-            {
-                "center": Vec3(80, 5, 1),
-                "range": 10,
-                "name": "Зона 1 (80, 5, 1)"
-            },
-            # Зона 2: (86, 14, -159) ± 10 единиц
-            {
-                "center": Vec3(86, 14, -159),
-                "range": 10,
-                "name": "Зона 2 (86, 14, -159)"
-            },
-            # Зона 3: (-68, 1, -181) ± 10 единиц
-            {
-                "center": Vec3(-68, 1, -181),
-                "range": 10,
-                "name": "Зона 3 (-68, 1, -181)"
-            }
-        ]
+# ==================== ТОЧКИ СПАВНА ====================
+# Точки для врагов и пикапов считаются один раз при загрузке: Пуассоновский диск
+# (точки не ближе SPACING друг к другу) без клеток, занятых стенами nav_grid.
+# Результат лежит в SPAWN_POINTS_CACHE и пересчитывается, только если поменялись зоны или стены.
+
+SPAWN_POINTS_CACHE = cache_path("spawn_points_cache.json")
+SPAWN_POINTS_SEED = 2024
+SPAWN_POINT_SPACING = {"enemy": 2.0, "pickup": 3.0}
+ENEMY_SPAWN_MIN_DISTANCE = 15  # Враг не появляется ближе к игроку
+PICKUP_SPAWN_MIN_DISTANCE = 10
+
+# 3 зоны спавна врагов: центр ± range по X и Z
+ENEMY_SPAWN_ZONES = [
+    {"name": "Зона 1 (80, 5, 1)", "center": (80, 5, 1), "range": 10},
+    {"name": "Зона 2 (86, 14, -159)", "center": (86, 14, -159), "range": 10},
+    {"name": "Зона 3 (-68, 1, -181)", "center": (-68, 1, -181), "range": 10},
+]
+
+# 2 области для аптечек и патронов
+PICKUP_SPAWN_AREAS = [
+    {"name": "ОСНОВНАЯ ЗОНА", "x": (43, 63), "z": (-116, -46), "y": 2},
+    {"name": "ВТОРАЯ ЗОНА (радиус 25)", "x": (-56, -6), "z": (-203, -153), "y": 2},
+]
+
+
+def poisson_disk_points(x_range, z_range, spacing, rng, attempts=30):
+    """Точки в прямоугольнике не ближе spacing друг к другу (алгоритм Бридсона)"""
+    cell_size = spacing / math.sqrt(2)
+    width = x_range[1] - x_range[0]
+    depth = z_range[1] - z_range[0]
+    cols = int(math.ceil(width / cell_size))
+    rows = int(math.ceil(depth / cell_size))
+    grid = [[None] * cols for _ in range(rows)]
+
+    def fits(x, z):
+        cx = int(x / cell_size)
+        cz = int(z / cell_size)
+        for row in range(max(0, cz - 2), min(rows, cz + 3)):
+            for col in range(max(0, cx - 2), min(cols, cx + 3)):
+                other = grid[row][col]
+                if other and (other[0] - x) ** 2 + (other[1] - z) ** 2 < spacing * spacing:
+                    return False
+        return True
+
+    first = (rng.uniform(0, width), rng.uniform(0, depth))
+    points = [first]
+    grid[int(first[1] / cell_size)][int(first[0] / cell_size)] = first
+    active = [first]
+
+    while active:
+        index = rng.randrange(len(active))
+        base_x, base_z = active[index]
+        for _ in range(attempts):
+            angle = rng.uniform(0, 2 * math.pi)
+            radius = rng.uniform(spacing, 2 * spacing)
+            x = base_x + math.cos(angle) * radius
+            z = base_z + math.sin(angle) * radius
+            if 0 <= x < width and 0 <= z < depth and fits(x, z):
+                point = (x, z)
+                points.append(point)
+                grid[int(z / cell_size)][int(x / cell_size)] = point
+                active.append(point)
+                break
+        else:
+            active.pop(index)
+
+    return [(x + x_range[0], z + z_range[0]) for x, z in points]
+
 
-        # Выбираем случайную зону
-        zone = random.choice(spawn_zones)
+class SpawnPointSet:
+    """Готовые точки одной зоны: выбор за O(1) с проверкой дистанции до игрока"""
 
-        # Генерируем случайную позицию в выбранной зоне
-        x = random.uniform(zone["center"].x - zone["range"], zone["center"].x + zone["range"])
-        y = zone["center"].y  # Используем высоту зоны
-        z = random.uniform(zone["center"].z - zone["range"], zone["center"].z + zone["range"])
+    DRAW_TRIES = 8  # Случайных попыток до полного фильтра по дистанции
 
-        spawn_pos = Vec3(x, y, z)
+    def __init__(self, name, points):
+        self.name = name
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
 
-        print(f"📍 Спавн врага в {zone['name']}:")
-        print(f"   Центр: X={zone['center'].x:.1f}, Y={zone['center'].y:.1f}, Z={zone['center'].z:.1f}")
-        print(f"   Позиция: X={spawn_pos.x:.1f}, Y={spawn_pos.y:.1f}, Z={spawn_pos.z:.1f}")
+    def draw(self, avoid, min_distance):
+        """Случайная точка дальше min_distance от avoid, None - если таких нет"""
+        count = len(self.points)
+        if not count:
+            return None
+
+        avoid = np.array((avoid.x, avoid.y, avoid.z))
+        for _ in range(self.DRAW_TRIES):
+            point = self.points[random.randrange(count)]
+            if np.linalg.norm(point - avoid) >= min_distance:
+                return Vec3(*point.tolist())
+
+        # Игрок стоит в зоне - выбираем только из дальних точек
+        offsets = self.points - avoid
+        far = np.flatnonzero(np.einsum('ij,ij->i', offsets, offsets) >= min_distance * min_distance)
+        if not len(far):
+            return None
+        return Vec3(*self.points[far[random.randrange(len(far))]].tolist())
+
+
+class SpawnPoints:
+    """Наборы точек для врагов (3 зоны) и пикапов (2 области) с кэшем на диске"""
+
+    def __init__(self, cache_path=SPAWN_POINTS_CACHE):
+        self.cache_path = cache_path
+        self.sets = {"enemy": [], "pickup": []}  # Вид -> SpawnPointSet по зонам
+
+    def _zone_rectangles(self):
+        rectangles = []
+        for zone in ENEMY_SPAWN_ZONES:
+            x, y, z = zone["center"]
+            rectangles.append(("enemy", zone["name"], (x - zone["range"], x + zone["range"]),
+                               (z - zone["range"], z + zone["range"]), y))
+        for area in PICKUP_SPAWN_AREAS:
+            rectangles.append(("pickup", area["name"], area["x"], area["z"], area["y"]))
+        return rectangles
+
+    def _cache_key(self):
+        # Ключ - зоны, шаг, сид и занятые клетки: поменялась карта - точки пересчитываются
+        digest = hashlib.sha1()
+        digest.update(json.dumps([self._zone_rectangles(), SPAWN_POINT_SPACING, SPAWN_POINTS_SEED]).encode("utf-8"))
+        if nav_grid.blocked is not None:
+            digest.update(repr((nav_grid.origin_x, nav_grid.origin_z, nav_grid.blocked.shape)).encode("utf-8"))
+            digest.update(np.packbits(nav_grid.blocked).tobytes())
+        return digest.hexdigest()
+
+    def _build(self):
+        rng = random.Random(SPAWN_POINTS_SEED)
+        zones = []
+        for kind, name, x_range, z_range, y in self._zone_rectangles():
+            flat = np.array(poisson_disk_points(x_range, z_range, SPAWN_POINT_SPACING[kind], rng)).reshape(-1, 2)
+            # Отбрасываем точки внутри стен
+            free = ~nav_grid.is_blocked(flat[:, 0], flat[:, 1])
+            points = [[x, y, z] for x, z in flat[free].tolist()]
+            zones.append({"kind": kind, "name": name, "points": points})
+        return zones
+
+    def load_or_build(self):
+        # Сетка стен нужна и для проверки точек, и для ключа кэша
+        if nav_grid.blocked is None:
+            nav_grid.build(navigation_walls + navigation_boxes)
+
+        key = self._cache_key()
+        zones = None
+        try:
+            with open(self.cache_path, encoding="utf-8") as file:
+                cached = json.load(file)
+            if cached.get("key") == key:
+                zones = cached["zones"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Кэш точек спавна не прочитан: {e}")
+
+        if zones is None:
+            zones = self._build()
+            try:
+                with open(self.cache_path, "w", encoding="utf-8") as file:
+                    json.dump({"key": key, "zones": zones}, file)
+            except Exception as e:
+                print(f"⚠️ Кэш точек спавна не сохранен: {e}")
+            print(f"📍 Точки спавна посчитаны заново ({self.cache_path})")
+
+        self.sets = {"enemy": [], "pickup": []}
+        for zone in zones:
+            self.sets[zone["kind"]].append(SpawnPointSet(zone["name"], zone["points"]))
+        print("📍 Точки спавна: " + ", ".join(f"{point_set.name}: {len(point_set.points)}"
+                                             for point_sets in self.sets.values() for point_set in point_sets))
+
+    def draw(self, kind, avoid, min_distance):
+        """Точка из случайной зоны вида kind; если там все близко к игроку - из остальных. (зона, позиция)"""
+        if not self.sets[kind]:
+            self.load_or_build()
+        point_sets = self.sets[kind]
+
+        start = random.randrange(len(point_sets))
+        for offset in range(len(point_sets)):
+            point_set = point_sets[(start + offset) % len(point_sets)]
+            position = point_set.draw(avoid, min_distance)
+            if position is not None:
+                return point_set, position
+        return None, None
+
+
+spawn_points = SpawnPoints()
+
+
+def spawn_enemy_at_random_position(enemy_type):
+    try:
+        zone, spawn_pos = spawn_points.draw("enemy", player.position, ENEMY_SPAWN_MIN_DISTANCE)
+        if spawn_pos is None:
+            print(f"⚠️ Все точки спавна ближе {ENEMY_SPAWN_MIN_DISTANCE} к игроку - враг не заспавнен")
+            return False
 
-        # Проверяем, чтобы враг не заспавнился слишком близко к игроку
-        if (spawn_pos - player.position).length() < 15:  # Увеличил до 15 единиц
-            # Если слишком близко, пробуем еще раз
-            print(f"⚠️ Слишком близко к игроку ({spawn_pos - player.position}")
-            return spawn_enemy_at_random_position(enemy_type)
+        print(f"📍 Спавн врага в {zone.name}: X={spawn_pos.x:.1f}, Y={spawn_pos.y:.1f}, Z={spawn_pos.z:.1f}")
 
         create_enemy(spawn_pos, enemy_type)
 
         # Визуальная метка зоны спавна (для отладки)
         if not hasattr(spawn_enemy_at_random_position, 'zone_indicators'):
             spawn_enemy_at_random_position.zone_indicators = []
-            for i, zone_data in enumerate(spawn_zones):
+            for i, zone_data in enumerate(ENEMY_SPAWN_ZONES):
                 indicator = Entity(
                     model='wireframe_cube',
                     color=color.rgba(1, 0, 0, 0.3),
@@ -3904,7 +5668,7 @@ def spawn_enemy_at_random_position(enemy_type):
                 spawn_enemy_at_random_position.zone_indicators.append(indicator)
 
         # Временное включение индикатора зоны
-        zone_index = spawn_zones.index(zone)
+        zone_index = spawn_points.sets["enemy"].index(zone)
         if spawn_enemy_at_random_position.zone_indicators[zone_index]:
             spawn_enemy_at_random_position.zone_indicators[zone_index].enabled = True
             invoke(lambda idx=zone_index: setattr(spawn_enemy_at_random_position.zone_indicators[idx], 'enabled', False)
@@ -3926,17 +5690,17 @@ def spawn_healkits():
         position = find_valid_spawn_position()
 
         if is_position_in_spawn_area(position):
-            create_heal_pickup(position)
+            spawn_queue.push("heal_pickup", create_heal_pickup, position)
             spawned_count += 1
             print(f"  Аптечка {i + 1}: X={position.x:.1f}, Z={position.z:.1f}")
         else:
             print(f"❌ Аптечка вне зон: X={position.x:.1f}, Z={position.z:.1f}")
             # Исправляем позицию
             corrected_pos = find_valid_spawn_position()
-            create_heal_pickup(corrected_pos)
+            spawn_queue.push("heal_pickup", create_heal_pickup, corrected_pos)
             spawned_count += 1
 
-    print(f"✅ Заспавнено {spawned_count} аптечек")
+    print(f"✅ В очереди спавна {spawned_count} аптечек")
 
 
 def spawn_ammo_boxes():
@@ -3947,58 +5711,66 @@ def spawn_ammo_boxes():
         position = find_valid_spawn_position()
 
         if is_position_in_spawn_area(position):
-            create_ammo_pickup(position)
+            spawn_queue.push("ammo_pickup", create_ammo_pickup, position)
             spawned_count += 1
             print(f"  Патроны {i + 1}: X={position.x:.1f}, Z={position.z:.1f}")
         else:
             print(f"❌ Патроны вне зон: X={position.x:.1f}, Z={position.z:.1f}")
             # Исправляем позицию
             corrected_pos = find_valid_spawn_position()
-            create_ammo_pickup(corrected_pos)
+            spawn_queue.push("ammo_pickup", create_ammo_pickup, corrected_pos)
             spawned_count += 1
 
-    print(f"✅ Заспавнено {spawned_count} коробок патронов")
+    print(f"✅ В очереди спавна {spawned_count} коробок патронов")
 
 
 def is_position_in_spawn_area(position):
     """Проверяет, находится ли позиция в одной из двух областей спавна"""
-    # ПРОВЕРКА ПЕРВОЙ ЗОНЫ
-    in_zone1 = (43 <= position.x <= 63 and -116 <= position.z <= -46)
+    for area in PICKUP_SPAWN_AREAS:
+        if area["x"][0] <= position.x <= area["x"][1] and area["z"][0] <= position.z <= area["z"][1]:
+            return True
+    return False
 
-    # ПРОВЕРКА ВТОРОЙ ЗОНЫ
-    in_zone2 = (-56 <= position.x <= -6 and -203 <= position.z <= -153)
 
-    return in_zone1 or in_zone2
+# ОБНОВЛЯЕМ ФУНКЦИЮ УБИЙСТВА ВРАГА
+def on_enemy_killed(enemy):
+    # Второй путь убийства того же врага (пуля + взрыв, destroy) ничего не засчитывает
+    if not enemy_registry.kill(enemy):
+        return
+
+    print(f"💀 Враг убит! Прогресс: {enemy_registry.killed}/{enemies_to_kill_for_stage}")
 
+    check_stage_completion()
 
-# ОБНОВЛЯЕМ ФУНКЦИЮ УБИЙСТВА ВРАГА
-def on_enemy_killed():
-    global stage_enemies_killed, total_enemies_on_map
 
-    stage_enemies_killed += 1
-    total_enemies_on_map -= 1
+def remove_enemy(enemy):
+    """Убирает врага из реестра и освобождает его слот в enemy_store"""
+    enemy_registry.remove(enemy)
+    enemy_store.remove(enemy)
+    enemy_grid.remove(enemy)
 
-    print(f"💀 Враг убит! Прогресс: {stage_enemies_killed}/{enemies_to_kill_for_stage}")
 
-    check_stage_completion()
+def release_enemy(enemy):
+    """Убирает врага из игры и паркует его в пул вместо destroy()"""
+    remove_enemy(enemy)
+    enemy_pool.release(enemy)
 
 
 # ИСПРАВЛЕННАЯ ФУНКЦИЯ СОЗДАНИЯ ВРАГА
 def create_enemy(position, enemy_type="normal"):
-    enemy = Enemy(position, enemy_type)
-    enemies.append(enemy)
+    enemy = enemy_pool.acquire(position, enemy_type)
+    enemy_registry.add(enemy)
+    enemy_grid.insert(enemy, enemy.entity.x, enemy.entity.z)
 
     # Сохраняем оригинальную сущность врага
     enemy_entity = enemy.entity
 
     # Переопределяем метод уничтожения для отслеживания убийств
     def custom_destroy():
-        on_enemy_killed()
+        on_enemy_killed(enemy)
         if enemy_entity and enemy_entity.enabled:
-            enemy_entity.enabled = False
-            # Удаляем из списка врагов
-            if enemy in enemies:
-                enemies.remove(enemy)
+            # Возвращаем врага в пул
+            release_enemy(enemy)
 
     # Присваиваем кастомную функцию уничтожения
     enemy_entity.destroy = custom_destroy
@@ -4019,41 +5791,20 @@ def create_homing_enemy_projectile(position, target_position, speed=ENEMY_PROJEC
 
     actual_speed = uniform(ENEMY_PROJECTILE_MIN_SPEED, speed)
 
-    projectile = Entity(
-        model='sphere',
-        color=color_type,
-        scale=0.9,
-        position=position,
-        add_to_scene_entities=True,
-        eternal=False
-    )
-
-    glow = Entity(
-        model='sphere',
-        color=color.rgba(color_type[0], color_type[1], color_type[2], 0.5),
-        scale=1.2,
-        position=position,
-        add_to_scene_entities=True,
-        eternal=False
-    )
+    # Снаряд и свечение - из пула; пул полон - выстрела нет
+    pair = orb_pool.acquire(position, color_type, 0.9, color.rgba(color_type[0], color_type[1], color_type[2], 0.5))
+    if pair is None:
+        return None
+    orb, glow = pair
 
     # Направление к телу
     direction = (corrected_target - position).normalized()
 
-    projectile.direction = direction
-    projectile.speed = actual_speed
-    projectile.damage = damage
-    projectile.creation_time = time.time()
-    projectile.lifetime = 8.0
-    projectile.homing_strength = homing_strength
-    projectile.glow = glow
-    projectile.explosion_radius = explosion_radius
-    projectile.homing_active = True
-    projectile.turn_speed = ENEMY_PROJECTILE_TURN_SPEED
-    projectile.detection_radius = ENEMY_PROJECTILE_DETECTION_RADIUS
-    projectile.has_exploded = False
-
-    enemy_projectiles.append(projectile)
+    projectile = Projectile(orb, glow, pool=orb_pool)
+    projectile_store.add(projectile, PROJECTILE_ORB, position, direction, actual_speed, lifetime=8.0,
+                         damage=damage, explosion_radius=explosion_radius,
+                         detection_radius=ENEMY_PROJECTILE_DETECTION_RADIUS,
+                         turn_speed=ENEMY_PROJECTILE_TURN_SPEED, gravity=ENEMY_PROJECTILE_GRAVITY)
     return projectile
 
 
@@ -4069,7 +5820,7 @@ def create_blood_puddle(position):
     )
 
     # Добавляем в эффекты крови для автоматического удаления
-    blood_particles = [(puddle, Vec3(0, 0, 0), 0, time.time(), 1.0)]
+    blood_particles = [(puddle, Vec3(0, 0, 0), 0, sim_clock.time, 1.0)]
     blood_effects.append(blood_particles)
 
 
@@ -4096,275 +5847,426 @@ def create_blood_splatters(position):
         )
 
         splatter.look_at(splatter_pos + splatter_direction)
-        blood_particles = [(splatter, Vec3(0, 0, 0), 0, time.time(), 1.0)]
+        blood_particles = [(splatter, Vec3(0, 0, 0), 0, sim_clock.time, 1.0)]
         blood_effects.append(blood_particles)
 
 
 # Функция для проверки попаданий в NPC
 # ИСПРАВЛЕННАЯ ФУНКЦИЯ ПРОВЕРКИ ПОПАДАНИЙ
-def check_bullet_hits():
-    for bullet_idx in range(len(bullet_tracers) - 1, -1, -1):
-        tracer_data = bullet_tracers[bullet_idx]
+BULLET_HIT_RADIUS = np.array((1.0, 2.0, 4.0))  # По ENEMY_TYPE_CODES: normal, medium, boss
 
-        if not tracer_data or len(tracer_data) != 2:
-            continue
 
-        tracer, spawn_time = tracer_data
+def sweep_enemy_hit(start, end):
+    """Первый враг, чью сферу попадания пересекает отрезок start -> end (или None)"""
+    segment = end - start
+    length = math.sqrt(segment.dot(segment))
 
-        if not tracer or not tracer.enabled:
-            continue
+    # Кандидаты - только из клеток вокруг отрезка, а не весь список врагов
+    middle = (start + end) * 0.5
+    candidates = [enemy for enemy in enemy_grid.query(middle[0], middle[2], length * 0.5 + BULLET_HIT_RADIUS.max())
+                  if enemy.store_slot is not None and enemy.entity and enemy.entity.enabled]
+    if not candidates:
+        return None
 
-        for enemy_idx in range(len(enemies) - 1, -1, -1):
-            enemy = enemies[enemy_idx]
+    slots = np.fromiter((enemy.store_slot for enemy in candidates), dtype=np.intp, count=len(candidates))
+    centers = enemy_store.position[slots]
+    radii = BULLET_HIT_RADIUS[enemy_store.type_code[slots]]
 
-            if not enemy or not enemy.entity or not enemy.entity.enabled:
-                continue
+    # Ближайшая к центру врага точка отрезка
+    if length > 0:
+        along = np.clip((centers - start) @ segment / (length * length), 0.0, 1.0)
+    else:
+        along = np.zeros(len(candidates))
+    offsets = centers - (start + along[:, None] * segment)
+    distances_sq = np.einsum('ij,ij->i', offsets, offsets)
+    hits = np.flatnonzero(distances_sq < radii * radii)
+    if not len(hits):
+        return None
 
-            dist_to_enemy = (tracer.position - enemy.entity.position).length()
-            if dist_to_enemy < (1.0 if enemy.type == "normal" else 2.0 if enemy.type == "medium" else 4.0):
-                enemy.hit_count += 1
-                enemy.health -= 1
+    # Из задетых - тот, в кого пуля вошла раньше
+    entry = along[hits]
+    if length > 0:
+        entry = entry - np.sqrt(radii[hits] ** 2 - distances_sq[hits]) / length
+    return candidates[hits[np.argmin(entry)]]
 
-                print(f"🎯 Попадание в {enemy.type} врага! Здоровье: {enemy.health}/{enemy.max_health}")
 
-                try:
-                    create_blood_effect_optimized(enemy.entity.position + Vec3(0, 1, 0))
-                except Exception as e:
-                    print(f"⚠️ Ошибка создания эффекта крови: {e}")
+def check_bullet_hits():
+    """Попадания трассеров: отрезок, пройденный за тик, против сфер врагов - не зависит от FPS.
+    Трассер, чье время вышло, гасим здесь - после проверки его последнего отрезка"""
+    tracer_slots = projectile_store.slots_of(PROJECTILE_TRACER)
+    if not len(tracer_slots):
+        return
 
-                if enemy.health <= 0:
-                    print(f"💀 {enemy.type.capitalize()} враг уничтожен!")
+    # Снимок: попадания убирают трассеры и переставляют слоты
+    tracers = [projectile_store.owners[slot] for slot in tracer_slots.tolist()]
+    starts = projectile_store.previous_position[tracer_slots]
+    ends = projectile_store.position[tracer_slots]
+    expired = (sim_clock.time - projectile_store.spawn_time[tracer_slots] >=
+               projectile_store.lifetime[tracer_slots]).tolist()
+
+    for tracer, start, end, is_expired in zip(tracers, starts, ends, expired):
+        enemy = sweep_enemy_hit(start, end)
+        if enemy is None:
+            if is_expired:
+                remove_projectile(tracer)
+            continue
 
-                    try:
-                        create_blood_effect_optimized(enemy.entity.position + Vec3(0, 1, 0))
-                    except:
-                        pass
+        enemy.hit_count += 1
+        enemy.health -= 1
 
-                    # ВЫЗЫВАЕМ ФУНКЦИЮ УБИЙСТВА ПЕРЕД УДАЛЕНИЕМ
-                    on_enemy_killed()
+        print(f"🎯 Попадание в {enemy.type} врага! Здоровье: {enemy.health}/{enemy.max_health}")
 
-                    # Уничтожаем врага
-                    try:
-                        destroy(enemy.entity)
-                    except:
-                        pass
+        try:
+            create_blood_effect_optimized(enemy.entity.position + Vec3(0, 1, 0))
+        except Exception as e:
+            print(f"⚠️ Ошибка создания эффекта крови: {e}")
 
-                    if enemy in enemies:
-                        enemies.remove(enemy)
+        if enemy.health <= 0:
+            print(f"💀 {enemy.type.capitalize()} враг уничтожен!")
 
-                try:
-                    destroy(tracer)
-                except:
-                    pass
+            try:
+                create_blood_effect_optimized(enemy.entity.position + Vec3(0, 1, 0))
+            except:
+                pass
 
-                bullet_tracers.pop(bullet_idx)
-                break
+            # ВЫЗЫВАЕМ ФУНКЦИЮ УБИЙСТВА ПЕРЕД УДАЛЕНИЕМ
+            on_enemy_killed(enemy)
 
+            # Возвращаем врага в пул
+            release_enemy(enemy)
 
-def update_enemy_projectiles():
-    """Обновляет снаряды врагов с очень слабым наведением"""
-    current_time = time.time()
+        remove_projectile(tracer)
 
-    for proj_idx in range(len(enemy_projectiles) - 1, -1, -1):
-        projectile = enemy_projectiles[proj_idx]
 
-        if not projectile or not projectile.enabled:
-            cleanup_projectile_effects(projectile)
-            enemy_projectiles.pop(proj_idx)
-            continue
+# ==================== СНАРЯДЫ (МАССИВЫ) ====================
+# Трассеры игрока, гранаты и снаряды врагов лежат в одних плотных массивах.
+# Полет, наведение, гравитация и проверки считаются одним векторным шагом на тик,
+# в Entity пишем только итоговые трансформы. Владелец слота - запись Projectile с Entity снаряда.
 
-        # Обеспечиваем наличие всех атрибутов
-        ensure_projectile_attributes(projectile)
+PROJECTILE_TRACER = 0  # Пуля игрока
+PROJECTILE_ORB = 1  # Снаряд врага, слабо наводится на игрока
+PROJECTILE_GRENADE = 2  # Граната гранатомета
+ENEMY_PROJECTILE_GRAVITY = -0.5  # Снаряды врагов понемногу проседают
 
-        age = current_time - projectile.creation_time
 
-        # Проверка времени жизни
-        if age >= projectile.lifetime:
-            explosion_radius = getattr(projectile, 'explosion_radius', 3.0)
-            create_projectile_explosion(projectile.position, explosion_radius)
-            cleanup_projectile_effects(projectile)
-            enemy_projectiles.pop(proj_idx)
-            continue
+class Projectile:
+    """Снаряд: номер слота в projectile_store и Entity для отрисовки. Все числа живут в массивах"""
+    __slots__ = ("projectile_slot", "entity", "glow", "tail", "pool")
 
-        # ВАЖНОЕ ИЗМЕНЕНИЕ: ОЧЕНЬ СЛАБЫЙ ХОМИНГ
-        if hasattr(projectile, 'is_homing') and projectile.is_homing:
-            # Проверяем расстояние до игрока - наводимся только если близко
-            distance_to_player = (projectile.position - player.position).length()
+    def __init__(self, entity=None, glow=None, tail=None, pool=None):
+        self.projectile_slot = None
+        self.entity = entity  # У трассера None - его рисует tracer_batch
+        self.glow = glow
+        self.tail = tail
+        self.pool = pool  # Откуда взяты entity, glow и tail (None - уничтожаем)
 
-            # Наводимся только если снаряд далеко от игрока (> 10 единиц) или первые 2 секунды полета
-            if distance_to_player > 10 or age < 2.0:
-                # Очень слабое наведение
-                if not hasattr(projectile, 'turn_speed'):
-                    projectile.turn_speed = ENEMY_PROJECTILE_TURN_SPEED
+    def release(self):
+        """Возвращает Entity в пул или уничтожает их"""
+        if self.pool is not None:
+            self.pool.release(self.entity, self.glow, self.tail)
+        else:
+            for part in (self.entity, self.glow, self.tail):
+                if part:
+                    try:
+                        destroy(part)
+                    except:
+                        pass
+        self.entity = self.glow = self.tail = self.pool = None
+
+
+class ProjectileStore:
+    """Плотные массивы снарядов: слоты 0..count-1 заняты, удаление - перестановкой последнего"""
+
+    COLUMNS = ("position", "previous_position", "direction", "speed", "velocity_y", "gravity", "fall_speed", "spawn_time", "lifetime",
+               "damage", "explosion_radius", "detection_radius", "turn_speed", "kind")
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.count = 0
+        self.owners = []  # Projectile по номеру слота
+        self.position = np.zeros((capacity, 3))
+        self.previous_position = np.zeros((capacity, 3))  # Позиция на прошлом тике - начало отрезка для попаданий
+        self.direction = np.zeros((capacity, 3))  # Единичный вектор полета
+        self.speed = np.zeros(capacity)
+        self.velocity_y = np.zeros(capacity)  # Накопленная гравитация (снаряды врагов)
+        self.gravity = np.zeros(capacity)
+        self.fall_speed = np.zeros(capacity)  # Постоянная скорость падения (гранаты)
+        self.spawn_time = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        self.damage = np.zeros(capacity)
+        self.explosion_radius = np.zeros(capacity)
+        self.detection_radius = np.zeros(capacity)  # Ближе к игроку - подрыв
+        self.turn_speed = np.zeros(capacity)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros((new_capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+        self.capacity = new_capacity
+
+    def add(self, projectile, kind, position, direction, speed, lifetime, damage=0, explosion_radius=0,
+            detection_radius=0, turn_speed=0, gravity=0, fall_speed=0):
+        if self.count == self.capacity:
+            self._grow()
+
+        slot = self.count
+        self.count += 1
+        self.owners.append(projectile)
+        projectile.projectile_slot = slot
+
+        self.position[slot] = (position[0], position[1], position[2])
+        self.previous_position[slot] = self.position[slot]
+        self.direction[slot] = (direction[0], direction[1], direction[2])
+        self.speed[slot] = speed
+        self.velocity_y[slot] = 0
+        self.gravity[slot] = gravity
+        self.fall_speed[slot] = fall_speed
+        self.spawn_time[slot] = sim_clock.time
+        self.lifetime[slot] = lifetime
+        self.damage[slot] = damage
+        self.explosion_radius[slot] = explosion_radius
+        self.detection_radius[slot] = detection_radius
+        self.turn_speed[slot] = turn_speed
+        self.kind[slot] = kind
+        return slot
+
+    def remove(self, projectile):
+        slot = projectile.projectile_slot
+        if slot is None:
+            return False
 
-                # Направление к игроку
-                to_player = (player.position - projectile.position).normalized()
+        projectile.projectile_slot = None
+        last = self.count - 1
+        if slot != last:
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[slot] = column[last]
+            moved = self.owners[last]
+            self.owners[slot] = moved
+            moved.projectile_slot = slot
+        self.owners.pop()
+        self.count -= 1
+        return True
 
-                # Очень медленная коррекция (10% от обычной)
-                correction_strength = 0.1 * projectile.turn_speed * time.dt
-                projectile.direction = lerp(projectile.direction, to_player, correction_strength).normalized()
-            else:
-                # Близко к игроку - летим прямо
-                pass
+    def slots_of(self, kind):
+        return np.flatnonzero(self.kind[:self.count] == kind)
 
-        # ДВИЖЕНИЕ СНАРЯДА С ГРАВИТАЦИЕЙ
-        if hasattr(projectile, 'direction') and hasattr(projectile, 'speed'):
-            # Обновляем вертикальную скорость от гравитации
-            if hasattr(projectile, 'gravity'):
-                projectile.velocity_y += projectile.gravity * time.dt
-                # Обновляем направление с учетом вертикальной скорости
-                move_direction = Vec3(
-                    projectile.direction.x,
-                    projectile.direction.y + projectile.velocity_y * 0.1,
-                    projectile.direction.z
-                ).normalized()
-            else:
-                move_direction = projectile.direction
+    def count_of(self, kind):
+        return int(np.count_nonzero(self.kind[:self.count] == kind))
 
-            # Медленное движение
-            projectile.position += move_direction * projectile.speed * time.dt
 
-        # ВРАЩЕНИЕ (медленное)
-        projectile.rotation_x += time.dt * 50
-        projectile.rotation_y += time.dt * 40
-
-        # ОБНОВЛЕНИЕ СВЕЧЕНИЯ
-        if hasattr(projectile, 'glow') and projectile.glow and projectile.glow.enabled:
-            projectile.glow.position = projectile.position
-
-            # Мерцание
-            pulse = math.sin(time.time() * 3) * 0.1 + 0.9
-            projectile.glow.scale = 1.3 * pulse
-            projectile.glow.color = color.rgba(
-                projectile.glow.color.r,
-                projectile.glow.color.g,
-                projectile.glow.color.b,
-                0.3 + 0.2 * pulse
-            )
+projectile_store = ProjectileStore()
 
-        # Проверка приближения к игроку
-        distance_to_player = (projectile.position - player.position).length()
-        detection_radius = getattr(projectile, 'detection_radius', ENEMY_PROJECTILE_DETECTION_RADIUS)
+ORB_POOL_CAP = 48  # Больше снарядов врагов одновременно не бывает - лишние выстрелы пропускаются
 
-        # Если снаряд близко к игроку - взрыв
-        if distance_to_player < detection_radius and not getattr(projectile, 'has_exploded', False):
-            print(f"💥 Снаряд приблизился на {distance_to_player:.1f} единиц!")
 
-            damage = getattr(projectile, 'damage', 8)
-            take_damage(damage)
+class OrbPool:
+    """Пары Entity снаряд + свечение для выстрелов врагов: после взрыва выключаются и ждут следующего выстрела"""
 
-            # Взрыв
-            explosion_radius = getattr(projectile, 'explosion_radius', 3.0)
-            create_projectile_explosion(projectile.position, explosion_radius)
+    def __init__(self, cap=ORB_POOL_CAP):
+        self.cap = cap
+        self.parked = []  # (снаряд, свечение)
+        self.in_use = 0
+        self.stats = {"created": 0, "reused": 0, "released": 0, "refused": 0}
 
-            projectile.has_exploded = True
-            cleanup_projectile_effects(projectile)
-            enemy_projectiles.pop(proj_idx)
+    def acquire(self, position, orb_color, orb_scale, glow_color, glow_scale=1.2):
+        """Пара (снаряд, свечение) на позиции или None, если в полете уже cap снарядов"""
+        if self.parked:
+            orb, glow = self.parked.pop()
+            self.stats["reused"] += 1
+        elif self.in_use >= self.cap:
+            self.stats["refused"] += 1
+            return None
+        else:
+            # eternal - пул переживает очистку сцены, выключенные пары не теряются
+            orb = Entity(model='sphere', add_to_scene_entities=True, eternal=True)
+            glow = Entity(model='sphere', add_to_scene_entities=True, eternal=True)
+            self.stats["created"] += 1
+
+        self.in_use += 1
+        orb.position = position
+        orb.rotation = (0, 0, 0)
+        orb.color = orb_color
+        orb.scale = orb_scale
+        glow.position = position
+        glow.color = glow_color
+        glow.scale = glow_scale
+        orb.enabled = True
+        glow.enabled = True
+        return orb, glow
+
+    def release(self, orb, glow, tail=None):
+        orb.enabled = False
+        glow.enabled = False
+        self.parked.append((orb, glow))
+        self.in_use -= 1
+        self.stats["released"] += 1
+
+    def parked_entities(self):
+        return [entity for pair in self.parked for entity in pair]
+
+
+orb_pool = OrbPool()
+
+GRENADE_POOL_CAP = 16  # Гранат в полете одновременно; сверх этого выстрел не вылетает
+
+
+class GrenadePool:
+    """Тройки Entity граната + свечение + след для гранатомета: после взрыва выключаются и ждут следующего выстрела"""
+
+    def __init__(self, cap=GRENADE_POOL_CAP):
+        self.cap = cap
+        self.parked = []  # (граната, свечение, след)
+        self.in_use = 0
+        self.stats = {"created": 0, "reused": 0, "released": 0, "refused": 0}
+
+    def acquire(self, position, direction):
+        """Тройка (граната, свечение, след) у дула или None, если в полете уже cap гранат"""
+        if self.parked:
+            grenade, glow, tail = self.parked.pop()
+            self.stats["reused"] += 1
+        elif self.in_use >= self.cap:
+            self.stats["refused"] += 1
+            return None
+        else:
+            grenade = Entity(model='sphere', color=color.green, scale=0.5, add_to_scene_entities=True, eternal=True)
+            glow = Entity(model='sphere', color=color.rgba(0, 1, 0, 0.3), scale=0.7, add_to_scene_entities=True,
+                          eternal=True)
+            tail = Entity(model='cube', color=color.green, scale=(0.2, 0.2, 0.8), add_to_scene_entities=True,
+                          eternal=True)
+            self.stats["created"] += 1
+
+        self.in_use += 1
+        grenade.position = position
+        glow.position = position
+        tail.position = position - direction * 0.5
+        grenade.enabled = True
+        glow.enabled = True
+        tail.enabled = True
+        return grenade, glow, tail
+
+    def release(self, grenade, glow, tail=None):
+        grenade.enabled = False
+        glow.enabled = False
+        if tail:
+            tail.enabled = False
+        self.parked.append((grenade, glow, tail))
+        self.in_use -= 1
+        self.stats["released"] += 1
+
+    def parked_entities(self):
+        return [entity for group in self.parked for entity in group if entity]
+
+
+grenade_pool = GrenadePool()
+
+
+def remove_projectile(projectile):
+    """Убирает снаряд из массивов и уничтожает его Entity вместе со свечением и хвостом (или отдает в пул)"""
+    projectile_store.remove(projectile)
+    projectile.release()
+
+
+def clear_projectiles(kinds=None, protected=()):
+    """Убирает снаряды указанных видов (все - если kinds=None). Возвращает, сколько уничтожено"""
+    destroyed = 0
+    for projectile in projectile_store.owners[:]:
+        if kinds is not None and projectile_store.kind[projectile.projectile_slot] not in kinds:
             continue
+        if projectile.entity is not None and projectile.entity in protected:
+            projectile_store.remove(projectile)
+            continue
+        remove_projectile(projectile)
+        destroyed += 1
+    return destroyed
 
-        # Столкновение с землей
-        if projectile.position.y < 0.5:
-            explosion_radius = getattr(projectile, 'explosion_radius', 3.0)
-            create_projectile_explosion(projectile.position, explosion_radius)
-            cleanup_projectile_effects(projectile)
-            enemy_projectiles.pop(proj_idx)
-
-
-def ensure_projectile_attributes(projectile):
-    """Обеспечивает, что у снаряда есть все необходимые атрибуты"""
-    if not hasattr(projectile, 'explosion_radius'):
-        projectile.explosion_radius = 3.0
-    if not hasattr(projectile, 'detection_radius'):
-        projectile.detection_radius = ENEMY_PROJECTILE_DETECTION_RADIUS
-    if not hasattr(projectile, 'speed'):
-        projectile.speed = uniform(ENEMY_PROJECTILE_MIN_SPEED, ENEMY_PROJECTILE_SPEED)
-    if not hasattr(projectile, 'damage'):
-        projectile.damage = 8
-    if not hasattr(projectile, 'lifetime'):
-        projectile.lifetime = 10.0
-    if not hasattr(projectile, 'has_exploded'):
-        projectile.has_exploded = False
-    if not hasattr(projectile, 'is_homing'):
-        projectile.is_homing = True
-    if not hasattr(projectile, 'turn_speed'):
-        projectile.turn_speed = ENEMY_PROJECTILE_TURN_SPEED
-    if not hasattr(projectile, 'direction'):
-        projectile.direction = Vec3(0, 0, -1)
-    if not hasattr(projectile, 'gravity'):
-        projectile.gravity = -0.5
-    if not hasattr(projectile, 'velocity_y'):
-        projectile.velocity_y = 0
-    if not hasattr(projectile, 'homing_strength'):
-        projectile.homing_strength = 0.5
-
-
-def cleanup_projectile_effects(projectile):
-    """Очищает все эффекты связанные со снарядом"""
-    if not projectile:
-        return
-
-    # Список связанных объектов
-    related_objects = []
-
-    # Добавляем все возможные связанные объекты
-    if hasattr(projectile, 'glow'):
-        related_objects.append(projectile.glow)
-
-    if hasattr(projectile, 'tracer'):
-        related_objects.append(projectile.tracer)
-    if hasattr(projectile, 'particles'):
-        related_objects.extend(projectile.particles)
-
-    # Уничтожаем основной снаряд
-    try:
-        destroy(projectile)
-    except:
-        pass
-
-    # Уничтожаем связанные объекты
-    for obj in related_objects:
-        if obj and hasattr(obj, 'enabled') and obj.enabled:
-            try:
-                destroy(obj)
-            except:
-                pass
-
-
-def convert_old_projectiles():
-    """Преобразует старые снаряды в новые с атрибутами"""
-    for projectile in enemy_projectiles:
-        if not hasattr(projectile, 'turn_speed'):
-            # Добавляем недостающие атрибуты
-            projectile.turn_speed = 5.0
-            projectile.homing_strength = 1.0
-            projectile.homing_active = True
-            projectile.explosion_radius = 3.0
 
-            # Если нет направления, создаем случайное
-            if not hasattr(projectile, 'direction'):
-                projectile.direction = Vec3(
-                    uniform(-0.5, 0.5),
-                    uniform(-0.2, 0.5),
-                    uniform(-1, -0.5)
-                ).normalized()
+def update_projectiles():
+    """Один векторный шаг для всех снарядов: полет, наведение, гравитация, подрывы"""
+    store = projectile_store
+    count = store.count
+    if not count:
+        return
 
-            # Если нет скорости
-            if not hasattr(projectile, 'speed'):
-                projectile.speed = uniform(8, 12)
+    dt = sim_clock.dt
+    kinds = store.kind[:count]
+    positions = store.position[:count]
+    directions = store.direction[:count]
+    age = sim_clock.time - store.spawn_time[:count]
+    player_position = np.array((player.position.x, player.position.y, player.position.z))
+
+    # ОЧЕНЬ СЛАБЫЙ ХОМИНГ: снаряды врагов доворачивают к игроку,
+    # пока далеко от него (> 10 единиц) или первые 2 секунды полета
+    orbs = kinds == PROJECTILE_ORB
+    if orbs.any():
+        to_player = player_position - positions
+        distances = np.sqrt(np.einsum('ij,ij->i', to_player, to_player))
+        homing = orbs & ((distances > 10) | (age < 2.0)) & (distances > 0)
+        if homing.any():
+            target = to_player[homing] / distances[homing, None]
+            correction = (0.1 * store.turn_speed[:count][homing] * dt)[:, None]
+            turned = directions[homing] + (target - directions[homing]) * correction
+            directions[homing] = turned / np.linalg.norm(turned, axis=1)[:, None]
+
+    # ДВИЖЕНИЕ: накопленная гравитация загибает направление, гранаты падают с постоянной скоростью
+    store.previous_position[:count] = positions
+    velocity_y = store.velocity_y[:count]
+    velocity_y += store.gravity[:count] * dt
+    move = directions.copy()
+    move[:, 1] += velocity_y * 0.1
+    move /= np.linalg.norm(move, axis=1)[:, None]
+    positions += move * (store.speed[:count] * dt)[:, None]
+    positions[:, 1] += store.fall_speed[:count] * dt
+
+    # ЧТО ЗАКАНЧИВАЕТ ПОЛЕТ
+    offsets = positions - player_position
+    near_player = orbs & (np.sqrt(np.einsum('ij,ij->i', offsets, offsets)) < store.detection_radius[:count])
+    # Земля - по карте высот: на приподнятых площадках снаряд рвется на их поверхности
+    hit_ground = (kinds != PROJECTILE_TRACER) & (positions[:, 1] <= heightfield.height_at(positions[:, 0],
+                                                                                         positions[:, 2]))
+    # Трассеры по времени гасит check_bullet_hits - уже после проверки последнего отрезка
+    expired = (age >= store.lifetime[:count]) & (kinds != PROJECTILE_TRACER)
+    finished = near_player | hit_ground | expired
+
+    # Вращение и мерцание снарядов врагов; позиции пишет interpolate_projectile_render
+    owners = store.owners
+    position_list = positions.tolist()
+    kind_list = kinds.tolist()
+    pulse = math.sin(sim_clock.time * 3) * 0.1 + 0.9  # Мерцание одно на всех
+    for slot in np.flatnonzero(~finished & orbs).tolist():
+        projectile = owners[slot]
+        entity = projectile.entity
+        # ВРАЩЕНИЕ (медленное)
+        entity.rotation_x += dt * 50
+        entity.rotation_y += dt * 40
 
-            # Если нет урона
-            if not hasattr(projectile, 'damage'):
-                projectile.damage = 10
+        glow = projectile.glow
+        if glow and glow.enabled:
+            glow.scale = 1.3 * pulse
+            glow.color = color.rgba(glow.color.r, glow.color.g, glow.color.b, 0.3 + 0.2 * pulse)
 
-            # Если нет времени создания
-            if not hasattr(projectile, 'creation_time'):
-                projectile.creation_time = time.time()
+    finished_slots = np.flatnonzero(finished).tolist()
+    if not finished_slots:
+        return
 
-            # Если нет времени жизни
-            if not hasattr(projectile, 'lifetime'):
-                projectile.lifetime = 4.0
+    # Снимок до удаления - удаление переставляет слоты
+    events = [(owners[slot], kind_list[slot], Vec3(*position_list[slot]), bool(near_player[slot]),
+               store.damage[slot].item(), store.explosion_radius[slot].item()) for slot in finished_slots]
+    for projectile, kind, position, reached_player, damage, explosion_radius in events:
+        remove_projectile(projectile)
 
-            print(f"🔧 Преобразован старый снаряд")
+        if kind == PROJECTILE_GRENADE:
+            # ВЗРЫВ!
+            create_explosion(position, explosion_radius, damage)
+        elif kind == PROJECTILE_ORB:
+            if reached_player:
+                print(f"💥 Снаряд приблизился к игроку!")
+                take_damage(damage)
+            create_projectile_explosion(position, explosion_radius)
 
 
 def create_bounce_effect(position):
@@ -4384,12 +6286,12 @@ def create_bounce_effect(position):
         ).normalized()
 
         def animate_bounce(particle=bounce_particle, direction=bounce_direction):  # меняем dir на direction
-            start_time = time.time()
+            start_time = sim_clock.time
             lifetime = 0.8
             start_scale = particle.scale
 
             def update_bounce():
-                current_time = time.time()
+                current_time = sim_clock.time
                 age = current_time - start_time
 
                 if age < lifetime and particle.enabled:
@@ -4538,11 +6440,12 @@ def create_projectile_explosion(position, radius=3.0):
 
 def boss_ranged_attack(enemy):
     """Атака босса снарядами в тело"""
+    handle = enemy.handle
     for i in range(3):
         delay = i * 0.3
 
         def create_delayed_shot(d=i):
-            if enemy not in enemies or not enemy.entity.enabled:
+            if not enemy_registry.is_alive(enemy, handle) or not enemy.entity.enabled:
                 return
 
             offset = Vec3(
@@ -4566,7 +6469,7 @@ def boss_ranged_attack(enemy):
 
 def ranged_attack(enemy):
     """Атака среднего врага снарядами в тело"""
-    current_time = time.time()
+    current_time = sim_clock.time
 
     if not hasattr(enemy, 'last_ranged_attack_time'):
         enemy.last_ranged_attack_time = 0
@@ -4617,23 +6520,13 @@ def ranged_attack(enemy):
 
 
 def create_homing_projectile(position, direction, speed, damage, color_type, homing_strength=1.0):
-    projectile = Entity(
-        model='sphere',
-        color=color_type,
-        scale=0.8,  # Восстанавливаем красивый размер
-        position=position,
-        add_to_scene_entities=True
-    )
-
     # Эффект свечения (красивый)
-    glow = Entity(
-        model='sphere',
-        color=lerp(color_type, color.white, 0.3),
-        scale=1.2,
-        position=position,
-        add_to_scene_entities=True
-    )
-    glow.alpha = 0.5
+    glow_color = lerp(color_type, color.white, 0.3)
+    pair = orb_pool.acquire(position, color_type, 0.8,  # Восстанавливаем красивый размер
+                            color.rgba(glow_color[0], glow_color[1], glow_color[2], 0.5))
+    if pair is None:
+        return None
+    orb, glow = pair
 
     # # Трассер за снарядом
     # tracer = Entity(
@@ -4644,20 +6537,12 @@ def create_homing_projectile(position, direction, speed, damage, color_type, hom
     #     add_to_scene_entities=True
     # )
 
-    projectile.direction = direction
-    projectile.speed = speed * 1.5
-    projectile.damage = damage
-    projectile.creation_time = time.time()
-    projectile.lifetime = 4.0  # Оптимальное время жизни
-    projectile.glow = glow
-    # projectile.tracer = tracer
-    projectile.homing_strength = homing_strength * 2.5
-    projectile.homing_active = True
-    projectile.ground_bounce = True
-    projectile.bounce_count = 0
-    projectile.max_bounces = 2
-
-    enemy_projectiles.append(projectile)
+    projectile = Projectile(orb, glow, pool=orb_pool)
+    projectile_store.add(projectile, PROJECTILE_ORB, position, direction, speed * 1.5,
+                         lifetime=4.0,  # Оптимальное время жизни
+                         damage=damage, explosion_radius=3.0,
+                         detection_radius=ENEMY_PROJECTILE_DETECTION_RADIUS,
+                         turn_speed=ENEMY_PROJECTILE_TURN_SPEED, gravity=ENEMY_PROJECTILE_GRAVITY)
     return projectile
 
 
@@ -4729,11 +6614,11 @@ def create_shockwave(center_position, enemy):
 
     # АНИМАЦИЯ ВОЛНЫ
     def animate_wave(outer=outer_ring, glow=glow_ring, safe=safe_zone, particles=energy_particles, boss=enemy):
-        start_time = time.time()
+        start_time = sim_clock.time
         wave_thickness = 0.8  # Толщина опасной зоны
 
         def update_wave():
-            current_time = time.time()
+            current_time = sim_clock.time
             age = current_time - start_time
 
             if age < expansion_time and outer.enabled:
@@ -4831,11 +6716,11 @@ def create_wave_impact_effect(position):
         ).normalized()
 
         def animate_impact(particle=impact_particle, dir=direction):
-            start_time = time.time()
+            start_time = sim_clock.time
             lifetime = 1.0
 
             def update_impact():
-                current_time = time.time()
+                current_time = sim_clock.time
                 age = current_time - start_time
 
                 if age < lifetime and particle.enabled:
@@ -4857,11 +6742,12 @@ def boss_charge_attack(enemy):
 
     # Босс готовится к атаке (меняет цвет)
     enemy.entity.color = color.white
+    handle = enemy.handle
 
     # Через 1 секунду бросок
     def charge():
         # ПРОВЕРЯЕМ ЧТО ВРАГ ЕЩЕ СУЩЕСТВУЕТ
-        if enemy not in enemies or not enemy.entity or not enemy.entity.enabled:
+        if not enemy_registry.is_alive(enemy, handle) or not enemy.entity or not enemy.entity.enabled:
             return
 
         direction_to_player = (player.position - enemy.entity.position).normalized()
@@ -4869,10 +6755,10 @@ def boss_charge_attack(enemy):
 
         # ОДИНОЧНЫЙ быстрый бросок к игроку (фиксированная дистанция)
         charge_distance = 5.0
-        enemy.entity.position += direction_to_player * charge_distance
+        enemy.position += direction_to_player * charge_distance
 
         # ПРОВЕРЯЕМ ЧТО ВРАГ ВСЕ ЕЩЕ СУЩЕСТВУЕТ ПОСЛЕ ДВИЖЕНИЯ
-        if enemy not in enemies or not enemy.entity or not enemy.entity.enabled:
+        if not enemy_registry.is_alive(enemy, handle) or not enemy.entity or not enemy.entity.enabled:
             return
 
         # Если попал в игрока
@@ -4885,23 +6771,6 @@ def boss_charge_attack(enemy):
     invoke(charge, delay=1.0)
 
 
-def check_enemy_stuck(enemy):
-    current_pos = Vec3(enemy.entity.position)
-    distance_moved = (current_pos - enemy.last_position).length()
-
-    if distance_moved < 0.1:
-        enemy.stuck_timer += time.dt
-    else:
-        enemy.stuck_timer = 0
-
-    if enemy.stuck_timer >= enemy.stuck_threshold:
-        escape_direction = Vec3(uniform(-1, 1), 0, uniform(-1, 1)).normalized()
-        enemy.entity.position += escape_direction * 1.0 * time.dt
-        enemy.stuck_timer = 0
-
-    enemy.last_position = current_pos
-
-
 def update_enemy_visuals(enemy):
     if enemy.is_chasing:
         if enemy.type == "normal":
@@ -4922,12 +6791,6 @@ def update_enemy_visuals(enemy):
 # Функция создания NPC на карте
 
 
-# Функция для обновления эффектов крови
-def update_blood_effects():
-    """Оптимизированная версия обновления эффектов"""
-    safe_update_effects()  # Обновляет все эффекты (кровь + трассеры + вспышки)
-
-
 # УЛУЧШЕННЫЙ ЭФФЕКТ ДУЛЬНОГО ПЛАМЕНИ
 def create_muzzle_flash(muzzle_offset=None):
     data = weapon_data[current_weapon]
@@ -4960,7 +6823,7 @@ def create_muzzle_flash(muzzle_offset=None):
 
         particles.append((particle, particle_direction, particle_size))
 
-    muzzle_flash_entities.append((particles, time.time()))
+    muzzle_flash_entities.append((particles, sim_clock.time))
     return particles
 
 
@@ -5051,17 +6914,83 @@ def init_weapons():
     weapon.enabled = True
     current_weapon = "pistol"
 
-    # Устанавливаем правильные позиции для пистолета
-    global current_weapon_position, current_weapon_rotation
-    global target_weapon_position, target_weapon_rotation
+    # Устанавливаем правильные позиции для пистолета
+    global current_weapon_position, current_weapon_rotation
+    global target_weapon_position, target_weapon_rotation
+
+    data = weapon_data["pistol"]
+    current_weapon_position = data["position"]
+    current_weapon_rotation = data["rotation"]
+    target_weapon_position = data["position"]
+    target_weapon_rotation = data["rotation"]
+
+    update_weapon_parameters()
+
+
+# ==================== ТРАССЕРЫ (ОДИН МЕШ) ====================
+# У пули нет своего Entity: все живые трассеры - ленты одного динамического меша,
+# который пересобирается раз в кадр из массивов projectile_store. Один draw call на все пули.
+
+TRACER_WIDTH = 0.06
+TRACER_LENGTH_START = 0.2  # Длина ленты у дула
+TRACER_LENGTH_END = 0.05  # К концу жизни трассер укорачивается
+TRACER_HEAD_COLOR = np.array((1.0, 1.0, 0.2))  # Ярко-желтый
+TRACER_TAIL_COLOR = np.array((1.0, 0.5, 0.0))  # Оранжевый
+
+
+class TracerBatch:
+    """Все трассеры одним мешем: по два треугольника на пулю, лента развернута к камере"""
+
+    def __init__(self):
+        self.mesh = Mesh(vertices=[], colors=[], mode='triangle', static=False)
+        # Не выключаем Entity (safe_render_cleanup удаляет выключенные) - только прячем
+        self.entity = Entity(model=self.mesh, unlit=True, double_sided=True, eternal=True)
+        self.entity.setTransparency(TransparencyAttrib.M_alpha)
+        self.entity.visible = False
+        self.drawn = 0
+
+    def rebuild(self):
+        store = projectile_store
+        slots = store.slots_of(PROJECTILE_TRACER)
+        if not len(slots):
+            if self.drawn:
+                self.entity.visible = False
+                self.drawn = 0
+            return
+
+        # Голова - между двумя последними шагами симуляции, как и у остальных снарядов
+        previous = store.previous_position[slots]
+        heads = previous + (store.position[slots] - previous) * sim_clock.alpha
+        directions = store.direction[slots]
+        progress = np.clip((sim_clock.time - store.spawn_time[slots]) / store.lifetime[slots], 0.0, 1.0)
+        lengths = TRACER_LENGTH_START + (TRACER_LENGTH_END - TRACER_LENGTH_START) * progress
+        tails = heads - directions * lengths[:, None]
+
+        # Ширина - поперек направления полета и взгляда
+        view = heads - np.array(tuple(camera.world_position))
+        sides = np.cross(directions, view)
+        side_lengths = np.linalg.norm(sides, axis=1)
+        sides *= (TRACER_WIDTH * 0.5 / np.maximum(side_lengths, 1e-6))[:, None]
+
+        head_left, head_right = heads + sides, heads - sides
+        tail_left, tail_right = tails + sides, tails - sides
+        vertices = np.stack((head_left, head_right, tail_right, head_left, tail_right, tail_left), axis=1)
+
+        # Цвет гаснет вместе с прозрачностью
+        alpha = (1 - progress * 0.8)[:, None]
+        head_colors = np.hstack((TRACER_HEAD_COLOR * alpha, alpha))
+        tail_colors = np.hstack((TRACER_TAIL_COLOR * alpha, alpha))
+        colors = np.stack((head_colors, head_colors, tail_colors, head_colors, tail_colors, tail_colors), axis=1)
 
-    data = weapon_data["pistol"]
-    current_weapon_position = data["position"]
-    current_weapon_rotation = data["rotation"]
-    target_weapon_position = data["position"]
-    target_weapon_rotation = data["rotation"]
+        self.mesh.vertices = vertices.reshape(-1, 3).tolist()
+        self.mesh.colors = colors.reshape(-1, 4).tolist()
+        self.mesh.generate()
+        if not self.drawn:
+            self.entity.visible = True
+        self.drawn = len(slots)
 
-    update_weapon_parameters()
+
+tracer_batch = TracerBatch()
 
 
 def create_bullet_tracer(muzzle_offset=None):
@@ -5077,50 +7006,18 @@ def create_bullet_tracer(muzzle_offset=None):
 
     direction = camera.forward
 
-    tracer = Entity(
-        model='cube',
-        color=color.yellow,
-        scale=(0.06, 0.06, 0.4),
-        position=muzzle_world_pos,
-        add_to_scene_entities=True,
-        eternal=False, shader=Shader(language=Shader.GLSL, fragment='''
-            #version 140
-            uniform sampler2D p3d_Texture0;
-            uniform vec4 p3d_Color;
-            in vec2 uv;
-            out vec4 frag_color;
-
-            void main() {
-                vec4 tex_color = texture(p3d_Texture0, uv) * p3d_Color;
-                // Делаем трассер ярким и с свечением
-                float glow = 1.5;
-                tex_color.rgb *= glow;
-
-                // Градиент от ярко-желтого к оранжевому
-                float gradient = uv.y;
-                vec3 start_color = vec3(1.0, 1.0, 0.2); // Ярко-желтый
-                vec3 end_color = vec3(1.0, 0.5, 0.0);   // Оранжевый
-                tex_color.rgb = mix(start_color, end_color, gradient) * tex_color.a;
-
-                frag_color = tex_color;
-            }
-        ''')
-    )
-
-    # Сохраняем начальную позицию и направление
-    tracer.start_position = Vec3(muzzle_world_pos)
-    tracer.direction = Vec3(direction)
-    tracer.speed = data["bullet_speed"]
-
-    bullet_tracers.append((tracer, time.time()))
+    tracer = Projectile()
+    projectile_store.add(tracer, PROJECTILE_TRACER, muzzle_world_pos, direction, data["bullet_speed"],
+                         lifetime=bullet_lifetime)
     return tracer
 
 
 # Функция для обновления эффектов
 def update_shot_effects():
-    if not muzzle_flash_entities and not bullet_tracers:
+    """Вспышки выстрелов - трассеры летят в update_projectiles"""
+    if not muzzle_flash_entities:
         return
-    current_time = time.time()
+    current_time = sim_clock.time
 
     for flash_idx in range(len(muzzle_flash_entities) - 1, -1, -1):  # меняем i на flash_idx
         particles, spawn_time = muzzle_flash_entities[flash_idx]
@@ -5130,7 +7027,7 @@ def update_shot_effects():
             progress = age / muzzle_flash_duration
 
             for particle, direction, original_size in particles:
-                particle.position += direction * time.dt * 5
+                particle.position += direction * sim_clock.dt * 5
                 particle.alpha = 1 - progress
                 current_size = original_size * (1 - progress)
                 particle.scale = (current_size, current_size, current_size)
@@ -5145,58 +7042,25 @@ def update_shot_effects():
                 destroy(particle)
             muzzle_flash_entities.pop(flash_idx)
 
-    for tracer_idx in range(len(bullet_tracers) - 1, -1, -1):  # меняем i на tracer_idx
-        tracer_data = bullet_tracers[tracer_idx]
-
-        if not tracer_data or len(tracer_data) != 2:
-            bullet_tracers.pop(tracer_idx)
-            continue
-
-        tracer, spawn_time = tracer_data
-
-        if not tracer or tracer.enabled == False:
-            bullet_tracers.pop(tracer_idx)
-            continue
-
-        age = current_time - spawn_time
-
-        if age < bullet_lifetime:
-            tracer.position += tracer.direction * time.dt * tracer.speed
-            progress = age / bullet_lifetime
-            tracer.alpha = 1 - progress * 0.8
-            tracer.color = lerp(color.yellow, color.orange, progress)
-            tracer.scale_z = lerp(0.2, 0.05, progress)
-
-            if hasattr(tracer, 'direction'):
-                tracer.look_at(tracer.position + tracer.direction)
-
-        else:
-            destroy(tracer)
-            bullet_tracers.pop(tracer_idx)
-
 
 def check_sprint_collisions():
-    # Проверяем столкновения с основными объектами
-    collision_objects = []
-
-    # Добавляем блоки платформы
+    collision_distance = 2.0  # Дистанция столкновения
 
-    # Добавляем врагов (чтобы не проходить сквозь них)
-    for enemy in enemies:
-        if enemy and enemy.entity and enemy.entity.enabled:
-            collision_objects.append(enemy.entity)
+    # Враги рядом с игроком (чтобы не проходить сквозь них) - толпа уже разведена, их единицы
+    slots = [enemy.store_slot for enemy in enemy_grid.query(player.position.x, player.position.z, collision_distance)
+             if enemy and enemy.store_slot is not None and enemy.entity and enemy.entity.enabled]
+    if not slots:
+        return
 
-    for obj in collision_objects:
-        if obj and hasattr(obj, 'collider') and obj.collider:
-            # Простая проверка расстояния
-            distance = (player.position - obj.position).length()
-            collision_distance = 2.0  # Дистанция столкновения
+    # Выталкиваем игрока от всех близких врагов одним векторным шагом
+    offsets = np.array((player.position.x, player.position.y, player.position.z)) - enemy_store.position[slots]
+    distances = np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+    close = (distances < collision_distance) & (distances > 0)
+    if not close.any():
+        return
 
-            if distance < collision_distance:
-                # Выталкиваем игрока от объекта
-                direction_away = (player.position - obj.position).normalized()
-                push_distance = collision_distance - distance + 0.1
-                player.position += direction_away * push_distance
+    push = offsets[close] / distances[close, None] * (collision_distance - distances[close] + 0.1)[:, None]
+    player.position += Vec3(*push.sum(axis=0).tolist())
 
 
 # ОБНОВЛЯЕМ ФУНКЦИЮ perform_shot ДЛЯ DUAL UZI
@@ -5276,92 +7140,24 @@ def create_grenade_shot():
 
     direction = camera.forward
 
-    # Создаем гранату (большая сфера)
-    grenade = Entity(
-        model='sphere',
-        color=color.green,
-        scale=0.5,
-        position=muzzle_world_pos,
-        add_to_scene_entities=True
-    )
-
-    # Эффект свечения гранаты
-    glow = Entity(
-        model='sphere',
-        color=color.rgba(0, 1, 0, 0.3),
-        scale=0.7,
-        position=muzzle_world_pos,
-        add_to_scene_entities=True
-    )
-
-    # Траектория гранаты
-    tracer = Entity(
-        model='cube',
-        color=color.green,
-        scale=(0.2, 0.2, 0.8),
-        position=muzzle_world_pos - direction * 0.5,
-        add_to_scene_entities=True
-    )
-
-    grenade.direction = direction
-    grenade.speed = data["bullet_speed"]
-    grenade.creation_time = time.time()
-    grenade.lifetime = 5.0  # Время до автоматического взрыва
-    grenade.glow = glow
-    grenade.tracer = tracer
-    grenade.explosion_radius = data["explosion_radius"]
-    grenade.explosion_damage = data["explosion_damage"]
-    grenade.gravity = -9.8  # Гравитация для гранаты
+    # Граната, свечение и след - из пула; пул полон - граната не вылетает
+    visuals = grenade_pool.acquire(muzzle_world_pos, direction)
+    if visuals is None:
+        print("⚠️ Слишком много гранат в полете - выстрел пропущен")
+        return
+    grenade, glow, tracer = visuals
 
-    explosive_projectiles.append(grenade)
+    grenade = Projectile(grenade, glow, tracer, pool=grenade_pool)
+    projectile_store.add(grenade, PROJECTILE_GRENADE, muzzle_world_pos, direction, data["bullet_speed"],
+                         lifetime=5.0,  # Время до автоматического взрыва
+                         damage=data["explosion_damage"], explosion_radius=data["explosion_radius"],
+                         fall_speed=-9.8)  # Гравитация для гранаты
 
     # Эффект выстрела для гранатомета
     create_muzzle_flash()
     grenade_effect = 0
 
 
-def update_explosive_projectiles():
-    current_time = time.time()
-
-    for proj_idx in range(len(explosive_projectiles) - 1, -1, -1):
-        grenade = explosive_projectiles[proj_idx]
-
-        if not grenade or not grenade.enabled:
-            if proj_idx < len(explosive_projectiles):
-                explosive_projectiles.pop(proj_idx)
-            continue
-
-        # Движение гранаты с гравитацией
-        grenade.position += grenade.direction * time.dt * grenade.speed
-        grenade.position.y += grenade.gravity * time.dt  # Применяем гравитацию
-
-        # Обновляем эффекты
-        if hasattr(grenade, 'glow') and grenade.glow and grenade.glow.enabled:
-            grenade.glow.position = grenade.position
-
-        if hasattr(grenade, 'tracer') and grenade.tracer and grenade.tracer.enabled:
-            grenade.tracer.position = grenade.position - grenade.direction * 0.8
-            grenade.tracer.look_at(grenade.position)
-
-        # Проверка времени жизни или столкновения
-        age = current_time - grenade.creation_time
-        hit_ground = grenade.position.y <= 0.5  # Столкновение с землей
-
-        if age >= grenade.lifetime or hit_ground:
-            # ВЗРЫВ!
-            create_explosion(grenade.position, grenade.explosion_radius, grenade.explosion_damage)
-
-            # Уничтожаем гранату и эффекты
-            destroy(grenade)
-            if hasattr(grenade, 'glow') and grenade.glow:
-                destroy(grenade.glow)
-            if hasattr(grenade, 'tracer') and grenade.tracer:
-                destroy(grenade.tracer)
-
-            if proj_idx < len(explosive_projectiles):
-                explosive_projectiles.pop(proj_idx)
-
-
 def create_explosion(position, radius, damage):
     print(f"💥 ВЗРЫВ! Радиус: {radius}, Урон: {damage}")
 
@@ -5400,10 +7196,8 @@ def create_explosion(position, radius, damage):
     except:
         print("💥 Звук взрыва не найден")
 
-    # ПРОВЕРКА ПОПАДАНИЯ ПО ВРАГАМ В РАДИУСЕ ВЗРЫВА
-    for enemy_idx in range(len(enemies) - 1, -1, -1):
-        enemy = enemies[enemy_idx]
-
+    # ПРОВЕРКА ПОПАДАНИЯ ПО ВРАГАМ В РАДИУСЕ ВЗРЫВА (только клетки вокруг взрыва)
+    for enemy in enemy_grid.query(position.x, position.z, radius):
         if not enemy or not enemy.entity or not enemy.entity.enabled:
             continue
 
@@ -5412,14 +7206,12 @@ def create_explosion(position, radius, damage):
         if distance_to_explosion <= radius:
             print(f"💥 Враг попал в радиус взрыва! Дистанция: {distance_to_explosion}")
 
-            # УБИВАЕМ ВРАГА МГНОВЕННО
-            create_blood_effect_optimized(enemy.entity.position + Vec3(0, 1, 0))
-            on_enemy_killed()
+            # УБИВАЕМ ВРАГА МГНОВЕННО (кровь - через очередь, взрыв задевает сразу пачку)
+            spawn_queue.push("blood_effect", create_blood_effect_optimized, enemy.entity.position + Vec3(0, 1, 0))
+            on_enemy_killed(enemy)
 
-            # Уничтожаем врага
-            destroy(enemy.entity)
-            if enemy in enemies:
-                enemies.remove(enemy)
+            # Возвращаем врага в пул
+            release_enemy(enemy)
 
 
 def start_explosion_shake(intensity_factor=1.0):
@@ -5448,13 +7240,13 @@ def update_explosion_shake():
             current_intensity = explosion_shake_intensity * progress
 
             # Случайные смещения для тряски (высокочастотные для взрыва)
-            shake_x = math.sin(time.time() * 50) * current_intensity * 0.5
-            shake_y = math.cos(time.time() * 45) * current_intensity * 0.7
-            shake_z = math.sin(time.time() * 55) * current_intensity * 0.3
+            shake_x = math.sin(sim_clock.time * 50) * current_intensity * 0.5
+            shake_y = math.cos(sim_clock.time * 45) * current_intensity * 0.7
+            shake_z = math.sin(sim_clock.time * 55) * current_intensity * 0.3
 
             # Наклон камеры от взрыва
-            tilt_x = math.sin(time.time() * 30) * current_intensity * 2
-            tilt_z = math.cos(time.time() * 25) * current_intensity * 3
+            tilt_x = math.sin(sim_clock.time * 30) * current_intensity * 2
+            tilt_z = math.cos(sim_clock.time * 25) * current_intensity * 3
 
             # Сохраняем текущую тряску для использования в основном update
             current_explosion_shake = (shake_x, shake_y, shake_z)
@@ -5470,7 +7262,7 @@ def update_explosion_shake():
 
 # ОБНОВЛЯЕМ ФУНКЦИЮ handle_shooting
 def handle_shooting():
-    global is_shooting, last_fire_time, is_firing_auto
+    global is_shooting, last_fire_time, is_firing_auto, shoot_strength
 
     # Если идет анимация выстрела или перезарядки - выходим
     if is_shooting or is_reloading_anim:
@@ -5489,10 +7281,11 @@ def handle_shooting():
     # Только для автоматического оружия
     data = weapon_data[current_weapon]
     if data["auto_fire"] and is_firing_auto:
-        current_time = time.time()
+        current_time = sim_clock.time
         if current_time - last_fire_time >= auto_fire_delay:
             perform_shot()
             last_fire_time = current_time
+            shoot_strength = 1
 
 
 # ФУНКЦИЯ СОЗДАНИЯ HUD ДЛЯ ОРУЖИЯ (УВЕЛИЧЕННАЯ ВЕРСИЯ)
@@ -5704,7 +7497,7 @@ def update_weapon_hud():
         weapon_icons["reload_text"].text = "ПЕРЕЗАРЯДКА..."
         weapon_icons["reload_text"].color = color.yellow
         # Мигающий эффект
-        pulse = math.sin(time.time() * 2) * 0.08 + 0.1
+        pulse = math.sin(sim_clock.time * 2) * 0.08 + 0.1
         weapon_icons["reload_text"].scale = 3.8 * pulse
     else:
         weapon_icons["reload_text"].text = ""
@@ -5934,7 +7727,7 @@ def update_health_hud():
         stage_text.text = f"STAGE: {current_stage}"
 
     if enemies_text:
-        enemies_text.text = f"Враги: {stage_enemies_killed}/{enemies_to_kill_for_stage}"
+        enemies_text.text = f"Враги: {enemy_registry.killed}/{enemies_to_kill_for_stage}"
 
     # ОБНОВЛЯЕМ ЗДОРОВЬЕ
     if health_bar and health_text and heart_icon:
@@ -5968,12 +7761,12 @@ def update_health_hud():
 
         # Эффект пульсации при низком здоровье
         if health_percentage < 0.3:
-            pulse = math.sin(time.time() * 8) * 0.1 + 0.9
+            pulse = math.sin(sim_clock.time * 8) * 0.1 + 0.9
             health_bar.color = color.red * pulse
             health_text.color = color.red * pulse
 
             # Анимация сердца
-            heart_pulse = math.sin(time.time() * 10) * 0.2 + 0.8
+            heart_pulse = math.sin(sim_clock.time * 10) * 0.2 + 0.8
             new_scale_x = 0.05 * heart_pulse
             new_scale_y = 0.05 * heart_pulse
             heart_icon.scale = (new_scale_x, new_scale_y)
@@ -5981,6 +7774,12 @@ def update_health_hud():
             health_text.color = color.white
             heart_icon.scale = (0.05, 0.05)  # Возвращаем нормальный размер
 
+    # В HEADLESS ИГРОК НЕ УМИРАЕТ - СЧИТАЕМ СМЕРТИ И ПРОДОЛЖАЕМ ПРОГОН
+    if player_health <= 0 and HEADLESS_MODE:
+        headless_stats["deaths"] += 1
+        player_health = player_max_health
+        return
+
     # ПРОВЕРКА СМЕРТИ, ВИДЕО И АУДИО
     if player_health <= 0 and not hasattr(update_health_hud, 'death_triggered'):
         update_health_hud.death_triggered = True
@@ -6066,11 +7865,11 @@ def create_damage_effect():
 
     # Анимация исчезновения
     def fade_damage_effect():
-        start_time = time.time()
+        start_time = sim_clock.time
         duration = 0.5
 
         def update_fade():
-            current_time = time.time()
+            current_time = sim_clock.time
             progress = (current_time - start_time) / duration
 
             if progress < 1 and damage_overlay.enabled:
@@ -6123,11 +7922,11 @@ def create_heal_effect():
         )
 
         def animate_heal_particle(particle=heal_particle):
-            start_time = time.time()
+            start_time = sim_clock.time
             duration = 1.0
 
             def update_particle():
-                current_time = time.time()
+                current_time = sim_clock.time
                 progress = (current_time - start_time) / duration
 
                 if progress < 1 and particle.enabled:
@@ -6144,11 +7943,11 @@ def create_heal_effect():
 
     # Анимация исчезновения
     def fade_heal_effect():
-        start_time = time.time()
+        start_time = sim_clock.time
         duration = 0.8
 
         def update_fade():
-            current_time = time.time()
+            current_time = sim_clock.time
             progress = (current_time - start_time) / duration
 
             if progress < 1 and heal_overlay.enabled:
@@ -6216,6 +8015,7 @@ def create_heal_pickup(position):
     float_heal()
 
     heal_pickups.append(heal_pickup)
+    heal_pickup_grid.insert(heal_pickup, heal_pickup.x, heal_pickup.z)
     return heal_pickup
 
 
@@ -6228,8 +8028,8 @@ def check_heal_pickup_collisions():
         heal_pickup_cooldown -= time.dt
         return
 
-    # Проверяем каждую аптечку
-    for pickup in heal_pickups[:]:  # Используем копию списка для безопасного удаления
+    # Проверяем только аптечки в клетках рядом с игроком
+    for pickup in heal_pickup_grid.query(player.position.x, player.position.z, 2.0):
         if not pickup or not pickup.enabled:
             continue
 
@@ -6271,6 +8071,7 @@ def pickup_heal(pickup):
     # Удаляем из списка
     if pickup in heal_pickups:
         heal_pickups.remove(pickup)
+    heal_pickup_grid.remove(pickup)
 
     # Устанавливаем кулдаун
     heal_pickup_cooldown = 0.5
@@ -6301,11 +8102,11 @@ def create_pickup_effect(position):
         ).normalized()
 
         def animate_particle(p=particle, d=direction):
-            start_time = time.time()
+            start_time = sim_clock.time
             lifetime = 1.5
 
             def update_particle():
-                current_time = time.time()
+                current_time = sim_clock.time
                 age = current_time - start_time
 
                 # ПРОВЕРЯЕМ ЧТО ЧАСТИЦА СУЩЕСТВУЕТ
@@ -6356,6 +8157,7 @@ def create_ammo_pickup(position):
     float_ammo()
 
     ammo_pickups.append(ammo_pickup)
+    ammo_pickup_grid.insert(ammo_pickup, ammo_pickup.x, ammo_pickup.z)
     return ammo_pickup
 
 
@@ -6372,8 +8174,8 @@ def check_ammo_pickup_collisions():
         ammo_pickup_cooldown -= time.dt
         return
 
-    # Проверяем каждую пачку патронов
-    for pickup in ammo_pickups[:]:  # Используем копию списка для безопасного удаления
+    # Проверяем только пачки патронов в клетках рядом с игроком
+    for pickup in ammo_pickup_grid.query(player.position.x, player.position.z, 2.0):
         if not pickup or not pickup.enabled:
             continue
 
@@ -6434,6 +8236,7 @@ def pickup_ammo(pickup):
     # Удаляем из списка
     if pickup in ammo_pickups:
         ammo_pickups.remove(pickup)
+    ammo_pickup_grid.remove(pickup)
 
     # Устанавливаем кулдаун
     ammo_pickup_cooldown = 0.5
@@ -6456,29 +8259,12 @@ def pickup_ammo(pickup):
 
 # ФУНКЦИЯ РЕСПАВНА ПАЧКИ ПАТРОНОВ
 def respawn_ammo_pickup():
-    # Определяем границы обеих зон вместе
-    x_min, x_max = -56, 63  # общие границы по X для обеих зон
-    z_min, z_max = -203, -46  # общие границы по Z для обеих зон
-
-    attempts = 0
-    max_attempts = 20  # Увеличиваем количество попыток
-
-    while attempts < max_attempts:
-        # Генерируем случайную позицию в общих границах
-        x = random.uniform(x_min, x_max)
-        z = random.uniform(z_min, z_max)
-        position = (x, 0.5, z)
-
-        # Проверяем, что позиция находится в одной из зон
-        if is_position_in_spawn_area(Vec3(position)):
-            # Проверяем расстояние до игрока
-            if (Vec3(position) - player.position).length() >= 5:
-                # Нашли подходящую позицию
-                create_ammo_pickup(position)
-                print(f"🔫 Новая пачка патронов зареспавнилась! Позиция: {position}")
-                return
-
-        attempts += 1
+    _, point = spawn_points.draw("pickup", player.position, 5)
+    if point is not None:
+        position = (point.x, 0.5, point.z)
+        create_ammo_pickup(position)
+        print(f"🔫 Новая пачка патронов зареспавнилась! Позиция: {position}")
+        return
 
     # Если не нашли подходящую позицию
     invoke(respawn_ammo_pickup, delay=10.0)
@@ -6525,11 +8311,11 @@ def create_ammo_pickup_effect(position, ammo_type):
         ).normalized()
 
         def animate_particle(p=particle, d=direction, color=effect_color):
-            start_time = time.time()
+            start_time = sim_clock.time
             lifetime = 1.2
 
             def update_particle():
-                current_time = time.time()
+                current_time = sim_clock.time
                 age = current_time - start_time
 
                 if p and p.enabled and age < lifetime:
@@ -6647,7 +8433,7 @@ def spawn_assault_rifle_pickup():
 
     def update_glow():
         if glow and glow.enabled:
-            pulse = math.sin(time.time() * 5) * 0.2 + 0.8
+            pulse = math.sin(sim_clock.time * 5) * 0.2 + 0.8
             glow.scale = 2.5 * pulse
             invoke(update_glow, delay=1 / 30)
 
@@ -6661,67 +8447,28 @@ def spawn_assault_rifle_pickup():
         'glow': glow,
         'weapon_type': 'assault_rifle'
     })
+    weapon_pickup_grid.insert(weapon_pickups[-1], assault_rifle_pickup.x, assault_rifle_pickup.z)
 
     print("🔫 Автомат заспавнен на карте! Найдите его!")
     return assault_rifle_pickup
 
 
-def find_valid_spawn_position():
+def find_valid_spawn_position(min_distance=PICKUP_SPAWN_MIN_DISTANCE):
     """Находит валидную позицию для спавна в одной из двух областей"""
-    # Случайно выбираем зону спавна: 0 - основная зона, 1 - вторая зона
-    zone_choice = random.randint(0, 1)
-
-    if zone_choice == 0:
-        # ПЕРВАЯ ЗОНА: основная (как было)
-        center_x = 53
-        center_y = 2
-        center_z = -81
+    area, position = spawn_points.draw("pickup", player.position, min_distance)
+    if position is not None:
+        print(f"✅ {area.name}: X={position.x:.1f}, Z={position.z:.1f}")
+        return position
 
-        # Размеры области
-        width = 20  # ширина по оси X (от 43 до 63)
-        length = 70  # длина по оси Z (от -116 до -46)
-
-        zone_name = "ОСНОВНАЯ ЗОНА"
-    else:
-        # ВТОРАЯ ЗОНА: радиус 25 от точки (-31, 1, -178)
-        center_x = -31
-        center_y = 2
-        center_z = -178
-
-        # Размеры области (радиус 25, значит квадрат 50x50)
-        width = 50  # от -56 до -6 по X
-        length = 50  # от -203 до -153 по Z
-
-        zone_name = "ВТОРАЯ ЗОНА (радиус 25)"
-
-    # ЖЕСТКОЕ ограничение только выбранной областью
-    for attempt in range(30):
-        # Генерируем строго в выбранной области
-        x = random.uniform(center_x - width / 2, center_x + width / 2)
-        z = random.uniform(center_z - length / 2, center_z + length / 2)
-        position = Vec3(x, center_y, z)
-
-        # Проверяем что точно в пределах выбранной зоны
-        if zone_choice == 0:
-            in_zone = (43 <= x <= 63 and -116 <= z <= -46)
-        else:
-            in_zone = (-56 <= x <= -6 and -203 <= z <= -153)
-
-        if in_zone:
-            # Проверяем дистанцию до игрока
-            distance_to_player = (position - player.position).length()
-            if distance_to_player > 10:  # Не ближе 10 единиц
-                print(f"✅ {zone_name}: X={x:.1f}, Z={z:.1f}")
-                return position
-
-    # Если не нашли - возвращаем центр выбранной зоны
-    print(f"❌ Не нашли позицию в {zone_name}, возвращаем центр зоны")
-    return Vec3(center_x, center_y, center_z)
+    # Игрок закрывает собой обе области - возвращаем центр случайной
+    area = random.choice(PICKUP_SPAWN_AREAS)
+    print(f"❌ Не нашли позицию в {area['name']}, возвращаем центр зоны")
+    return Vec3(sum(area["x"]) / 2, area["y"], sum(area["z"]) / 2)
 
 
 def check_weapon_pickup_collisions():
     """Проверяет столкновения с оружием на карте"""
-    for pickup_data in weapon_pickups[:]:
+    for pickup_data in weapon_pickup_grid.query(player.position.x, player.position.z, 3.0):
         if not pickup_data or not pickup_data['entity'] or not pickup_data['entity'].enabled:
             continue
 
@@ -6766,6 +8513,7 @@ def pickup_weapon(pickup_data):
     # Удаляем из списка
     if pickup_data in weapon_pickups:
         weapon_pickups.remove(pickup_data)
+    weapon_pickup_grid.remove(pickup_data)
 
     # УБИРАЕМ ТЕКСТ ЗАДАНИЯ
     if current_mission_text:
@@ -6813,11 +8561,11 @@ def create_weapon_pickup_effect(position, weapon_type):
         ).normalized()
 
         def animate_particle(p=particle, d=direction):
-            start_time = time.time()
+            start_time = sim_clock.time
             lifetime = 1.5
 
             def update_particle():
-                current_time = time.time()
+                current_time = sim_clock.time
                 age = current_time - start_time
 
                 if p and p.enabled and age < lifetime:
@@ -6861,10 +8609,8 @@ def hard_cleanup_all():
     global enemies
     for enemy_obj in enemies[:]:
         if not enemy_obj or not enemy_obj.entity or not enemy_obj.entity.enabled:
-            # Уничтожаем все связанные объекты
-            if enemy_obj.entity and enemy_obj.entity.enabled:
-                destroy(enemy_obj.entity)
-            enemies.remove(enemy_obj)
+            # Возвращаем в пул вместе с Actor и Entity
+            release_enemy(enemy_obj)
             cleaned += 1
 
     # 2. ОЧИСТКА ВСЕХ ЭФФЕКТОВ (без условий по времени)
@@ -6878,13 +8624,7 @@ def hard_cleanup_all():
         blood_effects.remove(blood_particles)
 
     # 3. ОЧИСТКА ВСЕХ ТРАССЕРОВ
-    for tracer_data in bullet_tracers[:]:
-        if len(tracer_data) == 2:
-            tracer, spawn_time = tracer_data
-            if tracer and tracer.enabled:
-                destroy(tracer)
-                cleaned += 1
-        bullet_tracers.remove(tracer_data)
+    cleaned += clear_projectiles((PROJECTILE_TRACER,))
 
     # 4. ОЧИСТКА ВСЕХ ВСПЫШЕК
     for flash_data in muzzle_flash_entities[:]:
@@ -6898,24 +8638,14 @@ def hard_cleanup_all():
 
     # 5. ОЧИСТКА ТОЛЬКО ВЗРЫВНЫХ СНАРЯДОВ (игрока)
     # СНАРЯДЫ ВРАГОВ НЕ ОЧИЩАЕМ - они могут быть в полете!
-    global enemy_projectiles, explosive_projectiles
-
-    # Очищаем только взрывные снаряды (игрока)
-    for projectile in explosive_projectiles[:]:
-        if projectile and projectile.enabled:
-            destroy(projectile)
-            cleaned += 1
-        explosive_projectiles.remove(projectile)
-
-    # СНАРЯДЫ ВРАГОВ ПРОПУСКАЕМ - они обрабатываются в своей системе
-    # enemy_projectiles НЕ очищаем!
+    cleaned += clear_projectiles((PROJECTILE_GRENADE,))
 
     # 6. ПРИНУДИТЕЛЬНЫЙ СБОР МУСОРА
     import gc
     gc.collect()
     print(f"🧹 ПОЛНАЯ ОЧИСТКА: удалено {cleaned} объектов")
     print(f"📊 Врагов осталось: {len(enemies)}")
-    print(f"🎯 Снарядов врагов в полете: {len(enemy_projectiles)}")
+    print(f"🎯 Снарядов врагов в полете: {projectile_store.count_of(PROJECTILE_ORB)}")
     return cleaned
 
 
@@ -6947,9 +8677,9 @@ def debug_memory():
     """Диагностика памяти"""
     print("=== ДИАГНОСТИКА ПАМЯТИ ===")
     print(f"Врагов: {len(enemies)}")
-    print(f"Снарядов врагов: {len(enemy_projectiles)}")
+    print(f"Снарядов врагов: {projectile_store.count_of(PROJECTILE_ORB)}")
     print(f"Эффектов крови: {len(blood_effects)}")
-    print(f"Трассеров: {len(bullet_tracers)}")
+    print(f"Трассеров: {projectile_store.count_of(PROJECTILE_TRACER)}")
     print(f"Вспышек: {len(muzzle_flash_entities)}")
 
     # Подсчет "мертвых" врагов
@@ -6994,7 +8724,7 @@ def safe_render_cleanup():
     # Получаем список защищенных объектов
     protected_objects = protect_critical_objects()
 
-    # 1. Очищаем ТОЛЬКО неактивные и неважные объекты
+    # 1. Очищаем ТОЛЬКО неактивные и неважные объекты (пулы - в protected_objects)
     for entity in scene.entities[:]:  # Используем копию списка
         if (hasattr(entity, 'enabled') and not entity.enabled and
                 entity not in protected_objects):
@@ -7017,15 +8747,7 @@ def safe_render_cleanup():
                         pass
 
     # 3. Очистка трассеров и вспышек
-    for tracer_data in bullet_tracers[:]:
-        if len(tracer_data) == 2:
-            tracer, spawn_time = tracer_data
-            if tracer and tracer.enabled and tracer not in protected_objects:
-                try:
-                    destroy(tracer)
-                    cleaned += 1
-                except:
-                    pass
+    cleaned += clear_projectiles((PROJECTILE_TRACER,), protected_objects)
 
     for flash_data in muzzle_flash_entities[:]:
         if len(flash_data) == 2:
@@ -7039,28 +8761,10 @@ def safe_render_cleanup():
                         pass
 
     blood_effects.clear()
-    bullet_tracers.clear()
     muzzle_flash_entities.clear()
 
-    # 4. Очистка снарядов врагов
-    global enemy_projectiles, explosive_projectiles
-    for projectile in enemy_projectiles[:]:
-        if projectile and projectile.enabled and projectile not in protected_objects:
-            try:
-                destroy(projectile)
-                cleaned += 1
-            except:
-                pass
-    enemy_projectiles.clear()
-
-    for projectile in explosive_projectiles[:]:
-        if projectile and projectile.enabled and projectile not in protected_objects:
-            try:
-                destroy(projectile)
-                cleaned += 1
-            except:
-                pass
-    explosive_projectiles.clear()
+    # 4. Очистка снарядов врагов и гранат
+    cleaned += clear_projectiles((PROJECTILE_ORB, PROJECTILE_GRENADE), protected_objects)
 
     # 5. Принудительный сбор мусора
     import gc
@@ -7078,9 +8782,17 @@ def protect_critical_objects():
         stage_text, enemies_text, press_e_text,
         dialogue_bg, npc_name, npc_line, button1, button2,
         human, head, body, human_collider,
-        sky
+        sky, tracer_batch.entity
     ]
 
+    # Выключенные, но живые: враги, снаряды и частицы в пулах ждут следующего использования
+    critical_objects.extend(enemy_pool.parked_entities())
+    critical_objects.extend(orb_pool.parked_entities())
+    critical_objects.extend(grenade_pool.parked_entities())
+    for particle_pool in (blood_pool, muzzle_flash_pool):
+        if particle_pool:
+            critical_objects.extend(particle_pool.particles)
+
     # Добавляем все оружия из словаря
     if weapons:
         critical_objects.extend(weapons.values())
@@ -7150,11 +8862,11 @@ def update_shader_intensity():
 
 def animate_explosion_particle(particle, direction, speed, lifetime):
     """Анимация частицы взрыва"""
-    start_time = time.time()
+    start_time = sim_clock.time
     start_scale = particle.scale
 
     def update_particle():
-        current_time = time.time()
+        current_time = sim_clock.time
         age = current_time - start_time
 
         if age < lifetime and particle and particle.enabled:
@@ -7176,34 +8888,6 @@ def animate_explosion_particle(particle, direction, speed, lifetime):
     update_particle()
 
 
-def destroy_projectile(projectile):
-    """Безопасное уничтожение снаряда и всех связанных объектов"""
-    if not projectile:
-        return
-
-    # Уничтожаем связанные объекты
-    related_objects = []
-
-    if hasattr(projectile, 'glow'):
-        related_objects.append(projectile.glow)
-    if hasattr(projectile, 'particles'):
-        related_objects.extend(projectile.particles)
-
-    # Уничтожаем основной снаряд
-    try:
-        destroy(projectile)
-    except:
-        pass
-
-    # Уничтожаем связанные объекты
-    for obj in related_objects:
-        if obj and hasattr(obj, 'enabled') and obj.enabled:
-            try:
-                destroy(obj)
-            except:
-                pass
-
-
 def apply_stun_effect(duration=0.5):
     """Применяет эффект оглушения к игроку"""
     global is_stunned, stun_effect_time, stun_effect_duration
@@ -7229,10 +8913,6 @@ def apply_stun_effect(duration=0.5):
     print(f"😵 Игрок оглушен на {duration} секунд!")
 
 
-def convert_all_old_projectiles():
-    """Конвертирует все старые снаряды в новый формат"""
-    for projectile in enemy_projectiles:
-        ensure_projectile_attributes(projectile)
 def update_all_animations():
     """Обновляет все активные анимации в игре"""
     # Если есть глобальная система анимаций - обновляем ее
@@ -7436,6 +9116,104 @@ def quit_game():
 
 
 
+def update_stage_logic():
+    """Анимация стадии, запуск спавна и проверка завершения"""
+    # Обновление анимаций стадий
+    update_stage_animation()
+
+    # Запуск стадий
+    if not enemies_spawned_for_current_stage and not stage_animation["is_playing"]:
+        update_stage()
+
+    # Проверка завершения стадии
+    check_stage_completion()
+
+
+def snapshot_enemy_positions():
+    """Запоминает позиции врагов до шага - между ними интерполируется рендер"""
+    count = enemy_store.count
+    enemy_store.previous_position[:count] = enemy_store.position[:count]
+
+
+def check_pickups():
+    """Проверка подбора аптечек, патронов и оружия"""
+    check_heal_pickup_collisions()
+    check_ammo_pickup_collisions()
+    check_weapon_pickup_collisions()
+
+
+def simulation_step():
+    """Один фиксированный шаг игровой логики - время берется только из sim_clock"""
+    system_scheduler.run("simulation", sim_clock.dt, sim_clock.time)
+
+
+def interpolate_enemy_render():
+    """Сдвигает модели врагов между двумя последними шагами симуляции"""
+    count = enemy_store.count
+    if not count:
+        return
+
+    previous = enemy_store.previous_position[:count]
+    render_positions = (previous + (enemy_store.position[:count] - previous) * sim_clock.alpha).tolist()
+
+    for enemy, (x, y, z) in zip(enemy_store.owners, render_positions):
+        if not enemy.entity or not enemy.entity.enabled:
+            continue
+        # Entity остается в точке симуляции (коллайдер), двигаем только Actor
+        enemy.actor.setPos(scene, x, y, z)
+
+
+def interpolate_projectile_render():
+    """Сдвигает снаряды врагов и гранаты между двумя последними шагами симуляции (трассеры - в tracer_batch)"""
+    store = projectile_store
+    slots = np.flatnonzero(store.kind[:store.count] != PROJECTILE_TRACER)
+    if not len(slots):
+        return
+
+    previous = store.previous_position[slots]
+    render_positions = (previous + (store.position[slots] - previous) * sim_clock.alpha).tolist()
+    directions = store.direction[slots].tolist()
+
+    for slot, (x, y, z), direction in zip(slots.tolist(), render_positions, directions):
+        projectile = store.owners[slot]
+        position = Vec3(x, y, z)
+        projectile.entity.position = position
+
+        glow = projectile.glow
+        if glow and glow.enabled:
+            glow.position = position
+
+        tail = projectile.tail
+        if tail and tail.enabled:
+            tail.position = position - Vec3(*direction) * 0.8
+            tail.look_at(position)
+
+
+# РЕГИСТРАЦИЯ СИСТЕМ: каждая ровно один раз, порядок регистрации = порядок запуска
+# Шаг симуляции (SIMULATION_TICK_RATE раз в секунду)
+system_scheduler.register("stage_logic", update_stage_logic, budget_ms=1.0)
+system_scheduler.register("enemy_snapshot", snapshot_enemy_positions, budget_ms=0.5)
+system_scheduler.register("enemy_movement", safe_update_enemies_optimized, budget_ms=2.0)
+system_scheduler.register("enemy_lod", update_enemy_lod, rate=5, budget_ms=1.0)
+system_scheduler.register("attack_timers", update_attack_timers, budget_ms=0.5)
+system_scheduler.register("enemy_ai", update_enemies, rate=20, budget_ms=2.0)
+system_scheduler.register("shot_effects", update_shot_effects, budget_ms=1.0)
+system_scheduler.register("projectiles", update_projectiles, budget_ms=1.5)
+system_scheduler.register("bullet_hits", check_bullet_hits, budget_ms=1.5)
+system_scheduler.register("blood_effects", update_blood_effects_optimized, rate=10, budget_ms=1.0, pass_dt=True)
+# Кадр рендера
+system_scheduler.register("interpolate_enemy_render", interpolate_enemy_render, phase="frame", budget_ms=1.0)
+system_scheduler.register("interpolate_projectile_render", interpolate_projectile_render, phase="frame", budget_ms=1.0)
+system_scheduler.register("handle_shooting", handle_shooting, phase="frame", budget_ms=1.0)
+system_scheduler.register("pickups", check_pickups, phase="frame", budget_ms=1.0)
+system_scheduler.register("tracer_batch", tracer_batch.rebuild, phase="frame", budget_ms=1.0)
+system_scheduler.register("spawn_queue", spawn_queue.run, phase="frame", budget_ms=SPAWN_QUEUE_BUDGET_MS + 2.0)
+system_scheduler.register("health_hud", update_health_hud, phase="frame", rate=10, budget_ms=0.5)
+system_scheduler.register("weapon_hud", update_weapon_hud, phase="frame", rate=10, budget_ms=0.5)
+system_scheduler.register("blood_cleanup", cleanup_excess_blood_effects, phase="frame", rate=0.2, budget_ms=2.0)
+system_scheduler.register("hard_cleanup", hard_cleanup_all, phase="frame", rate=1 / 60, budget_ms=10.0)
+
+
 def update():
     global coordinates_debug_timer, player_health, is_sprinting
     global in_dialogue, is_moving, shake_timer, is_shooting, shoot_animation_time
@@ -7444,6 +9222,8 @@ def update():
     global stun_effect_time, is_stunned, shoot_strength, reload_strength, walk_strength, shader_enabled, grenade_effect
     global lvl, shader_intensity
     global shader_test_window
+    frame_profiler.begin_frame()
+    frame_profiler.update_overlay()
     # ЕСЛИ АКТИВНО ТЕСТИРОВАНИЕ ШЕЙДЕРА
     if shader_test_window and shader_test_window.get('is_active', True):
         # Обновляем только тестовое окно
@@ -7464,17 +9244,6 @@ def update():
         return
     if game_started and trigger_area:
         check_trigger()
-    if random.random() < 0.5:  # 50% шанс обновления каждый кадр
-        update_blood_effects_optimized()
-        # Если открыто окно тестирования шейдеров
-
-
-    if not hasattr(update, 'last_blood_cleanup'):
-        update.last_blood_cleanup = time.time()
-
-    if time.time() - update.last_blood_cleanup > 5.0:  # Каждые 5 секунд
-        cleanup_excess_blood_effects()
-        update.last_blood_cleanup = time.time()
     update_all_animations()
     # =========== ЕСЛИ ИГРА НЕ НАЧАЛАСЬ ===========
     # =========== ЕСЛИ ИГРА НЕ НАЧАЛАСЬ ===========
@@ -7517,11 +9286,6 @@ def update():
         # ВЫХОДИМ ИЗ UPDATE РАНО - не выполняем ВСЮ логику игры
         return
 
-    # Конвертация снарядов
-    if not hasattr(update, 'projectiles_converted'):
-        convert_old_projectiles()
-        update.projectiles_converted = True
-
     # Проверка падения
     if player.position.y < -5:
         print("⚠️ Игрок упал, телепортируем обратно!")
@@ -7530,7 +9294,7 @@ def update():
             player.velocity_y = 0
 
     # Управление шейдером
-    camera.set_shader_input("time", time.time())
+    camera.set_shader_input("time", sim_clock.time)
 
     if shader_enabled:
         shoot_strength = max(0, shoot_strength - time.dt * 4)
@@ -7548,46 +9312,20 @@ def update():
         camera.set_shader_input("walk_strength", 0.0)
         camera.set_shader_input("grenade_effect", 0.0)
 
-    # Обновление анимаций стадий
-    update_stage_animation()
-
-    # Запуск стадий
-    if not enemies_spawned_for_current_stage and not stage_animation["is_playing"]:
-        update_stage()
-
-    # Проверка завершения стадии
-    check_stage_completion()
-
-    # Полная очистка каждые 60 секунд
-    if not hasattr(update, 'last_full_cleanup'):
-        update.last_full_cleanup = time.time()
+    # Игровая логика - фиксированными шагами симуляции, независимо от FPS
+    simulation_steps = sim_clock.advance(time.dt)
+    for _ in range(simulation_steps):
+        sim_clock.begin_step()
+        simulation_step()
 
-    if time.time() - update.last_full_cleanup > 60.0:
-        hard_cleanup_all()
-        update.last_full_cleanup = time.time()
+    # Системы кадра: интерполяция, стрельба, подбор, HUD и периодическая очистка
+    system_scheduler.run("frame", time.dt, sim_clock.time)
 
-    # Обновление HUD
-    update_health_hud()
     update_explosion_shake()
     update_reload_animation()
 
-    # Обновление игрока и врагов
-    safe_update_enemies_optimized()
     show_coordinates_console()
 
-    # Обновление оружия
-    handle_shooting()
-
-    # Проверка подбора предметов
-    check_heal_pickup_collisions()
-    update_weapon_hud()
-    check_ammo_pickup_collisions()
-    check_weapon_pickup_collisions()
-
-    # Обновление анимации перезарядки
-    if not is_reloading_anim:
-        handle_shooting()
-
     # Отслеживание истории позиций для предсказания
     if not hasattr(player, 'last_position'):
         player.last_position = player.position
@@ -7601,22 +9339,12 @@ def update():
     if is_sprinting:
         check_sprint_collisions()
 
-    # Обновление эффектов
-    update_shot_effects()
-
     # Изменение FOV для спринта
     if is_sprinting:
         camera.fov = 85
     else:
         camera.fov = 80
 
-    # Обновление врагов и снарядов
-    update_enemies()
-    update_enemy_projectiles()
-    check_bullet_hits()
-    safe_update_effects()
-    update_explosive_projectiles()
-
     # Проверка смерти игрока
     if player_health <= 0:
         player_health = 0
@@ -7631,6 +9359,7 @@ def update():
             stun_effect_time = 0
 
     # Получаем базовые позиции оружия
+    frame_profiler.start("camera_weapon_sway")
     data = weapon_data[current_weapon]
     weapon_base_position = data["position"]
     weapon_base_rotation = data["rotation"]
@@ -7692,10 +9421,10 @@ def update():
             if shake_progress < 1.0:
                 current_shake = shoot_camera_shake_intensity * (1 - shake_progress)
 
-                high_freq_shake_x = math.sin(time.time() * 80) * current_shake * 0.3
-                high_freq_shake_y = math.cos(time.time() * 75) * current_shake * 0.2
-                low_freq_shake_x = math.sin(time.time() * 25) * current_shake * 0.7
-                low_freq_shake_y = math.cos(time.time() * 20) * current_shake * 0.5
+                high_freq_shake_x = math.sin(sim_clock.time * 80) * current_shake * 0.3
+                high_freq_shake_y = math.cos(sim_clock.time * 75) * current_shake * 0.2
+                low_freq_shake_x = math.sin(sim_clock.time * 25) * current_shake * 0.7
+                low_freq_shake_y = math.cos(sim_clock.time * 20) * current_shake * 0.5
 
                 total_shake_x = high_freq_shake_x + low_freq_shake_x
                 total_shake_y = high_freq_shake_y + low_freq_shake_y
@@ -7737,18 +9466,7 @@ def update():
                 camera.position = camera_base_position
                 camera.rotation = (0, 0, 0)
 
-    # Автоматическая стрельба
-    if is_firing_auto and data["auto_fire"]:
-        current_time = time.time()
-        if current_time - last_fire_time >= data["fire_rate"]:
-            ammo_type = weapon_data[current_weapon]["ammo_type"]
-            ammo_info = ammo_data[ammo_type]
-            if ammo_info['current_ammo'] > 0:
-                perform_shot()
-                last_fire_time = current_time
-                shoot_strength = 1
-            else:
-                is_firing_auto = False
+    # Автоматическая стрельба - только система handle_shooting в планировщике
 
     # Движение и тряска
     if not is_reloading_anim:
@@ -7832,6 +9550,7 @@ def update():
     else:
         if walk.playing:
             walk.stop()
+    frame_profiler.stop("camera_weapon_sway")
 
     # Диалоги
     if in_dialogue:
@@ -7926,7 +9645,7 @@ def input(key):
         if data["auto_fire"]:
             # Автоматическая стрельба для автомата - начинаем стрельбу
             is_firing_auto = True
-            last_fire_time = time.time() - auto_fire_delay  # ⬅️ ИСПРАВЛЕНИЕ: сразу можем стрелять
+            last_fire_time = sim_clock.time - auto_fire_delay  # ⬅️ ИСПРАВЛЕНИЕ: сразу можем стрелять
             print(f"🔫 Начата автоматическая стрельба из {current_weapon}!")
         else:
             # Полуавтоматическая стрельба для пистолета - один выстрел
@@ -7999,6 +9718,8 @@ def input(key):
 
     if key == 'f6':
         debug_memory()
+    if key == 'f7':
+        frame_profiler.toggle_overlay()
     if key == 'h':
         hard_cleanup_all()
     if key == 'f5':  # Ручная очистка
@@ -8052,6 +9773,299 @@ def close_dialogue():
 button1.on_click = close_dialogue
 button2.on_click = close_dialogue
 
+
+# ==================== HEADLESS СИМУЛЯЦИЯ ====================
+
+headless_bot_mode = HEADLESS_BOT  # Бенчмарк переключает бота между сценариями
+
+headless_stats = {
+    "ticks": 0,
+    "total_time": 0.0,
+    "window_time": 0.0,
+    "window_max": 0.0,
+    "deaths": 0,
+}
+
+
+def start_headless_simulation():
+    """Запускает игру без меню, видео и HUD - сразу к прогрессии стадий"""
+    global game_started, camera_mode, current_stage, enemies_spawned_for_current_stage
+
+    print(f"🤖 HEADLESS: stage {HEADLESS_START_STAGE}, {HEADLESS_TICK_RATE} тиков/сек, бот '{HEADLESS_BOT}'")
+
+    cleanup_lobby_entirely()
+
+    game_started = True
+    camera_mode = "player"
+    player.enabled = True
+    player.position = Vec3(-8, 10, -308)
+    create_wall((-16, 0, -309), (-4, 0, -309), height=40, thickness=0.1)
+    location.enabled = False
+    cl2_1.enabled = False
+
+    # Боту доступно все оружие
+    for weapon_type in weapon_data:
+        if weapon_type not in unlocked_weapons:
+            unlocked_weapons.append(weapon_type)
+    switch_weapon(HEADLESS_WEAPON if HEADLESS_WEAPON in weapon_data else "pistol")
+
+    if not optimized_systems_initialized:
+        init_optimized_systems()
+
+    current_stage = HEADLESS_START_STAGE
+    enemies_spawned_for_current_stage = False
+    update_shader_intensity()
+    start_stage_animation(current_stage)
+
+
+def headless_bot_update():
+    """Скриптовый игрок: целится в ближайшего врага и стреляет без перезарядки"""
+    global is_firing_auto
+
+    if headless_bot_mode != "script" or not game_started:
+        return
+
+    # Ищем ближайшего живого врага
+    target = None
+    best_distance = float('inf')
+    for enemy in enemies:
+        if enemy and enemy.entity and enemy.entity.enabled:
+            dist = (enemy.entity.position - player.position).length()
+            if dist < best_distance:
+                best_distance = dist
+                target = enemy
+
+    data = weapon_data[current_weapon]
+    if not target:
+        is_firing_auto = False
+        return
+
+    # Бесконечные патроны - меряем симуляцию, а не перезарядку
+    ammo_info = ammo_data[data["ammo_type"]]
+    ammo_info['current_ammo'] = ammo_info['max_ammo']
+
+    player.camera_pivot.look_at(target.entity.world_position + Vec3(0, 1, 0))
+
+    if data["auto_fire"]:
+        is_firing_auto = True
+    else:
+        if not hasattr(headless_bot_update, 'last_shot_time'):
+            headless_bot_update.last_shot_time = 0
+        if sim_clock.time - headless_bot_update.last_shot_time >= data["fire_rate"]:
+            perform_shot()
+            headless_bot_update.last_shot_time = sim_clock.time
+
+
+def headless_record_tick(tick_time):
+    """Копит стоимость тиков и периодически печатает отчет"""
+    headless_stats["ticks"] += 1
+    headless_stats["total_time"] += tick_time
+    headless_stats["window_time"] += tick_time
+    headless_stats["window_max"] = max(headless_stats["window_max"], tick_time)
+
+    if headless_stats["ticks"] % HEADLESS_REPORT_INTERVAL == 0:
+        average_ms = headless_stats["window_time"] / HEADLESS_REPORT_INTERVAL * 1000
+        print(f"📊 HEADLESS тик {headless_stats['ticks']}: stage {current_stage}, "
+              f"врагов {len(enemies)}, снарядов {projectile_store.count_of(PROJECTILE_ORB)}, "
+              f"трассеров {projectile_store.count_of(PROJECTILE_TRACER)}, "
+              f"тик {average_ms:.2f} мс (макс {headless_stats['window_max'] * 1000:.2f} мс)")
+        headless_stats["window_time"] = 0.0
+        headless_stats["window_max"] = 0.0
+
+    if HEADLESS_MAX_TICKS and headless_stats["ticks"] >= HEADLESS_MAX_TICKS:
+        average_ms = headless_stats["total_time"] / headless_stats["ticks"] * 1000
+        print(f"🏁 HEADLESS завершен: {headless_stats['ticks']} тиков, stage {current_stage}, "
+              f"средний тик {average_ms:.2f} мс, смертей игрока {headless_stats['deaths']}")
+        for name, stats in system_scheduler.report().items():
+            print(f"   ⚙️ {name}: {stats['runs']} запусков, вне бюджета {stats['overruns']}")
+        application.quit()
+
+
+if HEADLESS_MODE:
+    game_update = update
+
+
+    def update():
+        """Тик headless-симуляции: бот, игровая логика и замер стоимости"""
+        tick_start = time.perf_counter()
+        headless_bot_update()
+        game_update()
+        headless_record_tick(time.perf_counter() - tick_start)
+
+# ==================== БЕНЧМАРКИ ====================
+# Именованные сценарии нагрузки для сравнения сборок:
+#   python f3.py --benchmark --benchmark-report=benchmark_results
+# Каждый сценарий сидит random, спавнит врагов штатным spawn_stage_enemies_simple
+# и гоняет app.step() фиксированное число тиков - результаты повторяют реальную игру.
+
+BENCHMARK_SCENARIOS = [
+    {"name": "stage_1", "stage": 1, "bot": "idle", "weapon": "pistol", "ticks": 600},
+    {"name": "stage_10", "stage": 10, "bot": "idle", "weapon": "pistol", "ticks": 600},
+    {"name": "stage_30", "stage": 30, "bot": "idle", "weapon": "pistol", "ticks": 600},
+    # Автоогонь на fire_rate 0.08 с доспавном волны, чтобы было в кого стрелять
+    {"name": "dual_uzi_autofire", "stage": 10, "bot": "script", "weapon": "dual_uzi", "ticks": 900,
+     "refill": True},
+    # Взрыв гранатомета каждые 0.25 сек по живому врагу - вся волна под огнем
+    {"name": "grenade_spam", "stage": 10, "bot": "idle", "weapon": "grenade_launcher", "ticks": 900,
+     "refill": True, "explosion_interval": 0.25},
+]
+BENCHMARK_SEED = 1337
+BENCHMARK_WARMUP_TICKS = 60  # Первые тики не считаем - там загрузка моделей и шейдеров
+BENCHMARK_REFILL_INTERVAL = 1.0  # Секунд симуляции между доспавнами волны
+
+
+def benchmark_reset_state():
+    """Убирает врагов, снаряды и эффекты прошлого сценария"""
+    global is_firing_auto
+
+    is_firing_auto = False
+
+    for enemy in enemies[:]:
+        if enemy:
+            release_enemy(enemy)
+    enemy_registry.clear()
+    enemy_store.clear()
+    enemy_grid.clear()
+
+    clear_projectiles()
+
+    spawn_queue.clear()
+    attack_timers.clear()
+    hard_cleanup_all()
+
+
+
+def benchmark_explosion():
+    """Взрыв с параметрами гранатомета по случайному живому врагу"""
+    alive = [enemy for enemy in enemies if enemy and enemy.entity and enemy.entity.enabled]
+    if not alive:
+        return
+
+    data = weapon_data["grenade_launcher"]
+    target = random.choice(alive)
+    create_explosion(target.entity.position, data["explosion_radius"], data["explosion_damage"])
+
+
+def benchmark_entity_counts():
+    return {
+        "enemies": len(enemies),
+        "scene_entities": len(scene.entities),
+        "bullet_tracers": projectile_store.count_of(PROJECTILE_TRACER),
+        "enemy_projectiles": projectile_store.count_of(PROJECTILE_ORB),
+        "explosive_projectiles": projectile_store.count_of(PROJECTILE_GRENADE),
+    }
+
+
+def run_benchmark_scenario(scenario):
+    """Прогоняет один сценарий и возвращает его метрики"""
+    global current_stage, enemies_to_kill_for_stage, headless_bot_mode
+
+    print(f"⏱️ БЕНЧМАРК '{scenario['name']}': stage {scenario['stage']}, {scenario['ticks']} тиков")
+
+    benchmark_reset_state()
+    random.seed(BENCHMARK_SEED)
+
+    headless_bot_mode = scenario["bot"]
+    switch_weapon(scenario["weapon"])
+
+    # Штатный путь начала стадии: тот же спавн, что и после анимации
+    current_stage = scenario["stage"]
+    finish_stage_animation()
+
+    frame_times = PhaseTimings(scenario["ticks"])
+    max_counts = benchmark_entity_counts()
+    explosions = 0
+    next_refill = sim_clock.time + BENCHMARK_REFILL_INTERVAL
+    next_explosion = sim_clock.time
+
+    for tick in range(BENCHMARK_WARMUP_TICKS + scenario["ticks"]):
+        if tick == BENCHMARK_WARMUP_TICKS:
+            # Аллокации меряем только на замеряемых тиках
+            gc.collect()
+            blocks_before = sys.getallocatedblocks()
+            collections_before = [stats["collections"] for stats in gc.get_stats()]
+            if BENCHMARK_TRACEMALLOC:
+                tracemalloc.start()
+
+        tick_start = time.perf_counter()
+
+        if scenario.get("refill") and sim_clock.time >= next_refill:
+            spawn_stage_enemies_simple()
+            enemies_to_kill_for_stage = enemy_registry.on_map
+            next_refill = sim_clock.time + BENCHMARK_REFILL_INTERVAL
+
+        explosion_interval = scenario.get("explosion_interval")
+        if explosion_interval and sim_clock.time >= next_explosion:
+            benchmark_explosion()
+            explosions += 1
+            next_explosion = sim_clock.time + explosion_interval
+
+        app.step()
+
+        if tick < BENCHMARK_WARMUP_TICKS:
+            continue
+
+        frame_times.add((time.perf_counter() - tick_start) * 1000)
+        for name, value in benchmark_entity_counts().items():
+            max_counts[name] = max(max_counts[name], value)
+
+    allocations = {
+        "allocated_blocks_delta": sys.getallocatedblocks() - blocks_before,
+        "gc_collections": [stats["collections"] - before
+                           for stats, before in zip(gc.get_stats(), collections_before)],
+    }
+    if BENCHMARK_TRACEMALLOC:
+        allocations["tracemalloc_peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    result = {
+        "name": scenario["name"],
+        "stage": scenario["stage"],
+        "weapon": scenario["weapon"],
+        "seed": BENCHMARK_SEED,
+        "frame_time": frame_times.summary(),
+        "max_entities": max_counts,
+        "final_entities": benchmark_entity_counts(),
+        "allocations": allocations,
+        "kills": enemy_registry.killed,
+    }
+    if explosion_interval:
+        result["explosions"] = explosions
+    return result
+
+
+def run_benchmarks(report_name=BENCHMARK_REPORT_NAME):
+    """Прогоняет все сценарии, печатает таблицу и пишет JSON-отчет"""
+    global stage_progression_locked
+
+    # Стадия не должна меняться посреди замера
+    stage_progression_locked = True
+    results = [run_benchmark_scenario(scenario) for scenario in BENCHMARK_SCENARIOS]
+    stage_progression_locked = False
+
+    print("📊 РЕЗУЛЬТАТЫ БЕНЧМАРКА (мс на тик)")
+    print(f"{'сценарий':<20}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>9}{'врагов':>8}{'entities':>10}{'блоков':>10}")
+    for result in results:
+        frame = result["frame_time"]
+        print(f"{result['name']:<20}{frame['p50_ms']:>8.2f}{frame['p95_ms']:>8.2f}{frame['p99_ms']:>8.2f}"
+              f"{frame['max_ms']:>9.2f}{result['max_entities']['enemies']:>8}"
+              f"{result['max_entities']['scene_entities']:>10}{result['allocations']['allocated_blocks_delta']:>10}")
+
+    try:
+        report_name = report_path(report_name)
+        with open(f"{report_name}.json", "w", encoding="utf-8") as file:
+            json.dump({"tick_rate": SIMULATION_TICK_RATE, "scenarios": results, "actor_cache": actor_cache.stats,
+                       "spawn_queue": spawn_queue.stats, "shader_cache": shader_cache.stats,
+                       "orb_pool": orb_pool.stats, "grenade_pool": grenade_pool.stats,
+                       "particle_pools": {"blood": blood_pool.stats if blood_pool else None,
+                                          "muzzle_flash": muzzle_flash_pool.stats if muzzle_flash_pool else None}},
+                      file, indent=2, ensure_ascii=False)
+        print(f"💾 Отчет бенчмарка сохранен: {report_name}.json")
+    except Exception as e:
+        print(f"❌ Ошибка сохранения отчета бенчмарка: {e}")
+
+    return results
+
 # ==================== ИНИЦИАЛИЗАЦИЯ ИГРЫ ====================
 
 print("🎮 Инициализация игры...")
@@ -8068,10 +10082,23 @@ for weapon_type in weapons:
 
 # Инициализируем оптимизированные системы
 init_optimized_systems()
-create_main_menu()
-print("✅ Игра готова! Спускайтесь к оружию и нажмите E")
-print(f"📍 Ваша позиция: {player.position}")
-print(f"📍 Оружие внизу на позиции: (0, 0, 0)")
+
+# Модель гуля грузим заранее - первая волна не должна ждать разбора glTF
+actor_cache.preload(ENEMY_MODEL)
+# Точки спавна и карта высот - из кэша на диске или один раз при загрузке
+spawn_points.load_or_build()
+heightfield.load_or_build([location2], navigation_boxes, resource_path(LOCATION_MODEL))
+if BENCHMARK_MODE:
+    start_headless_simulation()
+    run_benchmarks()
+    application.quit()
+elif HEADLESS_MODE:
+    start_headless_simulation()
+else:
+    create_main_menu()
+    print("✅ Игра готова! Спускайтесь к оружию и нажмите E")
+    print(f"📍 Ваша позиция: {player.position}")
+    print(f"📍 Оружие внизу на позиции: (0, 0, 0)")
 
 # ==================== ЗАПУСК ====================
 
@@ -0,0 +1,67 @@
+"""Общие помощники тестов: f3.py целиком не импортируется без ursina/panda3d,
+поэтому тесты достают из него нужные классы и константы через ast и исполняют их отдельно"""
+import ast
+import csv
+import heapq
+import json
+import math
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+F3_PATH = Path(__file__).resolve().parent.parent / "f3.py"
+F3_TREE = ast.parse(F3_PATH.read_text(encoding="utf-8"))
+
+
+def _defined_name(node):
+    if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+        return node.name
+    if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+        return node.targets[0].id
+    return None
+
+
+def load_f3(*names, **namespace):
+    """Исполняет верхнеуровневые определения names из f3.py (в порядке файла) и возвращает их пространство имен.
+    Все, от чего они зависят помимо стандартных модулей и numpy, передается через namespace"""
+    wanted = set(names)
+    body = [node for node in F3_TREE.body if _defined_name(node) in wanted]
+    missing = wanted - {_defined_name(node) for node in body}
+    if missing:
+        raise LookupError(f"В f3.py нет определений: {sorted(missing)}")
+
+    scope = {"np": np, "math": math, "heapq": heapq, "deque": deque, "time": time, "json": json, "csv": csv,
+             "os": os}
+    scope.update(namespace)
+    exec(compile(ast.Module(body=body, type_ignores=[]), str(F3_PATH), "exec"), scope)
+    return scope
+
+
+class FakeTime:
+    """Подменяет модуль time: perf_counter/time идут только вперед вручную"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance_ms(self, value_ms):
+        self.now += value_ms / 1000
+
+
+@pytest.fixture
+def f3():
+    return load_f3
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
@@ -0,0 +1,50 @@
+"""AttackTimers: куча таймеров атак, устаревшие записи и враги в пуле не срабатывают"""
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def timers(f3):
+    return f3("ATTACK_MELEE", "ATTACK_RANGED", "ATTACK_SPECIAL", "ATTACK_CHARGE", "ATTACK_ALL", "AttackTimers")
+
+
+def make_fighter(attacks_ready):
+    return SimpleNamespace(attacks_ready=attacks_ready, attack_timer_ids={}, store_slot=0)
+
+
+def test_attack_timer_fires_once_when_due(timers):
+    melee = timers["ATTACK_MELEE"]
+    attack_timers = timers["AttackTimers"]()
+    enemy = make_fighter(timers["ATTACK_ALL"])
+
+    attack_timers.start(enemy, melee, delay=2.0, now=0.0)
+    assert not enemy.attacks_ready & melee
+
+    attack_timers.fire_due(1.9)
+    assert not enemy.attacks_ready & melee
+
+    attack_timers.fire_due(2.0)
+    assert enemy.attacks_ready & melee
+    assert attack_timers.fired == 1 and not attack_timers.heap
+
+
+def test_restarted_and_released_timers_are_stale(timers):
+    melee, ranged = timers["ATTACK_MELEE"], timers["ATTACK_RANGED"]
+    attack_timers = timers["AttackTimers"]()
+    enemy = make_fighter(0)
+
+    attack_timers.start(enemy, melee, delay=1.0, now=0.0)
+    attack_timers.start(enemy, melee, delay=3.0, now=0.5)  # Перезапуск - первая запись устарела
+    attack_timers.fire_due(2.0)
+    assert not enemy.attacks_ready & melee
+
+    attack_timers.fire_due(3.5)
+    assert enemy.attacks_ready & melee
+
+    # Враг ушел в пул - его таймер не срабатывает
+    attack_timers.start(enemy, ranged, delay=1.0, now=4.0)
+    enemy.store_slot = None
+    attack_timers.fire_due(10.0)
+    assert not enemy.attacks_ready & ranged
+    assert attack_timers.fired == 1
@@ -0,0 +1,45 @@
+"""sweep_enemy_hit: попадание по отрезку полета пули за тик, первым - враг, в чью сферу пуля вошла раньше"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def hits(f3):
+    scope = f3("ENEMY_TYPE_CODES", "EnemyStore", "SpatialHashGrid", "BULLET_HIT_RADIUS", "sweep_enemy_hit",
+               Vec3=lambda *values: values)
+    scope["enemy_store"] = scope["EnemyStore"]()
+    scope["enemy_grid"] = scope["SpatialHashGrid"](4.0)
+
+    def spawn(position, enemy_type="normal"):
+        enemy = SimpleNamespace(type=enemy_type, entity=SimpleNamespace(enabled=True))
+        enemy.store_slot = scope["enemy_store"].add(enemy, position, enemy_type)
+        scope["enemy_grid"].insert(enemy, position[0], position[2])
+        return enemy
+
+    scope["spawn"] = spawn
+    return scope
+
+
+def test_sweep_hits_enemy_between_ticks(hits):
+    enemy = hits["spawn"]((10.0, 0.0, 0.0))
+    sweep = hits["sweep_enemy_hit"]
+
+    # За тик пуля перелетела врага целиком - концы отрезка вне сферы
+    assert sweep(np.array((0.0, 0.0, 0.0)), np.array((20.0, 0.0, 0.0))) is enemy
+    assert sweep(np.array((0.0, 0.0, 1.5)), np.array((20.0, 0.0, 1.5))) is None
+    assert sweep(np.array((0.0, 0.0, 0.0)), np.array((5.0, 0.0, 0.0))) is None
+
+
+def test_sweep_returns_first_entered(hits):
+    far_boss = hits["spawn"]((11.5, 0.0, 0.0), "boss")
+    near = hits["spawn"]((9.0, 0.0, 0.0))
+    sweep = hits["sweep_enemy_hit"]
+
+    # Центр босса дальше, но его сфера (радиус 4) начинается на 7.5, а сфера обычного (радиус 1) - на 8
+    assert sweep(np.array((0.0, 0.0, 0.0)), np.array((20.0, 0.0, 0.0))) is far_boss
+    assert sweep(np.array((20.0, 0.0, 0.0)), np.array((0.0, 0.0, 0.0))) is far_boss
+
+    far_boss.entity.enabled = False
+    assert sweep(np.array((0.0, 0.0, 0.0)), np.array((20.0, 0.0, 0.0))) is near
@@ -0,0 +1,30 @@
+"""crowd_neighbor_pairs: пары соседей по клеткам толпы без перебора всех со всеми"""
+import numpy as np
+
+
+def test_crowd_pairs_match_brute_force(f3):
+    scope = f3("CROWD_KEY_STRIDE", "crowd_neighbor_pairs")
+    rng = np.random.default_rng(7)
+    xz = rng.uniform(-20.0, 20.0, size=(200, 2))
+    radius = 1.5
+
+    pair_i, pair_j = scope["crowd_neighbor_pairs"](xz, radius)
+    found = set(zip(pair_i.tolist(), pair_j.tolist()))
+    assert len(found) == len(pair_i)
+
+    cells = np.floor(xz / radius).astype(int)
+    expected = {(i, j) for i in range(len(xz)) for j in range(len(xz))
+                if i != j and np.abs(cells[i] - cells[j]).max() <= 1}
+    assert found == expected
+
+    # Все пары ближе радиуса обязательно среди найденных
+    distances = np.linalg.norm(xz[:, None] - xz[None, :], axis=2)
+    close = {(i, j) for i, j in zip(*np.nonzero(distances < radius)) if i != j}
+    assert close <= found
+
+
+def test_lone_and_empty_crowds_have_no_pairs(f3):
+    crowd_neighbor_pairs = f3("CROWD_KEY_STRIDE", "crowd_neighbor_pairs")["crowd_neighbor_pairs"]
+    for xz in (np.zeros((0, 2)), np.array([[3.0, 4.0]]), np.array([[0.0, 0.0], [10.0, 10.0]])):
+        pair_i, pair_j = crowd_neighbor_pairs(xz, 1.5)
+        assert len(pair_i) == len(pair_j) == 0
@@ -0,0 +1,72 @@
+"""LOD движения: дальние и невидимые враги шагают реже, но пропущенное время не теряется"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+DT = 1 / 60
+
+
+@pytest.fixture
+def movement(f3):
+    scope = f3("ENEMY_TYPE_CODES", "EnemyStore", "SpatialHashGrid", "NAV_CELL_SIZE", "NavGrid", "CROWD_RADIUS",
+               "CROWD_SEPARATION_WEIGHT", "CROWD_ALIGNMENT_WEIGHT", "CROWD_LOOKAHEAD", "CROWD_KEY_STRIDE",
+               "crowd_neighbor_pairs", "crowd_steering", "ENEMY_LOD_AI_STRIDES", "safe_update_enemies_optimized",
+               Vec3=lambda *values: values, sim_clock=SimpleNamespace(dt=DT),
+               player=SimpleNamespace(position=SimpleNamespace(x=0.0, y=0.0, z=0.0)),
+               navigation_walls=[], navigation_boxes=[])
+    scope["enemy_store"] = scope["EnemyStore"]()
+    scope["enemy_grid"] = scope["SpatialHashGrid"](4.0)
+    nav_grid = scope["NavGrid"](scope["NAV_CELL_SIZE"])
+    nav_grid.blocked = np.zeros((1, 1), dtype=bool)  # Сетка пустая - идем напрямую
+    scope["nav_grid"] = nav_grid
+    return scope
+
+
+def add_enemy(scope, x, lod, visible=True):
+    store = scope["enemy_store"]
+    enemy = SimpleNamespace(type="normal", entity=None)
+    enemy.store_slot = store.add(enemy, (x, 1.5, 0.0), "normal")
+    store.chase_speed[enemy.store_slot] = 1.0
+    store.detection_range[enemy.store_slot] = 1000.0
+    store.lod[enemy.store_slot] = lod
+    store.visible[enemy.store_slot] = visible
+    return enemy
+
+
+def run_ticks(scope, ticks):
+    store = scope["enemy_store"]
+    moves = np.zeros(store.count, dtype=int)
+    for _ in range(ticks):
+        before = store.position[:store.count].copy()
+        scope["safe_update_enemies_optimized"]()
+        moves += np.any(store.position[:store.count] != before, axis=1)
+    return moves
+
+
+def test_far_and_hidden_enemies_move_less_often(movement):
+    start = [20.0, 60.0, 150.0, 30.0]
+    add_enemy(movement, start[0], lod=0)
+    add_enemy(movement, start[1], lod=1)
+    add_enemy(movement, start[2], lod=2)
+    add_enemy(movement, start[3], lod=0, visible=False)  # Близко, но вне обзора
+
+    ticks = 24
+    moves = run_ticks(movement, ticks)
+    assert moves.tolist() == [24, 12, 6, 6]
+
+    # Пройденное плюс еще не отданное время - ровно все время симуляции
+    store = movement["enemy_store"]
+    travelled = np.array(start) - store.position[:4, 0]
+    assert np.allclose(travelled + store.move_dt[:4], ticks * DT)
+
+
+def test_move_dt_follows_swap_remove(movement):
+    near = add_enemy(movement, 20.0, lod=0)
+    far = add_enemy(movement, 150.0, lod=2)
+    run_ticks(movement, 1)
+    pending = movement["enemy_store"].move_dt[far.store_slot]
+
+    movement["enemy_store"].remove(near)
+    assert far.store_slot == 0
+    assert movement["enemy_store"].move_dt[0] == pending
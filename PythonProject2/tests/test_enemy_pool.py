@@ -0,0 +1,82 @@
+"""EnemyPool: враги паркуются по типам и переиспользуются, удаленные чужой очисткой выкидываются"""
+import pytest
+
+
+class FakeNode:
+    def __init__(self):
+        self.enabled = True
+        self.removed = False
+
+    def is_empty(self):
+        return self.removed
+
+
+class FakeEnemy:
+    created = 0
+
+    def __init__(self, position, enemy_type="normal"):
+        FakeEnemy.created += 1
+        self.type = enemy_type
+        self.entity = FakeNode()
+        self.actor = FakeNode() if enemy_type == "normal" else None
+        self.parked = False
+        self.position = position
+
+    def activate(self, position):
+        self.parked = False
+        self.entity.enabled = True
+        self.position = position
+
+    def park(self):
+        self.parked = True
+        self.entity.enabled = False
+
+
+@pytest.fixture
+def pool(f3):
+    FakeEnemy.created = 0
+    scope = f3("ENEMY_TYPE_CODES", "EnemyPool", Enemy=FakeEnemy, Vec3=lambda *values: values)
+    return scope["EnemyPool"]()
+
+
+def test_released_enemy_is_reused_by_type(pool):
+    normal = pool.acquire((1, 0, 1))
+    boss = pool.acquire((2, 0, 2), "boss")
+    pool.release(normal)
+    pool.release(normal)  # Повторный release не кладет врага в пул дважды
+    assert pool.parked["normal"] == [normal]
+    assert pool.parked_entities() == [normal.entity]
+
+    assert pool.acquire((5, 0, 5), "boss") is not boss  # Боссов в пуле нет - создается новый
+    assert pool.acquire((3, 0, 3)) is normal
+    assert normal.entity.enabled and normal.position == (3, 0, 3)
+    assert pool.stats == {"created": 3, "reused": 1, "released": 1, "dropped": 0}
+    assert FakeEnemy.created == 3
+
+
+def test_prewarm_tops_up_parked_enemies(pool):
+    pool.prewarm("medium", 3)
+    pool.prewarm("medium", 2)
+    assert len(pool.parked["medium"]) == 3
+    assert all(enemy.parked and not enemy.entity.enabled for enemy in pool.parked["medium"])
+
+    enemies = [pool.acquire((0, 0, index), "medium") for index in range(3)]
+    assert pool.stats["created"] == 3 and pool.stats["reused"] == 3
+    assert len({id(enemy) for enemy in enemies}) == 3
+
+
+def test_enemies_destroyed_by_scene_cleanup_are_dropped(pool):
+    first, second, third = (pool.acquire((0, 0, 0)) for _ in range(3))
+    for enemy in (first, second, third):
+        pool.release(enemy)
+
+    third.entity.removed = True
+    second.actor.removed = True
+    assert pool.acquire((1, 0, 1)) is first
+    assert pool.stats["dropped"] == 2
+
+    pool.release(first)
+    first.entity.removed = True
+    pool.prewarm("normal", 1)
+    assert first not in pool.parked["normal"] and len(pool.parked["normal"]) == 1
+    assert pool.stats["dropped"] == 3
@@ -0,0 +1,44 @@
+"""EnemyRegistry: удаление перестановкой последнего, счетчики по типам и хендл на каждую жизнь"""
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def registry(f3):
+    return f3("ENEMY_TYPE_CODES", "EnemyRegistry")["EnemyRegistry"]()
+
+
+def make_enemy(enemy_type):
+    return SimpleNamespace(type=enemy_type, store_slot=None, handle=None, registry_index=None)
+
+
+def test_registry_swap_remove_keeps_indices(registry):
+    added = [make_enemy(enemy_type) for enemy_type in ("normal", "medium", "boss", "normal")]
+    for enemy in added:
+        registry.add(enemy)
+
+    assert registry.remove(added[0])
+    assert registry.enemies[0] is added[3]
+    for index, enemy in enumerate(registry.enemies):
+        assert enemy.registry_index == index
+    assert registry.counts == {"normal": 1, "medium": 1, "boss": 1}
+
+    # Второе удаление и второе убийство не засчитываются
+    assert not registry.remove(added[0])
+    assert registry.kill(added[2])
+    assert not registry.kill(added[2])
+    assert registry.killed == 1
+    assert registry.on_map == 2
+
+
+def test_registry_handle_changes_per_life(registry):
+    enemy = make_enemy("normal")
+    registry.add(enemy)
+    first_life = enemy.handle
+
+    registry.remove(enemy)
+    registry.add(enemy)  # Тот же объект из пула - новая жизнь
+    assert enemy.handle != first_life
+    assert not registry.is_alive(enemy, first_life)
+    assert registry.is_alive(enemy, enemy.handle)
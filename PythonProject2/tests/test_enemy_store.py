@@ -0,0 +1,55 @@
+"""EnemyStore: плотные массивы врагов, удаление перестановкой последнего, поля Enemy поверх колонок"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def store_scope(f3):
+    scope = f3("ENEMY_TYPE_CODES", "EnemyStore", "_enemy_store_field", Vec3=lambda *values: values)
+    scope["enemy_store"] = scope["EnemyStore"](capacity=1)
+    return scope
+
+
+def make_enemy(enemy_type):
+    return SimpleNamespace(type=enemy_type, store_slot=None)
+
+
+def test_remove_moves_last_and_detaches(store_scope):
+    store = store_scope["enemy_store"]
+    added = [make_enemy(enemy_type) for enemy_type in ("normal", "medium", "boss")]
+    for index, enemy in enumerate(added):
+        enemy.store_slot = store.add(enemy, (index, 0, index), enemy.type)
+        store.health[enemy.store_slot] = 10 * (index + 1)
+    assert store.capacity >= 3
+
+    store.remove(added[0])
+    assert added[0].store_slot is None
+    assert added[0]._detached["health"] == 10
+    assert added[0]._detached["position"] == (0.0, 0.0, 0.0)
+
+    assert store.owners == [added[2], added[1]]
+    assert added[2].store_slot == 0
+    assert store.health[0] == 30
+    assert store.type_code[0] == store_scope["ENEMY_TYPE_CODES"]["boss"]
+    assert np.allclose(store.distances_to((2, 0, 2)), [0.0, np.sqrt(2)])
+
+    store.remove(added[0])  # Второй раз - ничего не происходит
+    assert store.count == 2
+
+
+def test_fractional_damage_is_not_truncated(store_scope):
+    field = store_scope["_enemy_store_field"]
+    Enemy = type("Enemy", (), {"health": field("health")})
+    store = store_scope["enemy_store"]
+
+    enemy = Enemy()
+    enemy.store_slot = store.add(enemy, (0, 0, 0), "normal")
+    enemy.health = 5
+    enemy.health -= 1.5  # Например, урон с множителем
+    assert enemy.health == 3.5
+
+    store.remove(enemy)
+    enemy.health -= 0.25  # Отвязанный враг хранит здоровье у себя
+    assert enemy.health == 3.25
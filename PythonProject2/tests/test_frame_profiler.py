@@ -0,0 +1,71 @@
+"""FrameProfiler: кольцевые буферы фаз, гистограмма по окну и отчет в REPORTS_DIR"""
+import csv
+import json
+
+import pytest
+
+
+@pytest.fixture
+def profiler_scope(f3, fake_time, tmp_path):
+    return f3("report_path", "PhaseTimings", "GaugeSamples", "FrameProfiler", "ProfilerScope",
+              time=fake_time, REPORTS_DIR=str(tmp_path / "reports"))
+
+
+def test_ring_buffer_evicts_from_histogram(profiler_scope):
+    timings = profiler_scope["PhaseTimings"](size=3)
+    for value_ms in (0.01, 0.2, 3.0, 20.0, 50.0):
+        timings.add(value_ms)
+
+    assert sorted(timings.values()) == [3.0, 20.0, 50.0]
+    assert timings.total_count == 5
+    # В гистограмме только то, что осталось в окне
+    assert sum(timings.buckets) == 3
+    assert timings.buckets[0] == 0 and timings.buckets[2] == 0
+    assert timings.buckets[-1] == 1  # 50 мс - за последней границей
+    assert timings.maximum() == 50.0 and timings.percentile(50) == 20.0
+
+
+def test_phases_are_summed_per_frame(profiler_scope, fake_time):
+    profiler = profiler_scope["FrameProfiler"](window=8)
+    for _ in range(3):
+        profiler.begin_frame()
+        with profiler.measure("enemies"):
+            fake_time.advance_ms(2.0)
+        with profiler.measure("enemies"):  # Вторая порция той же фазы в том же кадре
+            fake_time.advance_ms(1.0)
+        profiler.set_gauge("depth", 4)
+        profiler.set_gauge("depth", 7)
+        fake_time.advance_ms(13.0)
+    profiler.begin_frame()
+
+    report = profiler.report()
+    assert report["enemies"]["count"] == 3
+    assert report["enemies"]["mean_ms"] == pytest.approx(3.0)
+    assert report["frame"]["count"] == 3
+    assert report["frame"]["mean_ms"] == pytest.approx(16.0)
+    assert profiler.gauge_report() == {"depth": {"count": 3, "last": 7, "mean": 7.0, "max": 7}}
+
+
+def test_dump_writes_reports_dir(profiler_scope, fake_time, tmp_path):
+    profiler = profiler_scope["FrameProfiler"](window=8)
+    profiler.dump("empty")  # Пустой профайлер ничего не пишет
+    assert not (tmp_path / "reports").exists()
+
+    profiler.begin_frame()
+    profiler.record("render", 1.5)
+    profiler.set_gauge("spawn_queue_depth", 2)
+    profiler.begin_frame()
+    profiler.dump("profile")
+
+    reports = tmp_path / "reports"
+    report = json.loads((reports / "profile.json").read_text(encoding="utf-8"))
+    assert report["window"] == 8
+    assert report["phases"]["render"]["mean_ms"] == 1.5
+    assert sum(report["phases"]["render"]["buckets"]) == 1
+    assert report["gauges"]["spawn_queue_depth"]["last"] == 2
+
+    with open(reports / "profile.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == "phase" and [row[0] for row in rows[1:]] == ["frame", "render"]
+    with open(reports / "profile_gauges.csv", newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f))[1][:3] == ["spawn_queue_depth", "1", "2"]
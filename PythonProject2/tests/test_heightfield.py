@@ -0,0 +1,53 @@
+"""HeightField: растеризация верхних граней по центрам клеток и выборка высоты"""
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def heightfield(f3):
+    scope = f3("NAV_LOBBY_HEIGHT", "HEIGHTFIELD_CACHE", "HEIGHTFIELD_CELL_SIZE", "HEIGHTFIELD_MIN_UP",
+               "HEIGHTFIELD_BASE", "HEIGHTFIELD_MAX_STEP", "HeightField", cache_path=lambda name: name)
+
+    def build(triangles):
+        field = scope["HeightField"]()
+        origin, field.heights = field._build(np.asarray(triangles, dtype=float))
+        field.origin_x, field.origin_z = origin.tolist()
+        return field
+
+    return build
+
+
+def quad(x0, x1, z0, z1, y0, y1=None):
+    """Прямоугольник XZ двумя треугольниками; y1 - высота на x1 (пандус)"""
+    y1 = y0 if y1 is None else y1
+    corners = [(x0, y0, z0), (x1, y1, z0), (x1, y1, z1), (x0, y0, z1)]
+    return [[corners[0], corners[1], corners[2]], [corners[0], corners[2], corners[3]]]
+
+
+def test_platform_edges_do_not_spread(heightfield):
+    # Края платформы не совпадают с границами клеток
+    field = heightfield(quad(-0.3, 10.3, -0.3, 10.3, 3.5))
+
+    xs = np.array([5.0, 9.5, 0.2, 11.3, -1.3, 12.0, 5.0])
+    zs = np.array([5.0, 5.0, 5.0, 5.0, 5.0, 5.0, 11.3])
+    assert field.height_at(xs, zs).tolist() == [3.5, 3.5, 3.5, 0.5, 0.5, 0.5, 0.5]
+
+
+def test_ramp_is_interpolated(heightfield):
+    field = heightfield(quad(0.0, 20.0, 0.0, 20.0, 0.5, 5.0))
+
+    xs = np.array([3.0, 7.7, 13.1])
+    expected = 0.5 + 4.5 * xs / 20.0
+    assert np.allclose(field.height_at(xs, np.full(3, 10.0)), expected)
+
+
+def test_outside_grid_and_steep_faces_give_base(heightfield):
+    wall = [[(0.0, 0.0, 0.0), (0.0, 10.0, 0.0), (0.0, 10.0, 10.0)]]
+    field = heightfield(wall)
+    assert field.height_at(np.array([0.0, 100.0]), np.array([5.0, -100.0])).tolist() == [0.5, 0.5]
+
+
+def test_higher_face_wins(heightfield):
+    field = heightfield(quad(0.0, 20.0, 0.0, 20.0, 1.0) + quad(8.0, 12.0, 8.0, 12.0, 4.0))
+    heights = field.height_at(np.array([10.0, 3.0]), np.array([10.0, 3.0]))
+    assert heights.tolist() == [4.0, 1.0]
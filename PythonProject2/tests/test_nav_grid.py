@@ -0,0 +1,109 @@
+"""NavGrid: поле направлений в обход стен и перестройка после новой стены"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+class FakeVec3:
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = float(x), float(y), float(z)
+
+    def __add__(self, other):
+        return FakeVec3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __truediv__(self, value):
+        return FakeVec3(self.x / value, self.y / value, self.z / value)
+
+    def length(self):
+        return float(np.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2))
+
+
+class FakeMat:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def getCell(self, row, col):
+        return self.rows[row][col]
+
+
+class FakeWall:
+    """Коробка без поворота: строки матрицы - оси с масштабом, последняя - позиция"""
+
+    def __init__(self, position, scale, rotation, **kwargs):
+        assert abs(rotation.x) < 1e-9 and abs(rotation.y) < 1e-9, "в тестах только стены вдоль X"
+        self.rows = [[scale[0], 0, 0, 0], [0, scale[1], 0, 0], [0, 0, scale[2], 0],
+                     [position.x, position.y, position.z, 1]]
+
+    def getMat(self, other):
+        return FakeMat(self.rows)
+
+
+@pytest.fixture
+def nav(f3):
+    scope = f3("NAV_CELL_SIZE", "NAV_LOBBY_HEIGHT", "NAV_MIN_BLOCKER_HEIGHT", "NAV_BOUNDS_MARGIN", "NavGrid",
+               "create_wall", Vec3=FakeVec3, Entity=FakeWall, scene=None, color=SimpleNamespace(gray=None, clear=None),
+               distance=lambda a, b: float(np.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2)))
+    scope["nav_grid"] = scope["NavGrid"](scope["NAV_CELL_SIZE"])
+    scope["navigation_walls"] = []
+    return scope
+
+
+@pytest.fixture
+def small_grid(nav):
+    grid = nav["NavGrid"](cell_size=1.0)
+    # Стена по столбцу 2 с проходом в нижнем ряду
+    grid.rows = grid.cols = 5
+    grid.blocked = np.zeros((5, 5), dtype=bool)
+    grid.blocked[0:4, 2] = True
+    return grid
+
+
+def test_flow_goes_around_wall(small_grid):
+    assert small_grid.update_target(4.5, 0.5)
+    assert not small_grid.update_target(4.2, 0.8)  # Та же клетка - поле не пересчитывается
+    assert small_grid.rebuilds == 1
+
+    # Из-за стены - вниз к проходу, угол стены по диагонали не срезаем
+    dir_x, dir_z, valid = small_grid.sample(np.array([1.5, 1.5, 3.5]), np.array([3.5, 4.5, 4.5]))
+    assert valid.all()
+    assert np.allclose(dir_x, [0.0, 1.0, np.sqrt(0.5)])
+    assert np.allclose(dir_z, [1.0, 0.0, -np.sqrt(0.5)])
+
+    blocked = small_grid.is_blocked(np.array([2.5, 2.5, -3.0]), np.array([0.5, 4.5, 0.0]))
+    assert blocked.tolist() == [True, False, False]
+
+
+def test_invalidate_drops_grid(small_grid):
+    small_grid.update_target(4.5, 0.5)
+    small_grid.invalidate()
+    assert small_grid.blocked is None and small_grid.flow is None and small_grid.target_cell is None
+    assert not small_grid.is_blocked(np.array([2.5]), np.array([0.5])).any()
+
+
+def rebuild_like_enemy_step(nav, player_x, player_z):
+    nav_grid = nav["nav_grid"]
+    if nav_grid.blocked is None:
+        nav_grid.build(nav["navigation_walls"])
+    nav_grid.update_target(player_x, player_z)
+
+
+def test_wall_added_after_build_blocks_flow(nav):
+    nav_grid = nav["nav_grid"]
+    nav["create_wall"]((-10, 0, 0), (10, 0, 0), height=5)
+    rebuild_like_enemy_step(nav, 0.0, 12.0)
+
+    # Пока второй стены нет - от (0, 4) к игроку идем прямо вперед
+    dir_x, dir_z, _ = nav_grid.sample(np.array([0.5]), np.array([4.0]))
+    assert dir_z[0] > 0.9
+
+    # Стена появилась после постройки (как на старте игры) - сетка сброшена и строится заново
+    nav["create_wall"]((-10, 0, 7), (10, 0, 7), height=5)
+    assert nav_grid.blocked is None
+    rebuild_like_enemy_step(nav, 0.0, 12.0)
+
+    assert nav_grid.is_blocked(np.array([0.0, 9.0]), np.array([7.0, 7.0])).all()
+    dir_x, dir_z, valid = nav_grid.sample(np.array([0.5]), np.array([4.0]))
+    assert valid[0] and dir_z[0] < 0.5
+    step = np.array([0.5 + dir_x[0] * nav_grid.cell_size, 4.0 + dir_z[0] * nav_grid.cell_size])
+    assert not nav_grid.is_blocked(step[:1], step[1:]).any()
@@ -0,0 +1,110 @@
+"""ParticlePool: хендлы (индекс, поколение) и список выдачи по индексам"""
+import pytest
+
+
+class FakeParticle:
+    def __init__(self):
+        self.enabled = True
+        self.visible = True
+        self.alpha = 0.0
+
+
+@pytest.fixture
+def make_pool(f3):
+    ParticlePool = f3("ParticlePool")["ParticlePool"]
+
+    def make(initial_size=2, max_size=4):
+        return ParticlePool(FakeParticle, initial_size=initial_size, max_size=max_size)
+
+    return make
+
+
+def issued_order(pool):
+    """Индексы по списку выдачи от головы, с проверкой связности prev/next"""
+    order = []
+    previous = -1
+    index = pool.head
+    while index >= 0:
+        assert pool.prev[index] == previous
+        order.append(index)
+        previous, index = index, pool.next[index]
+        assert len(order) <= len(pool.particles), "список выдачи зациклился"
+    assert pool.tail == previous
+    return order
+
+
+def check_invariants(pool):
+    order = issued_order(pool)
+    busy = [index for index, is_busy in enumerate(pool.busy) if is_busy]
+    assert sorted(order) == busy
+    assert len(order) == pool.in_use_count
+    assert sorted(order + pool.free) == list(range(len(pool.particles)))
+    assert len(pool.prev) == len(pool.next) == len(pool.particles)
+
+
+def test_get_and_return_invalidate_handle(make_pool):
+    pool = make_pool()
+    particle, handle = pool.get()
+
+    assert particle.enabled and particle.visible and particle.alpha == 1.0
+    assert pool.is_live(handle)
+
+    pool.return_particle(handle)
+    assert not pool.is_live(handle)
+    assert not particle.enabled and not particle.visible
+
+    # Повторный возврат того же хендла ничего не ломает
+    pool.return_particle(handle)
+    assert pool.stats["stale_returns"] == 1
+    assert pool.in_use_count == 0
+    check_invariants(pool)
+
+
+def test_full_pool_steals_oldest(make_pool):
+    pool = make_pool(initial_size=3, max_size=3)
+    handles = [pool.get()[1] for _ in range(3)]
+
+    particle, handle = pool.get()
+    assert handle[0] == handles[0][0]
+    assert not pool.is_live(handles[0])
+    assert pool.is_live(handle) and pool.is_live(handles[1]) and pool.is_live(handles[2])
+    assert pool.stats["steals"] == 1
+    assert issued_order(pool) == [handles[1][0], handles[2][0], handle[0]]
+
+    # Хендл украденной частицы больше ее не вернет
+    pool.return_particle(handles[0])
+    assert pool.is_live(handle)
+    check_invariants(pool)
+
+
+def test_return_from_middle_keeps_steal_order(make_pool):
+    pool = make_pool(initial_size=3, max_size=3)
+    first, second, third = (pool.get()[1] for _ in range(3))
+
+    pool.return_particle(second)
+    assert issued_order(pool) == [first[0], third[0]]
+
+    pool.get()  # Берет освободившуюся, без кражи
+    _, stolen = pool.get()
+    assert stolen[0] == first[0]
+    assert pool.stats["steals"] == 1
+    check_invariants(pool)
+
+
+def test_issue_list_stays_bounded_without_steals(make_pool):
+    pool = make_pool(initial_size=4, max_size=16)
+    live = []
+    for step in range(5000):
+        live.append(pool.get()[1])
+        if len(live) > 3:
+            pool.return_particle(live.pop(step % len(live)))
+
+    assert pool.stats["steals"] == 0
+    assert len(issued_order(pool)) == pool.in_use_count == 3
+    check_invariants(pool)
+
+
+def test_empty_max_size_misses(make_pool):
+    pool = make_pool(initial_size=0, max_size=0)
+    assert pool.get() == (None, None)
+    assert pool.stats["misses"] == 1
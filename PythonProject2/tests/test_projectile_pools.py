@@ -0,0 +1,88 @@
+"""OrbPool и GrenadePool: Entity снарядов переиспользуются, жесткий предел дает обратное давление"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+class FakeEntity:
+    created = 0
+
+    def __init__(self, **kwargs):
+        FakeEntity.created += 1
+        self.enabled = True
+        self.position = None
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+
+FAKE_COLOR = SimpleNamespace(green="green", rgba=lambda *values: values)
+
+
+@pytest.fixture
+def pools(f3):
+    FakeEntity.created = 0
+    destroyed = []
+    scope = f3("Projectile", "ORB_POOL_CAP", "OrbPool", "GRENADE_POOL_CAP", "GrenadePool",
+               Entity=FakeEntity, color=FAKE_COLOR, destroy=destroyed.append)
+    scope["destroyed"] = destroyed
+    return scope
+
+
+def acquire_orb(pool):
+    return pool.acquire((0, 1, 0), "red", 0.9, "glow")
+
+
+def test_orb_pool_reuses_released_pairs(pools):
+    pool = pools["OrbPool"](cap=4)
+    orb, glow = acquire_orb(pool)
+    projectile = pools["Projectile"](orb, glow, pool=pool)
+
+    projectile.release()
+    assert not orb.enabled and not glow.enabled
+    assert pool.parked_entities() == [orb, glow]
+    assert projectile.entity is None and projectile.pool is None
+
+    assert acquire_orb(pool) == (orb, glow)
+    assert orb.enabled and glow.enabled and orb.position == (0, 1, 0)
+    assert pool.stats["created"] == 1 and pool.stats["reused"] == 1
+    assert FakeEntity.created == 2
+    assert pools["destroyed"] == []
+
+
+def test_orb_pool_cap_refuses_extra_shots(pools):
+    pool = pools["OrbPool"](cap=3)
+    pairs = [acquire_orb(pool) for _ in range(3)]
+    assert acquire_orb(pool) is None
+    assert pool.stats["refused"] == 1 and pool.in_use == 3
+
+    pool.release(*pairs[0])
+    assert acquire_orb(pool) == pairs[0]
+    assert FakeEntity.created == 6
+
+
+def test_grenade_visuals_go_back_to_pool(pools):
+    pool = pools["GrenadePool"](cap=2)
+    direction = np.array((0.0, 0.0, 1.0))
+    grenade, glow, tail = pool.acquire(np.array((0.0, 2.0, 0.0)), direction)
+    assert tail.position.tolist() == [0.0, 2.0, -0.5]
+
+    projectile = pools["Projectile"](grenade, glow, tail, pool=pool)
+    projectile.release()
+    assert not (grenade.enabled or glow.enabled or tail.enabled)
+    assert pool.parked_entities() == [grenade, glow, tail]
+    assert pools["destroyed"] == []
+
+    assert pool.acquire(np.zeros(3), direction) == (grenade, glow, tail)
+    pool.acquire(np.zeros(3), direction)
+    assert pool.acquire(np.zeros(3), direction) is None
+    assert pool.stats == {"created": 2, "reused": 1, "released": 1, "refused": 1}
+
+
+def test_unpooled_projectile_is_destroyed(pools):
+    entity, glow = FakeEntity(), FakeEntity()
+    pools["Projectile"](entity, glow).release()
+    assert pools["destroyed"] == [entity, glow]
+
+    pools["Projectile"]().release()  # У трассера нет Entity - нечего уничтожать
+    assert pools["destroyed"] == [entity, glow]
@@ -0,0 +1,40 @@
+"""Projectile: запись со слотами вместо мешка атрибутов, release без пула уничтожает Entity"""
+import pytest
+
+
+class BrokenPart:
+    def __init__(self, name):
+        self.name = name
+
+
+@pytest.fixture
+def projectile_scope(f3):
+    destroyed = []
+
+    def destroy(part):
+        if isinstance(part, BrokenPart):
+            raise RuntimeError("уже удален")
+        destroyed.append(part)
+
+    scope = f3("Projectile", destroy=destroy)
+    scope["destroyed"] = destroyed
+    return scope
+
+
+def test_unknown_attributes_are_rejected(projectile_scope):
+    projectile = projectile_scope["Projectile"]()
+    assert projectile.projectile_slot is None and projectile.entity is None
+    assert not hasattr(projectile, "__dict__")
+    with pytest.raises(AttributeError):
+        projectile.damage = 10  # Числа снаряда живут в projectile_store
+
+
+def test_release_without_pool_destroys_parts(projectile_scope):
+    projectile = projectile_scope["Projectile"]("orb", BrokenPart("glow"), "tail")
+    projectile.release()
+    # Ошибка удаления одной части не мешает остальным
+    assert projectile_scope["destroyed"] == ["orb", "tail"]
+    assert projectile.entity is None and projectile.glow is None and projectile.tail is None
+
+    projectile.release()  # Повторный release ничего не удаляет
+    assert projectile_scope["destroyed"] == ["orb", "tail"]
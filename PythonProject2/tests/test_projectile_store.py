@@ -0,0 +1,50 @@
+"""ProjectileStore: плотные массивы снарядов, удаление перестановкой последнего в освободившийся слот"""
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def projectiles(f3):
+    clock = SimpleNamespace(time=0.0)
+    scope = f3("PROJECTILE_TRACER", "PROJECTILE_ORB", "PROJECTILE_GRENADE", "Projectile", "ProjectileStore",
+               sim_clock=clock)
+    scope["clock"] = clock
+    return scope
+
+
+def check_projectile_slots(store):
+    assert len(store.owners) == store.count
+    for slot, projectile in enumerate(store.owners):
+        assert projectile.projectile_slot == slot
+
+
+def test_projectile_remove_moves_last_into_slot(projectiles):
+    store = projectiles["ProjectileStore"](capacity=2)
+    Projectile = projectiles["Projectile"]
+    added = []
+    for index in range(5):  # Больше capacity - массивы растут
+        projectile = Projectile()
+        projectiles["clock"].time = float(index)
+        store.add(projectile, index % 3, (index, 0, 0), (1, 0, 0), speed=10 + index, lifetime=1.0)
+        added.append(projectile)
+    assert store.capacity >= 5
+
+    assert store.remove(added[1])
+    assert added[1].projectile_slot is None
+    assert store.owners[1] is added[4]
+    assert store.position[1].tolist() == [4, 0, 0]
+    assert store.speed[1] == 14
+    assert store.spawn_time[1] == 4.0
+    check_projectile_slots(store)
+
+    # Уже удаленный снаряд второй раз не удаляется
+    assert not store.remove(added[1])
+    assert store.count == 4
+
+    assert store.remove(added[4])  # Сейчас лежит в слоте 1
+    assert store.remove(added[3])  # Последний слот - без перестановки
+    check_projectile_slots(store)
+    assert [projectile for projectile in store.owners] == [added[0], added[2]]
+    assert store.count_of(projectiles["PROJECTILE_GRENADE"]) == 1
+    assert store.slots_of(projectiles["PROJECTILE_TRACER"]).tolist() == [0]
@@ -0,0 +1,42 @@
+"""ShaderCache: одна программа на один исходник"""
+import hashlib
+
+import pytest
+
+
+class FakeShader:
+    GLSL = "glsl"
+    compiled = 0
+
+    def __init__(self, **sources):
+        FakeShader.compiled += 1
+        self.sources = sources
+
+
+@pytest.fixture
+def shaders(f3, tmp_path):
+    FakeShader.compiled = 0
+    scope = f3("ShaderCache", "load_shader", Shader=FakeShader, hashlib=hashlib,
+               resource_path=lambda name: str(tmp_path / name))
+    scope["shader_cache"] = scope["ShaderCache"]()
+    return scope
+
+
+def test_same_sources_compile_once(shaders):
+    cache = shaders["shader_cache"]
+    first = cache.get(language=FakeShader.GLSL, fragment="void main() {}")
+    # Порядок аргументов не важен
+    assert cache.get(fragment="void main() {}", language=FakeShader.GLSL) is first
+    assert cache.get(language=FakeShader.GLSL, fragment="void main() { }") is not first
+    assert cache.stats == {"compiled": 2, "hits": 1}
+    assert FakeShader.compiled == 2
+
+
+def test_load_shader_reuses_file_and_fallback(shaders, tmp_path):
+    (tmp_path / "blur.glsl").write_text("void main() { blur(); }", encoding="utf-8")
+    load_shader = shaders["load_shader"]
+
+    assert load_shader("blur.glsl") is load_shader("blur.glsl")
+    assert load_shader("missing.glsl") is load_shader("other_missing.glsl")
+    assert FakeShader.compiled == 2
+    assert shaders["shader_cache"].stats["hits"] == 2
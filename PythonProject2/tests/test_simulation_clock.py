@@ -0,0 +1,50 @@
+"""SimulationClock: фиксированный шаг, накопитель остатка кадра и доля для интерполяции"""
+import pytest
+
+
+@pytest.fixture
+def clock(f3):
+    return f3("SimulationClock")["SimulationClock"](tick_rate=50, max_steps_per_frame=4)
+
+
+def run_frame(clock, frame_dt):
+    steps = clock.advance(frame_dt)
+    for _ in range(steps):
+        clock.begin_step()
+    return steps
+
+
+def test_remainder_carries_over_frames(clock):
+    # Шаг 20 мс: кадры по 30 мс дают шаги 1, 2, 1, 2
+    assert [run_frame(clock, 0.03) for _ in range(4)] == [1, 2, 1, 2]
+    assert clock.tick == 6
+    assert clock.time == pytest.approx(0.12)
+    assert clock.dt == pytest.approx(0.02)
+    assert clock.accumulator == pytest.approx(0.0, abs=1e-9)
+
+
+def test_alpha_is_fraction_of_next_step(clock):
+    assert run_frame(clock, 0.015) == 0
+    assert clock.alpha == pytest.approx(0.75)
+    assert clock.tick == 0 and clock.time == 0.0
+
+    assert run_frame(clock, 0.01) == 1
+    assert clock.alpha == pytest.approx(0.25)
+
+
+def test_same_frames_give_same_ticks(f3):
+    SimulationClock = f3("SimulationClock")["SimulationClock"]
+    frames = [0.016, 0.033, 0.007, 0.050, 0.016] * 20
+    runs = []
+    for _ in range(2):
+        clock = SimulationClock(tick_rate=60)
+        runs.append([run_frame(clock, frame_dt) for frame_dt in frames])
+    assert runs[0] == runs[1]
+    assert sum(runs[0]) == clock.tick == int(sum(frames) * 60 + 1e-6)
+
+
+def test_long_freeze_is_clamped(clock):
+    # Секунда фриза - не 50 шагов, а не больше max_steps_per_frame, лишнее время отброшено
+    assert run_frame(clock, 1.0) == 4
+    assert clock.accumulator == 0.0 and clock.alpha == 0.0
+    assert run_frame(clock, 0.02) == 1
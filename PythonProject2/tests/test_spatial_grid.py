@@ -0,0 +1,42 @@
+"""SpatialHashGrid: перенос между клетками и кандидаты по квадрату вокруг точки"""
+import numpy as np
+import pytest
+
+
+class Item:
+    def __init__(self, name):
+        self.name = name
+
+
+@pytest.fixture
+def grid(f3):
+    return f3("SpatialHashGrid")["SpatialHashGrid"](cell_size=4.0)
+
+
+def test_update_moves_item_between_cells(grid):
+    item = Item("enemy")
+    grid.insert(item, 1.0, 1.0)
+    grid.update(item, 2.0, 3.0)  # Та же клетка
+    assert grid.cells == {(0, 0): {id(item): item}}
+
+    grid.update(item, -1.0, 9.0)
+    assert grid.cells == {(-1, 2): {id(item): item}}  # Пустая клетка удалена
+
+    grid.remove(item)
+    grid.remove(item)  # Повторное удаление ничего не ломает
+    assert grid.cells == {} and grid.item_cells == {}
+
+
+def test_query_finds_everything_within_radius(grid):
+    rng = np.random.default_rng(3)
+    points = rng.uniform(-30.0, 30.0, size=(300, 2))
+    items = [Item(index) for index in range(len(points))]
+    for item, (x, z) in zip(items, points):
+        grid.insert(item, x, z)
+
+    for x, z, radius in ((0.0, 0.0, 5.0), (12.3, -7.9, 2.5), (-29.0, 29.0, 9.0)):
+        found = {item.name for item in grid.query(x, z, radius)}
+        close = set(np.nonzero(np.hypot(points[:, 0] - x, points[:, 1] - z) <= radius)[0].tolist())
+        assert close <= found
+        # Кандидаты только из клеток квадрата, а не вся сетка
+        assert len(found) < len(items)
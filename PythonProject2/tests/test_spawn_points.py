@@ -0,0 +1,80 @@
+"""Точки спавна: Пуассоновский диск, стены nav_grid и кэш на диске"""
+import hashlib
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def spawn(f3, tmp_path):
+    scope = f3("NAV_CELL_SIZE", "NavGrid", "SPAWN_POINTS_SEED", "SPAWN_POINT_SPACING", "ENEMY_SPAWN_ZONES",
+               "PICKUP_SPAWN_AREAS", "poisson_disk_points", "SpawnPointSet", "SpawnPoints",
+               random=random, hashlib=hashlib, Vec3=lambda *values: SimpleNamespace(x=values[0], z=values[2]),
+               SPAWN_POINTS_CACHE=str(tmp_path / "spawn_points_cache.json"))
+    # Стена поперек первой зоны врагов (X 70..90, Z -9..11): клетки X 75..80
+    grid = scope["NavGrid"](cell_size=1.0)
+    grid.origin_x, grid.origin_z = 70.0, -9.0
+    grid.rows = grid.cols = 20
+    grid.blocked = np.zeros((20, 20), dtype=bool)
+    grid.blocked[:, 5:10] = True
+    scope["nav_grid"] = grid
+    return scope
+
+
+def min_spacing(points):
+    points = np.asarray(points)
+    distances = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+    return distances.min()
+
+
+def test_poisson_points_keep_spacing_inside_rectangle(spawn):
+    points = spawn["poisson_disk_points"]((-5.0, 15.0), (30.0, 40.0), 2.0, random.Random(1))
+    xs, zs = np.array(points).T
+    assert ((xs >= -5.0) & (xs < 15.0) & (zs >= 30.0) & (zs < 40.0)).all()
+    assert min_spacing(points) >= 2.0
+    # Диск плотный: в 20x10 при шаге 2 помещается заметно больше точек, чем в решетку 4x4
+    assert len(points) > 25
+
+
+def test_points_skip_walls_and_keep_zone_height(spawn):
+    spawn_points = spawn["SpawnPoints"]()
+    spawn_points.load_or_build()
+
+    assert len(spawn_points.sets["enemy"]) == 3 and len(spawn_points.sets["pickup"]) == 2
+    first_zone = spawn_points.sets["enemy"][0].points
+    assert len(first_zone) and (first_zone[:, 1] == 5).all()
+    assert not ((first_zone[:, 0] >= 75.0) & (first_zone[:, 0] < 80.0)).any()
+    for point_sets in spawn_points.sets.values():
+        for point_set in point_sets:
+            assert min_spacing(point_set.points[:, [0, 2]]) >= 2.0
+
+
+def test_cache_round_trip_and_invalidation(spawn, capsys):
+    first = spawn["SpawnPoints"]()
+    first.load_or_build()
+    assert "посчитаны заново" in capsys.readouterr().out
+
+    cached = spawn["SpawnPoints"]()
+    cached.load_or_build()
+    assert "посчитаны заново" not in capsys.readouterr().out
+    for kind in ("enemy", "pickup"):
+        for built, loaded in zip(first.sets[kind], cached.sets[kind]):
+            assert np.array_equal(built.points, loaded.points)
+
+    # Поменялись стены - кэш не подходит
+    spawn["nav_grid"].blocked[:, 5:10] = False
+    rebuilt = spawn["SpawnPoints"]()
+    rebuilt.load_or_build()
+    assert "посчитаны заново" in capsys.readouterr().out
+    assert len(rebuilt.sets["enemy"][0].points) > len(first.sets["enemy"][0].points)
+
+
+def test_draw_avoids_player(spawn):
+    point_set = spawn["SpawnPointSet"]("зона", [[0.0, 0.0, 0.0], [10.0, 0.0, 0.0], [0.0, 0.0, 30.0]])
+    player = SimpleNamespace(x=0.0, y=0.0, z=0.0)
+    for _ in range(20):
+        assert point_set.draw(player, 20.0).z == 30.0
+    assert point_set.draw(player, 50.0) is None
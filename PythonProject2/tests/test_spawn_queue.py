@@ -0,0 +1,86 @@
+"""SpawnQueue: бюджет на кадр, отмена и глубина очереди в счетчиках профайлера"""
+import pytest
+
+
+@pytest.fixture
+def queue_scope(f3, fake_time):
+    return f3("PhaseTimings", "GaugeSamples", "FrameProfiler", "SPAWN_QUEUE_BUDGET_MS", "SpawnQueue", time=fake_time)
+
+
+@pytest.fixture
+def profiler(queue_scope):
+    return queue_scope["FrameProfiler"](window=8)
+
+
+def slow_job(fake_time, done, value_ms):
+    def job(name):
+        fake_time.advance_ms(value_ms)
+        done.append(name)
+    return job
+
+
+def test_run_stops_when_budget_is_spent(queue_scope, profiler, fake_time):
+    queue = queue_scope["SpawnQueue"](profiler, budget_ms=3.0)
+    done = []
+    for index in range(5):
+        queue.push("enemy", slow_job(fake_time, done, 1.0), index)
+    assert queue.pending("enemy") == 5
+
+    queue.run()
+    assert done == [0, 1, 2]
+    assert queue.pending("enemy") == 2
+    assert queue.stats["depth"] == 2 and queue.stats["backlog_frames"] == 1
+
+    queue.run()
+    assert done == [0, 1, 2, 3, 4]
+    assert queue.stats["done"] == 5 and queue.stats["max_depth"] == 5
+
+
+def test_run_always_makes_progress(queue_scope, profiler, fake_time):
+    queue = queue_scope["SpawnQueue"](profiler, budget_ms=1.0)
+    done = []
+    queue.push("boss", slow_job(fake_time, done, 50.0), "first")
+    queue.push("boss", slow_job(fake_time, done, 50.0), "second")
+
+    queue.run()
+    assert done == ["first"]
+
+
+def test_failed_jobs_call_on_fail(queue_scope, profiler):
+    queue = queue_scope["SpawnQueue"](profiler)
+    failures = []
+
+    def broken():
+        raise RuntimeError("нет модели")
+
+    queue.push("pickup", lambda: False, on_fail=lambda: failures.append("false"))
+    queue.push("pickup", broken, on_fail=lambda: failures.append("error"))
+    queue.run()
+    assert failures == ["false", "error"]
+    assert queue.stats["failed"] == 2 and queue.stats["done"] == 0
+
+
+def test_clear_cancels_pending_jobs(queue_scope, profiler):
+    queue = queue_scope["SpawnQueue"](profiler)
+    done = []
+    for index in range(3):
+        queue.push("enemy", done.append, index)
+
+    queue.clear()
+    queue.run()
+    assert done == []
+    assert queue.pending("enemy") == 0
+
+
+def test_depth_goes_to_profiler_gauges(queue_scope, profiler, fake_time):
+    queue = queue_scope["SpawnQueue"](profiler, budget_ms=1.0)
+    for index in range(3):
+        queue.push("enemy", slow_job(fake_time, [], 1.0), index)
+
+    for _ in range(3):
+        profiler.begin_frame()
+        queue.run()
+    profiler.begin_frame()
+
+    assert "spawn_queue_depth" not in profiler.phases
+    assert profiler.gauge_report()["spawn_queue_depth"] == {"count": 3, "last": 0, "mean": 1.0, "max": 2}
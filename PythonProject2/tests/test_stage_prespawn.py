@@ -0,0 +1,80 @@
+"""Сборка волны под заставкой: задания в spawn_queue, по бюджету кадра, без лишних врагов в пуле"""
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeEnemyPool:
+    def __init__(self):
+        self.parked = {"normal": [], "medium": [], "boss": []}
+        self.created = 0
+
+    def prewarm(self, enemy_type, count):
+        while len(self.parked[enemy_type]) < count:
+            self.parked[enemy_type].append(SimpleNamespace(type=enemy_type))
+            self.created += 1
+
+
+@pytest.fixture
+def prespawn(f3, fake_time):
+    calls = []
+    pool = FakeEnemyPool()
+    scope = f3("PhaseTimings", "GaugeSamples", "FrameProfiler", "SPAWN_QUEUE_BUDGET_MS", "SpawnQueue",
+               "ENEMY_TYPE_CODES", "EnemyRegistry", "plan_stage_wave", "prespawn_enemy", "queue_stage_prespawn",
+               time=fake_time, enemy_pool=pool,
+               reset_performance=lambda: calls.append("reset_performance"),
+               safe_render_cleanup=lambda: calls.append("safe_render_cleanup"))
+    scope["spawn_queue"] = scope["SpawnQueue"](scope["FrameProfiler"](window=8), budget_ms=1.0)
+    scope["enemy_registry"] = scope["EnemyRegistry"]()
+    scope["pool"] = pool
+    scope["calls"] = calls
+    return scope
+
+
+def drain(queue, limit=1000):
+    frames = 0
+    while queue.jobs and frames < limit:
+        queue.run()
+        frames += 1
+    return frames
+
+
+def test_intro_queues_cleanup_and_wave(prespawn):
+    prespawn["queue_stage_prespawn"](10)
+    queue, pool = prespawn["spawn_queue"], prespawn["pool"]
+
+    wave = prespawn["plan_stage_wave"](10)
+    assert queue.pending("stage_cleanup") == 2
+    assert queue.pending("enemy_prespawn") == wave["normal"] + wave["medium"] + wave["boss"]
+    assert pool.created == 0  # Ничего не создано синхронно
+
+    drain(queue)
+    assert prespawn["calls"] == ["reset_performance", "safe_render_cleanup"]
+    assert {enemy_type: len(parked) for enemy_type, parked in pool.parked.items()} == wave
+
+
+def test_prespawn_spreads_over_frames(prespawn, fake_time):
+    queue, pool = prespawn["spawn_queue"], prespawn["pool"]
+    slow_prewarm = pool.prewarm
+
+    def prewarm(enemy_type, count):
+        fake_time.advance_ms(0.6)  # Копия Actor - не бесплатная
+        slow_prewarm(enemy_type, count)
+
+    pool.prewarm = prewarm
+    prespawn["queue_stage_prespawn"](4)
+
+    assert drain(queue) > 1
+    assert len(pool.parked["normal"]) == prespawn["plan_stage_wave"](4)["normal"]
+
+
+def test_prespawn_tops_up_existing_pool(prespawn):
+    pool = prespawn["pool"]
+    pool.prewarm("normal", 5)
+    pool.created = 0
+
+    prespawn["queue_stage_prespawn"](3)  # Нужно 9 обычных, 5 уже в пуле
+    drain(prespawn["spawn_queue"])
+    assert len(pool.parked["normal"]) == 9
+    assert pool.created == 4
+    assert prespawn["calls"] == ["reset_performance"]  # Полная очистка сцены - только каждые 5 стадий
@@ -0,0 +1,69 @@
+"""SystemScheduler: объявленная частота, dt системы и учет выхода за бюджет"""
+import pytest
+
+
+@pytest.fixture
+def scheduler_scope(f3, fake_time):
+    return f3("PhaseTimings", "GaugeSamples", "FrameProfiler", "ProfilerScope", "SystemScheduler", time=fake_time)
+
+
+@pytest.fixture
+def scheduler(scheduler_scope):
+    return scheduler_scope["SystemScheduler"](scheduler_scope["FrameProfiler"](window=8))
+
+
+def run_ticks(scheduler, count, dt, phase="simulation"):
+    for tick in range(count):
+        scheduler.run(phase, dt, (tick + 1) * dt)
+
+
+def test_rate_limits_runs_and_passes_elapsed_dt(scheduler):
+    every_tick, slow = [], []
+    scheduler.register("every_tick", lambda: every_tick.append(True))
+    scheduler.register("slow", slow.append, rate=15, pass_dt=True)
+
+    run_ticks(scheduler, 60, 1 / 60)
+    assert len(every_tick) == 60
+    assert len(slow) == 15
+    assert slow == pytest.approx([4 / 60] * 15)
+    assert scheduler.report()["slow"]["rate"] == 15.0
+
+
+def test_freeze_catches_up_with_one_run(scheduler):
+    runs = []
+    scheduler.register("slow", runs.append, rate=10, pass_dt=True)
+
+    scheduler.run("simulation", 1.0, 1.0)
+    scheduler.run("simulation", 0.05, 1.05)
+    assert runs == [1.0]  # Без очереди из десяти догоняющих запусков
+
+    scheduler.run("simulation", 0.05, 1.1)
+    assert runs == pytest.approx([1.0, 0.1])
+
+
+def test_phases_and_duplicates_are_separate(scheduler):
+    runs = []
+    scheduler.register("render", lambda: runs.append("render"), phase="frame")
+    first = scheduler.register("logic", lambda: runs.append("logic"))
+    assert scheduler.register("logic", lambda: runs.append("again")) is first
+
+    scheduler.run("simulation", 1 / 60, 0.0)
+    assert runs == ["logic"]
+    scheduler.run("frame", 1 / 60, 0.0)
+    assert runs == ["logic", "render"]
+
+
+def test_budget_overruns_are_counted_and_profiled(scheduler, fake_time, capsys):
+    costs = iter([1.0, 5.0, 5.0, 0.5])
+    scheduler.register("enemies", lambda: fake_time.advance_ms(next(costs)), budget_ms=2.0)
+
+    for tick in range(4):
+        scheduler.profiler.begin_frame()
+        scheduler.run("simulation", 1 / 60, tick / 60)
+    scheduler.profiler.begin_frame()
+
+    assert scheduler.report()["enemies"]["runs"] == 4
+    assert scheduler.report()["enemies"]["overruns"] == 2
+    # Предупреждение одно: второй выход за бюджет раньше OVERRUN_WARNING_INTERVAL
+    assert capsys.readouterr().out.count("вышла за бюджет") == 1
+    assert scheduler.profiler.report()["enemies"]["max_ms"] == pytest.approx(5.0)
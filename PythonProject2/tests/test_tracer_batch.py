@@ -0,0 +1,92 @@
+"""TracerBatch: все трассеры - ленты одного меша, голова интерполируется между шагами"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+class FakeMesh:
+    def __init__(self, vertices, colors, mode, static):
+        self.vertices = vertices
+        self.colors = colors
+        self.generated = 0
+
+    def generate(self):
+        self.generated += 1
+
+
+class FakeEntity:
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.visible = True
+
+    def setTransparency(self, mode):
+        self.transparency = mode
+
+
+@pytest.fixture
+def tracers(f3):
+    clock = SimpleNamespace(time=0.0, alpha=0.0)
+    scope = f3("PROJECTILE_TRACER", "PROJECTILE_ORB", "PROJECTILE_GRENADE", "Projectile", "ProjectileStore",
+               "TRACER_WIDTH", "TRACER_LENGTH_START", "TRACER_LENGTH_END", "TRACER_HEAD_COLOR", "TRACER_TAIL_COLOR",
+               "TracerBatch", sim_clock=clock, Mesh=FakeMesh, Entity=FakeEntity,
+               TransparencyAttrib=SimpleNamespace(M_alpha="alpha"),
+               camera=SimpleNamespace(world_position=(0.0, 10.0, 0.0)))
+    scope["projectile_store"] = scope["ProjectileStore"]()
+    scope["clock"] = clock
+    return scope
+
+
+def add_projectile(tracers, kind, position, direction=(0.0, 0.0, 1.0)):
+    projectile = tracers["Projectile"]()
+    tracers["projectile_store"].add(projectile, kind, position, direction, speed=100, lifetime=1.0)
+    return projectile
+
+
+def test_one_quad_per_tracer(tracers):
+    batch = tracers["TracerBatch"]()
+    add_projectile(tracers, tracers["PROJECTILE_TRACER"], (0.0, 0.0, 5.0))
+    add_projectile(tracers, tracers["PROJECTILE_ORB"], (3.0, 0.0, 5.0))  # Не трассер - в меш не попадает
+    add_projectile(tracers, tracers["PROJECTILE_TRACER"], (-2.0, 0.0, 8.0), (1.0, 0.0, 0.0))
+
+    batch.rebuild()
+    vertices = np.array(batch.mesh.vertices)
+    assert vertices.shape == (12, 3) and len(batch.mesh.colors) == 12
+    assert batch.drawn == 2 and batch.entity.visible and batch.mesh.generated == 1
+
+    # Первая лента: от головы назад по направлению на стартовую длину, шириной TRACER_WIDTH
+    first = vertices[:6]
+    assert first[:, 2].max() == pytest.approx(5.0)
+    assert first[:, 2].min() == pytest.approx(5.0 - tracers["TRACER_LENGTH_START"])
+    assert np.ptp(first[:, 0]) == pytest.approx(tracers["TRACER_WIDTH"])
+    assert batch.mesh.colors[0] == pytest.approx([1.0, 1.0, 0.2, 1.0])
+
+
+def test_head_is_interpolated_and_fades(tracers):
+    batch = tracers["TracerBatch"]()
+    store = tracers["projectile_store"]
+    add_projectile(tracers, tracers["PROJECTILE_TRACER"], (0.0, 0.0, 0.0))
+    store.previous_position[0] = (0.0, 0.0, 0.0)
+    store.position[0] = (0.0, 0.0, 2.0)
+    tracers["clock"].alpha = 0.25
+    tracers["clock"].time = 0.5
+
+    batch.rebuild()
+    vertices = np.array(batch.mesh.vertices)
+    length = tracers["TRACER_LENGTH_START"] + (tracers["TRACER_LENGTH_END"] - tracers["TRACER_LENGTH_START"]) * 0.5
+    assert vertices[:, 2].max() == pytest.approx(0.5)
+    assert vertices[:, 2].min() == pytest.approx(0.5 - length)
+    assert batch.mesh.colors[0][3] == pytest.approx(0.6)
+
+
+def test_empty_store_hides_mesh_once(tracers):
+    batch = tracers["TracerBatch"]()
+    tracer = add_projectile(tracers, tracers["PROJECTILE_TRACER"], (0.0, 0.0, 5.0))
+    batch.rebuild()
+
+    tracers["projectile_store"].remove(tracer)
+    batch.rebuild()
+    assert not batch.entity.visible and batch.drawn == 0
+
+    batch.rebuild()  # Меш уже спрятан - не пересобирается
+    assert batch.mesh.generated == 1